@@ -0,0 +1,208 @@
+import argparse
+import datetime
+import itertools
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:  # analytics is optional: pip install numpy pandas
+    np = pd = None
+
+from database import Database
+from scheduling import WORKDAY_START, WORKDAY_END
+
+
+# Reports over bills, appointments and prescriptions for any date range:
+#   python -m analytics revenue 2022-01-01 2024-12-31 --period quarter
+#   python -m analytics utilization 2024-01-01 2024-12-31 --workers 4 --output utilization.csv
+# Every query selects integers only (dates as day numbers, amounts as cents,
+# statuses as codes), so each fetchmany chunk becomes one int64 NumPy block
+# without keeping a row object per row, and the grouping is done by pandas.
+# Each report is a sum over rows: --workers splits the range into that many
+# parts, pulls and groups them in separate processes (each with its own
+# connection, configured from the environment like the app) and adds the
+# partial results up.
+
+ANALYTICS_CHUNK = 50_000    # rows per fetchmany
+PERIODS = {'day': 'D', 'week': 'W', 'month': 'M', 'quarter': 'Q', 'year': 'Y'}
+
+BILL_STATUSES = ('Pending', 'Resolved', 'Other')     # StatusCode 0, 1, 2
+
+
+def _require_pandas():
+    if pd is None:
+        raise RuntimeError("Analytics needs NumPy and pandas. Run 'pip install numpy pandas'")
+
+
+def pull(db, query, params=(), chunk_size=ANALYTICS_CHUNK):
+    # DataFrame of int64 columns; the query must return integers only (no NULLs)
+    blocks = []
+    with db.stream(query, params, chunk_size, measure=False) as (columns, chunks):
+        width = len(columns)
+        for rows in chunks:
+            block = np.fromiter(itertools.chain.from_iterable(rows), dtype=np.int64, count=len(rows) * width)
+            blocks.append(block.reshape(len(rows), width))
+    data = np.concatenate(blocks) if blocks else np.empty((0, width), dtype=np.int64)
+    return pd.DataFrame(data, columns=columns)
+
+
+def periods(days, period):
+    # Day numbers -> pandas Periods ('2024-03', '2024Q1', ...)
+    return pd.to_datetime(days, unit='D').dt.to_period(PERIODS[period])
+
+
+def split_range(start, end, parts):
+    # [(start, end)] of about equal length covering start..end, both inclusive
+    days = (end - start).days + 1
+    parts = max(1, min(parts, days))
+    bounds = [start + datetime.timedelta(days=days * i // parts) for i in range(parts + 1)]
+    return [(bounds[i], bounds[i + 1] - datetime.timedelta(days=1)) for i in range(parts)]
+
+
+def _cents_to_money(cents):
+    return [Decimal(int(value)).scaleb(-2) for value in cents]
+
+
+##########################
+# REPORTS
+##########################
+
+# Each report is (partial, finish): partial(db, start, end, period) pulls one
+# range and returns additive sums indexed by (Period, key); finish(db, frame,
+# start, end) turns the summed parts into the report.
+
+def _revenue_partial(db, start, end, period):
+    day = db.backend.day_number('BillDate')
+    frame = pull(db, f"""SELECT {day} AS Day,
+                                CASE Status WHEN 'Pending' THEN 0 WHEN 'Resolved' THEN 1 ELSE 2 END AS StatusCode,
+                                CAST(ROUND(COALESCE(Amount, 0) * 100, 0) AS BIGINT) AS Cents
+                         FROM Bills WHERE BillDate BETWEEN ? AND ?""", (start, end))
+    frame['Period'] = periods(frame['Day'], period)
+    frame['Status'] = pd.Categorical.from_codes(frame['StatusCode'], BILL_STATUSES)
+    return frame.groupby(['Period', 'Status'], observed=True).agg(Bills=('Cents', 'size'), Cents=('Cents', 'sum'))
+
+
+def _revenue_finish(db, frame, start, end):
+    # Period, Status, Bills, Amount (exact), Share of the period's billed amount
+    totals = frame['Cents'].groupby(level='Period').transform('sum')
+    frame['Share'] = (frame['Cents'] / totals.where(totals != 0)).round(4)
+    frame['Amount'] = _cents_to_money(frame.pop('Cents'))
+    return frame[['Bills', 'Amount', 'Share']].reset_index()
+
+
+def _appointments_partial(db, start, end, period):
+    day = db.backend.day_number('AppointmentDate')
+    frame = pull(db, f"""SELECT {day} AS Day, DoctorID, DurationMinutes AS Minutes,
+                                CASE Attendance WHEN 'Attended' THEN 1 WHEN 'NoShow' THEN 2 ELSE 0 END AS Attendance
+                         FROM Appointments
+                         WHERE AppointmentDate BETWEEN ? AND ? AND DoctorID IS NOT NULL""", (start, end))
+    frame['Period'] = periods(frame['Day'], period)
+    frame['Recorded'] = frame['Attendance'] > 0      # 1 attended, 2 no-show, 0 not recorded
+    frame['NoShows'] = frame['Attendance'] == 2
+    return frame.groupby(['Period', 'DoctorID']).agg(
+        Appointments=('Minutes', 'size'), BookedMinutes=('Minutes', 'sum'),
+        Recorded=('Recorded', 'sum'), NoShows=('NoShows', 'sum'))
+
+
+def _with_doctor_names(db, frame):
+    doctors = pd.DataFrame([tuple(row[:2]) for row in db.fetch_doctors()], columns=['DoctorID', 'Doctor'])
+    return frame.reset_index().merge(doctors, on='DoctorID', how='left')
+
+
+def _utilization_finish(db, frame, start, end):
+    # Booked minutes over the working minutes (weekdays, WORKDAY_START..END)
+    # of each period, clipped to the report range
+    index = frame.index.get_level_values('Period')
+    first = np.maximum(index.start_time.values.astype('datetime64[D]'), np.datetime64(start))
+    last = np.minimum(index.end_time.values.astype('datetime64[D]'), np.datetime64(end))
+    capacity = np.busday_count(first, last + np.timedelta64(1, 'D')) * (WORKDAY_END - WORKDAY_START)
+    frame['CapacityMinutes'] = capacity
+    frame['Utilization'] = (frame['BookedMinutes'] / np.where(capacity > 0, capacity, np.nan)).round(4)
+    frame = _with_doctor_names(db, frame)
+    return frame[['Period', 'DoctorID', 'Doctor', 'Appointments', 'BookedMinutes', 'CapacityMinutes', 'Utilization']]
+
+
+def _no_show_finish(db, frame, start, end):
+    # No-shows over the appointments whose attendance was recorded
+    frame['NoShowRate'] = (frame['NoShows'] / frame['Recorded'].where(frame['Recorded'] > 0)).round(4)
+    frame = _with_doctor_names(db, frame)
+    return frame[['Period', 'DoctorID', 'Doctor', 'Appointments', 'Recorded', 'NoShows', 'NoShowRate']]
+
+
+def _consumption_partial(db, start, end, period):
+    day = db.backend.day_number('PrescribedDate')
+    frame = pull(db, f"""SELECT {day} AS Day, MedicineID, Quantity
+                         FROM Prescriptions
+                         WHERE PrescribedDate BETWEEN ? AND ? AND MedicineID IS NOT NULL""", (start, end))
+    frame['Period'] = periods(frame['Day'], period)
+    return frame.groupby(['Period', 'MedicineID']).agg(
+        Prescriptions=('Quantity', 'size'), Quantity=('Quantity', 'sum'))
+
+
+def _consumption_finish(db, frame, start, end):
+    medicines = pd.DataFrame([tuple(row[:2]) for row in db.fetch_medicines()], columns=['MedicineID', 'Medicine'])
+    frame = frame.reset_index().merge(medicines, on='MedicineID', how='left')
+    return frame[['Period', 'MedicineID', 'Medicine', 'Prescriptions', 'Quantity']]
+
+
+REPORTS = {
+    'revenue': (_revenue_partial, _revenue_finish),
+    'utilization': (_appointments_partial, _utilization_finish),
+    'no-shows': (_appointments_partial, _no_show_finish),
+    'consumption': (_consumption_partial, _consumption_finish),
+}
+
+
+def _partial_in_worker(report, start, end, period):
+    # Runs in a pool process: its own Database, configured from the environment
+    return REPORTS[report][0](Database(), start, end, period)
+
+
+def run_report(report, start, end, period='month', workers=1, db=None):
+    # The report as a DataFrame, one row per period and status / doctor / medicine
+    _require_pandas()
+    if end < start:
+        raise ValueError("The end date is before the start date.")
+    partial, finish = REPORTS[report]
+    db = db or Database()
+    ranges = split_range(start, end, workers)
+    if len(ranges) > 1:
+        # spawn: a forked child would share the parent's open connections
+        with ProcessPoolExecutor(len(ranges), mp_context=multiprocessing.get_context('spawn')) as pool:
+            parts = list(pool.map(_partial_in_worker, itertools.repeat(report),
+                                  *zip(*ranges), itertools.repeat(period)))
+    else:
+        parts = [partial(db, start, end, period)]
+    frame = pd.concat(parts)
+    frame = frame.groupby(level=list(frame.index.names), observed=True).sum().sort_index()
+    return finish(db, frame, start, end)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Revenue, utilization, no-show and consumption reports.")
+    parser.add_argument('report', choices=REPORTS)
+    parser.add_argument('start', type=datetime.date.fromisoformat, help="first day, YYYY-MM-DD")
+    parser.add_argument('end', type=datetime.date.fromisoformat, help="last day, YYYY-MM-DD")
+    parser.add_argument('--period', choices=PERIODS, default='month')
+    parser.add_argument('--workers', type=int, default=1, help="processes pulling parts of the range in parallel")
+    parser.add_argument('--output', help="write the report to this CSV file instead of printing it")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    frame = run_report(args.report, args.start, args.end, args.period, args.workers)
+    if args.output:
+        frame.to_csv(args.output, index=False)
+    else:
+        with pd.option_context('display.max_rows', None, 'display.width', 200):
+            print(frame.to_string(index=False))
+    print(f"{args.report}: {len(frame)} rows in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,389 @@
+import argparse
+import asyncio
+import datetime
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from urllib.parse import urlsplit, parse_qs
+
+from database import POOL_SIZE, configure_pool
+from metrics import query_metrics
+from services import Services, NotFound, MAX_PAGE
+from history import HISTORY_PAGE, history_cursor
+from text_search import TEXT_SEARCH_LIMIT
+from dashboard import REVENUE_DAYS
+from scheduling import SlotConflict
+from stock import OutOfStock
+
+
+# HTTP/JSON API over the services, so many front-desk clients can share one
+# backend process: one connection pool, one entity cache, one schedule index
+# and one low-stock list instead of one of each per desktop.
+#   python -m api --port 8080
+#   GET    /api/patients?after=100&limit=50      page in key order (before=... pages backwards)
+#   GET    /api/patients/42                      one row
+#   POST   /api/patients                         {"Name": ..., "Age": ..., ...} -> 201 with the row
+#   PUT    /api/patients/42                      same body as POST
+#   DELETE /api/patients/42                      -> 204
+#   GET    /api/patients/search?q=smi            also doctors and medicines
+#   GET    /api/prescriptions/search?q=amox      full-text, best match first (syntax in text_search)
+#   GET    /api/patients/42/history              timeline, newest first; ?before=<"next" of the last page>
+#   GET    /api/dashboard                        today's KPIs; ?date=YYYY-MM-DD&days=14 for another day / range
+# plus the endpoints in ROUTES below, /health and /metrics (Prometheus text).
+# Requests are parsed on the event loop; service calls run on a thread pool
+# as large as the connection pool, so they never wait on each other for a
+# connection.
+# With HMS_API_TOKEN set, every request except /health must send it as
+# "Authorization: Bearer <token>"; without one the server only listens on a
+# loopback address.
+
+HOST = '127.0.0.1'
+PORT = 8080
+API_TOKEN = os.environ.get('HMS_API_TOKEN') or None
+MAX_BODY = 1024 * 1024      # largest request body accepted
+KEEP_ALIVE = 30             # seconds an idle connection is kept open
+
+log = logging.getLogger('hms.api')
+
+REASONS = {200: 'OK', 201: 'Created', 204: 'No Content', 400: 'Bad Request', 401: 'Unauthorized', 404: 'Not Found',
+           405: 'Method Not Allowed', 409: 'Conflict', 413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return str(value)           # keep cents exact
+    if isinstance(value, datetime.time):
+        return value.strftime('%H:%M')
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _int(params, name, default=None):
+    value = params.get(name, [None])[0]
+    if value in (None, ''):
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise HttpError(400, f"{name} must be a whole number")
+
+
+def _date(params, name, default=None):
+    value = params.get(name, [None])[0]
+    if not value:
+        return default
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise HttpError(400, f"{name} must be a YYYY-MM-DD date")
+
+
+##########################
+# HANDLERS
+##########################
+# Each runs on a worker thread: handler(services, match, params, body) -> (status, payload)
+
+def _rows(service, rows):
+    return [service.as_dict(row) for row in rows]
+
+
+def list_rows(services, match, params, body):
+    service = services[match['entity']]
+    rows = service.page(after=_int(params, 'after'), before=_int(params, 'before'),
+                        limit=_int(params, 'limit', 100))
+    return 200, {'rows': _rows(service, rows),
+                 'first': rows[0][0] if rows else None, 'last': rows[-1][0] if rows else None}
+
+
+def get_row(services, match, params, body):
+    service = services[match['entity']]
+    return 200, service.as_dict(service.get(int(match['key'])))
+
+
+def create_row(services, match, params, body):
+    service = services[match['entity']]
+    return 201, service.as_dict(service.create(body))
+
+
+def update_row(services, match, params, body):
+    service = services[match['entity']]
+    return 200, service.as_dict(service.update(int(match['key']), body))
+
+
+def delete_row(services, match, params, body):
+    service = services[match['entity']]
+    service.get(int(match['key']))
+    service.delete(int(match['key']))
+    return 204, None
+
+
+def search(services, match, params, body):
+    service = services[match['entity']]
+    return 200, {'matches': service.search(params.get('q', [''])[0], _int(params, 'limit', 20))}
+
+
+def patient_history(services, match, params, body):
+    # ?before=<EventDate>,<Kind>,<SourceID> of the last event received, as returned in "next"
+    patients = services.patients
+    before = None
+    if params.get('before'):
+        try:
+            date, kind, source_id = params['before'][0].split(',')
+            before = (date, kind, int(source_id))
+        except ValueError:
+            raise HttpError(400, "before must be EventDate,Kind,SourceID")
+    limit = max(1, min(_int(params, 'limit', HISTORY_PAGE), MAX_PAGE))
+    rows = patients.history(int(match['key']), before, limit)
+    if not rows and before is None:
+        patients.get(int(match['key']))
+    return 200, {'events': [patients.event_dict(row) for row in rows],
+                 'next': ','.join(map(str, history_cursor(rows[-1]))) if len(rows) >= limit else None}
+
+
+def search_prescriptions(services, match, params, body):
+    service = services.prescriptions
+    rows = service.search(params.get('q', [''])[0], _int(params, 'limit', TEXT_SEARCH_LIMIT))
+    return 200, {'rows': _rows(service, rows)}
+
+
+def specializations(services, match, params, body):
+    return 200, {'specializations': services.doctors.specializations()}
+
+
+def free_slots(services, match, params, body):
+    start = _date(params, 'start', datetime.date.today())
+    slots = services.appointments.free_slots(params.get('specialization', [''])[0], start,
+                                             _date(params, 'end'), _int(params, 'minutes', 30),
+                                             _int(params, 'limit', 10))
+    return 200, {'slots': [{'date': date, 'time': time, 'DoctorID': doctor_id, 'Doctor': doctor}
+                           for date, time, doctor_id, doctor in slots]}
+
+
+def restock(services, match, params, body):
+    return 200, services.medicines.as_dict(services.medicines.restock(int(match['key']), body))
+
+
+def attendance(services, match, params, body):
+    return 200, services.appointments.as_dict(services.appointments.record_attendance(int(match['key']), body))
+
+
+def low_stock(services, match, params, body):
+    return 200, {'medicines': [{'MedicineID': medicine_id, 'Name': name, 'Quantity': quantity,
+                                'ReorderLevel': reorder_level}
+                               for medicine_id, name, quantity, reorder_level in services.medicines.low_stock()]}
+
+
+def dashboard(services, match, params, body):
+    return 200, services.dashboard.summary(_date(params, 'date'), _int(params, 'days', REVENUE_DAYS))
+
+
+def generate_bill(services, match, params, body):
+    try:
+        patient_id = int(body.get('PatientID'))
+        end = datetime.date.fromisoformat(body['End']) if body.get('End') else None
+    except (TypeError, ValueError):
+        raise HttpError(400, "PatientID must be a whole number and End a YYYY-MM-DD date")
+    row = services.bills.generate(patient_id, end)
+    return (201, services.bills.as_dict(row)) if row else (200, {'message': "Nothing to bill for this patient."})
+
+
+def bill_items(services, match, params, body):
+    fields = ('ItemType', 'Description', 'Quantity', 'UnitPrice', 'Amount')
+    return 200, {'items': [dict(zip(fields, row)) for row in services.bills.items(int(match['key']))]}
+
+
+ENTITY = r'(?P<entity>patients|doctors|appointments|prescriptions|medicines|bills)'
+KEY = r'(?P<key>\d+)'
+
+# (method, path pattern, handler); the first match wins
+ROUTES = [(method, re.compile(pattern + '$'), handler) for method, pattern, handler in (
+    ('GET', r'/api/dashboard', dashboard),
+    ('GET', r'/api/doctors/specializations', specializations),
+    ('GET', r'/api/appointments/free-slots', free_slots),
+    ('POST', rf'/api/appointments/{KEY}/attendance', attendance),
+    ('GET', r'/api/medicines/low-stock', low_stock),
+    ('POST', rf'/api/medicines/{KEY}/restock', restock),
+    ('POST', r'/api/bills/generate', generate_bill),
+    ('GET', rf'/api/bills/{KEY}/items', bill_items),
+    ('GET', r'/api/(?P<entity>patients|doctors|medicines)/search', search),
+    ('GET', r'/api/prescriptions/search', search_prescriptions),
+    ('GET', rf'/api/patients/{KEY}/history', patient_history),
+    ('GET', rf'/api/{ENTITY}', list_rows),
+    ('POST', rf'/api/{ENTITY}', create_row),
+    ('GET', rf'/api/{ENTITY}/{KEY}', get_row),
+    ('PUT', rf'/api/{ENTITY}/{KEY}', update_row),
+    ('DELETE', rf'/api/{ENTITY}/{KEY}', delete_row),
+)]
+
+
+##########################
+# SERVER
+##########################
+
+def _is_loopback(host):
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:      # other host names, '' or None (all interfaces)
+        return False
+
+
+class ApiServer:
+    def __init__(self, services=None, workers=POOL_SIZE, token=API_TOKEN):
+        self.services = services or Services()
+        self.workers = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='api')
+        self.token = token
+
+    async def serve(self, host=HOST, port=PORT):
+        if self.token is None and not _is_loopback(host):
+            raise ValueError(f"Refusing to listen on {host or 'all interfaces'} without a token. "
+                             "Set HMS_API_TOKEN or use a loopback address")
+        server = await asyncio.start_server(self.handle, host, port)
+        log.info("Listening on http://%s:%d", host, port)
+        async with server:
+            await server.serve_forever()
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), KEEP_ALIVE)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    return
+                if request is None:
+                    return
+                method, target, version, headers, body = request
+                if self._authorized(target, headers):
+                    status, content_type, payload = await self._respond(method, target, body)
+                else:
+                    status, content_type, payload = 401, 'application/json', b'{"error": "Missing or invalid token"}'
+                keep_alive = (version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close')
+                self._write(writer, status, content_type, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except HttpError as e:
+            self._write(writer, e.status, 'application/json', json.dumps({'error': str(e)}).encode(), False)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    def _authorized(self, target, headers):
+        # /health stays open so load balancers can probe it
+        if self.token is None or urlsplit(target).path == '/health':
+            return True
+        scheme, _, token = headers.get('authorization', '').partition(' ')
+        return scheme.lower() == 'bearer' and hmac.compare_digest(token.strip().encode(), self.token.encode())
+
+    async def _read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, version = line.decode('latin-1').split()
+        except ValueError:
+            raise HttpError(400, "Malformed request line")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get('content-length') or 0)
+        if length > MAX_BODY:
+            raise HttpError(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), target, version, headers, body
+
+    async def _respond(self, method, target, body):
+        url = urlsplit(target)
+        if url.path == '/health':
+            return 200, 'application/json', b'{"status": "ok"}'
+        if url.path == '/metrics':
+            return 200, 'text/plain; version=0.0.4', query_metrics.prometheus_text().encode()
+        try:
+            handler, match = self._route(method, url.path)
+            record = json.loads(body) if body else {}
+            if not isinstance(record, dict):
+                raise HttpError(400, "Expected a JSON object")
+            loop = asyncio.get_running_loop()
+            status, payload = await loop.run_in_executor(
+                self.workers, handler, self.services, match.groupdict(), parse_qs(url.query), record)
+        except HttpError as e:
+            status, payload = e.status, {'error': str(e)}
+        except json.JSONDecodeError as e:
+            status, payload = 400, {'error': f"Invalid JSON: {e}"}
+        except NotFound as e:
+            status, payload = 404, {'error': str(e)}
+        except (SlotConflict, OutOfStock) as e:
+            status, payload = 409, {'error': str(e)}
+        except ValueError as e:
+            status, payload = 400, {'error': str(e)}
+        except Exception as e:
+            log.exception("%s %s failed", method, target)
+            status, payload = 500, {'error': str(e)}
+        if payload is None:
+            return status, 'application/json', b''
+        return status, 'application/json', json.dumps(payload, default=_json_default).encode()
+
+    @staticmethod
+    def _route(method, path):
+        allowed = False
+        for route_method, pattern, handler in ROUTES:
+            match = pattern.match(path)
+            if match:
+                if route_method == method:
+                    return handler, match
+                allowed = True
+        if allowed:
+            raise HttpError(405, f"{method} is not allowed on {path}")
+        raise HttpError(404, f"No such endpoint: {path}")
+
+    @staticmethod
+    def _write(writer, status, content_type, payload, keep_alive):
+        head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+                f"Content-Type: {content_type}; charset=utf-8" if 'charset' not in content_type
+                else f"Content-Type: {content_type}",
+                f"Content-Length: {len(payload)}",
+                f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        if status == 401:
+            head.append('WWW-Authenticate: Bearer')
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + payload)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the hospital services over HTTP/JSON.")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--pool-size', type=int, default=POOL_SIZE, help="database connections (and worker threads)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+
+    configure_pool(size=args.pool_size)
+    query_metrics.start_exporter()
+    try:
+        asyncio.run(ApiServer(workers=args.pool_size).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    except ValueError as e:
+        parser.error(str(e))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
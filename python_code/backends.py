@@ -0,0 +1,286 @@
+import os
+import re
+import sqlite3
+import datetime
+import threading
+from decimal import Decimal
+from text_search import RANK_WINDOW
+
+try:
+    import pyodbc
+except ImportError:  # only needed for the SQL Server backend
+    pyodbc = None
+
+
+CONNECTION_STRING = (
+    r'DRIVER={ODBC Driver 18 for SQL Server};'
+    r'SERVER=.\SQLEXPRESS;'
+    r'DATABASE=HospitalDB;'
+    r'TrustServerCertificate=yes;'
+    r'Authentication=ActiveDirectoryIntegrated;'
+)
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sql_code', 'schema.sql')
+SQLITE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'hospital.db')
+
+
+#########################
+# SQL SERVER
+#########################
+
+class SqlServerBackend:
+    name = 'sqlserver'
+
+    def __init__(self, connection_string=CONNECTION_STRING):
+        self.connection_string = connection_string
+
+    def connect(self):
+        if pyodbc is None:
+            raise RuntimeError("pyodbc is not installed. Run 'pip install pyodbc' or use HMS_BACKEND=sqlite")
+        return pyodbc.connect(self.connection_string)
+
+    # Dialect helpers used by Database to build queries
+    def label(self, name_col, id_col):
+        return f"{name_col} + ' (' + CAST({id_col} AS NVARCHAR) + ')'"
+
+    def date_text(self, col):
+        return f"FORMAT({col}, 'yyyy-MM-dd')"
+
+    def day_number(self, col):
+        # Days since 1970-01-01, for typed integer pulls
+        return f"DATEDIFF(DAY, '19700101', {col})"
+
+    def select_top(self, rest, limit):
+        return f"SELECT TOP ({int(limit)}) {rest}"
+
+    def fingerprint_sql(self, table, key):
+        # Cheap change probe for the entity cache; the checksum also catches updates
+        return f"SELECT COUNT_BIG(*), MAX({key}), CHECKSUM_AGG(BINARY_CHECKSUM(*)) FROM {table}"
+
+    def full_text_query(self, terms):
+        # CONTAINS condition from text_search.parse_query terms; a * inside
+        # the quotes makes every word of that term a prefix
+        return ' AND '.join(f'"{" ".join(words)}{"*" if prefix else ""}"' for words, prefix in terms)
+
+    def prescription_matches_sql(self, limit):
+        # (PrescriptionID, Score) of the best matches, highest score first
+        return (f"SELECT TOP ({int(limit)}) [KEY] AS PrescriptionID, RANK AS Score "
+                f"FROM CONTAINSTABLE(Prescriptions, (Diagnosis, Medication), ?, {int(limit)}) ORDER BY RANK DESC")
+
+    def create_index_sql(self, name, table, columns, unique=False):
+        return (f"IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = '{name}' AND object_id = OBJECT_ID('{table}')) "
+                f"CREATE {'UNIQUE ' if unique else ''}NONCLUSTERED INDEX {name} ON {table} ({', '.join(columns)})")
+
+    def add_column_sql(self, table, column, definition):
+        return f"IF COL_LENGTH('{table}', '{column}') IS NULL ALTER TABLE {table} ADD {column} {definition}"
+
+    def create_table_sql(self, table, columns):
+        # `columns` is written in T-SQL, like schema.sql
+        return f"IF OBJECT_ID('{table}', 'U') IS NULL CREATE TABLE {table} ({columns})"
+
+    def migrations_table_sql(self):
+        return ("IF OBJECT_ID('SchemaMigrations', 'U') IS NULL "
+                "CREATE TABLE SchemaMigrations (Version INT PRIMARY KEY, Description NVARCHAR(200), "
+                "AppliedAt DATETIME DEFAULT GETDATE())")
+
+    def insert_returning_id(self, cursor, query, params):
+        # NOCOUNT keeps the INSERT's row count out of the way of the SELECT result
+        cursor.execute(f"SET NOCOUNT ON; {query}; SELECT CAST(SCOPE_IDENTITY() AS INT)", params)
+        return cursor.fetchone()[0]
+
+    def executemany(self, cursor, query, rows):
+        # Send the whole parameter array in one round trip instead of one per row
+        cursor.fast_executemany = True
+        cursor.executemany(query, rows)
+
+    def set_input_sizes(self, cursor, statement):
+        # Declared parameter types of a queries.Statement for the next execute;
+        # None goes back to pyodbc's guesses
+        cursor.setinputsizes(statement.input_sizes() if statement is not None else None)
+
+    # Transactions: pyodbc starts one implicitly with the first statement
+    def begin(self, cursor):
+        pass
+
+    def savepoint(self, cursor, name):
+        cursor.execute(f"SAVE TRANSACTION {name}")
+
+    def rollback_to(self, cursor, name):
+        cursor.execute(f"ROLLBACK TRANSACTION {name}")
+
+    def release(self, cursor, name):
+        pass  # SQL Server savepoints need no release
+
+    def transaction_usable(self, cursor):
+        # 0: the server rolled the transaction back (e.g. THROW in a trigger,
+        # which runs with XACT_ABORT on); -1: doomed, it can only be rolled back
+        cursor.execute("SELECT XACT_STATE()")
+        return cursor.fetchone()[0] == 1
+
+
+#########################
+# SQLITE
+#########################
+
+# Tuned for a single workstation: WAL lets readers run alongside the writer,
+# NORMAL sync is still crash-safe in WAL mode
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",      # 64 MB page cache
+    "PRAGMA mmap_size=268435456",    # 256 MB memory-mapped reads
+    "PRAGMA busy_timeout=5000",
+)
+
+
+def sqlite_schema(tsql):
+    # Translate the T-SQL in schema.sql into SQLite DDL so both engines share one schema
+    statements = []
+    for batch in re.split(r'^\s*GO\s*$', tsql, flags=re.MULTILINE | re.IGNORECASE):
+        batch = re.sub(r'--[^\n]*', '', batch).strip()
+        if not batch or re.match(r'(CREATE\s+DATABASE|USE)\b', batch, re.IGNORECASE):
+            continue
+        batch = re.sub(r'\bINT\s+PRIMARY\s+KEY\s+IDENTITY\s*\(\s*1\s*,\s*1\s*\)',
+                       'INTEGER PRIMARY KEY AUTOINCREMENT', batch, flags=re.IGNORECASE)
+        batch = re.sub(r'\bFOREIGN\s+KEY\s+REFERENCES\b', 'REFERENCES', batch, flags=re.IGNORECASE)
+        batch = re.sub(r'\bDATETIME(\s+DEFAULT\s+)GETDATE\(\)', r'DATETIME\1CURRENT_TIMESTAMP', batch, flags=re.IGNORECASE)
+        batch = re.sub(r'\bGETDATE\(\)', 'CURRENT_DATE', batch, flags=re.IGNORECASE)
+        batch = re.sub(r'^CREATE\s+TABLE\s+(?!IF\s+NOT\s+EXISTS)', 'CREATE TABLE IF NOT EXISTS ',
+                       batch, flags=re.IGNORECASE)
+        statements.append(batch)
+    return statements
+
+
+# Return the same Python types pyodbc does for DATE / TIME / DECIMAL columns
+sqlite3.register_adapter(datetime.date, lambda d: d.isoformat())
+sqlite3.register_adapter(datetime.time, lambda t: t.strftime('%H:%M:%S'))
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_converter('DATE', lambda b: datetime.date.fromisoformat(b.decode()))
+sqlite3.register_converter('TIME', lambda b: datetime.time.fromisoformat(b.decode()))
+sqlite3.register_converter('DECIMAL', lambda b: Decimal(b.decode()))
+
+
+class SqliteBackend:
+    name = 'sqlite'
+
+    def __init__(self, path=SQLITE_PATH, schema_path=SCHEMA_PATH, migrate=True):
+        self.path = path
+        self.schema_path = schema_path
+        self.migrate = migrate
+        self._schema_ready = False
+        self._lock = threading.Lock()
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, detect_types=sqlite3.PARSE_DECLTYPES,
+                               check_same_thread=False, uri=self.path.startswith('file:'))
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(pragma)
+        with self._lock:
+            if not self._schema_ready:
+                self.create_schema(conn)
+                self._schema_ready = True
+        return conn
+
+    def create_schema(self, conn):
+        with open(self.schema_path, encoding='utf-8') as f:
+            for statement in sqlite_schema(f.read()):
+                conn.execute(statement)
+        conn.commit()
+        if self.migrate:
+            # The embedded database belongs to the app, so keep it migrated
+            from migrations import apply_migrations
+            apply_migrations(conn, self)
+
+    def label(self, name_col, id_col):
+        return f"{name_col} || ' (' || {id_col} || ')'"
+
+    def date_text(self, col):
+        return col  # dates are stored as ISO text already
+
+    def day_number(self, col):
+        return f"CAST(julianday({col}) - 2440587.5 AS INTEGER)"
+
+    def select_top(self, rest, limit):
+        return f"SELECT {rest} LIMIT {int(limit)}"
+
+    def fingerprint_sql(self, table, key):
+        # Cheap change probe for the entity cache; the TableVersions counter
+        # (migration 9) catches updates. Not PRAGMA data_version: that is per
+        # connection, so it would differ between pooled connections.
+        return (f"SELECT COUNT(*), MAX({key}), "
+                f"(SELECT Version FROM TableVersions WHERE TableName = '{table}') FROM {table}")
+
+    def full_text_query(self, terms):
+        # FTS5 MATCH expression: "phrase" or "phrase"* (last word a prefix)
+        return ' AND '.join(f'"{" ".join(words)}"{"*" if prefix else ""}' for words, prefix in terms)
+
+    def prescription_matches_sql(self, limit):
+        # bm25 rank is lower for better matches, so negate it into a score.
+        # Only matches from the newest RANK_WINDOW on are scored: finding where
+        # that window starts walks the index in rowid order without ranking.
+        return ("SELECT rowid AS PrescriptionID, -rank AS Score FROM PrescriptionSearch "
+                "WHERE PrescriptionSearch MATCH ?1 AND rowid >= COALESCE((SELECT MIN(rowid) FROM ("
+                "SELECT rowid FROM PrescriptionSearch WHERE PrescriptionSearch MATCH ?1 "
+                f"ORDER BY rowid DESC LIMIT {RANK_WINDOW})), 0) "
+                f"ORDER BY rank LIMIT {int(limit)}")
+
+    def create_index_sql(self, name, table, columns, unique=False):
+        return f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+
+    def add_column_sql(self, table, column, definition):
+        # No IF NOT EXISTS in SQLite; apply_migrations runs each migration in
+        # one transaction, so a failed migration never leaves the column behind
+        return f"ALTER TABLE {table} ADD COLUMN {column} {definition}"
+
+    def create_table_sql(self, table, columns):
+        return sqlite_schema(f"CREATE TABLE {table} ({columns})")[0]
+
+    def migrations_table_sql(self):
+        return ("CREATE TABLE IF NOT EXISTS SchemaMigrations (Version INTEGER PRIMARY KEY, Description TEXT, "
+                "AppliedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+
+    def insert_returning_id(self, cursor, query, params):
+        cursor.execute(query, params)
+        return cursor.lastrowid
+
+    def executemany(self, cursor, query, rows):
+        cursor.executemany(query, rows)
+
+    def set_input_sizes(self, cursor, statement):
+        pass  # SQLite is dynamically typed
+
+    def begin(self, cursor):
+        # Take the write lock up front: a deferred transaction that reads and
+        # then writes can fail with SQLITE_BUSY when another writer got in between
+        cursor.execute("BEGIN IMMEDIATE")
+
+    def savepoint(self, cursor, name):
+        cursor.execute(f"SAVEPOINT {name}")
+
+    def rollback_to(self, cursor, name):
+        cursor.execute(f"ROLLBACK TO {name}")
+
+    def release(self, cursor, name):
+        cursor.execute(f"RELEASE {name}")
+
+    def transaction_usable(self, cursor):
+        # RAISE(ABORT) in a trigger undoes only the statement
+        return cursor.connection.in_transaction
+
+
+BACKENDS = {
+    'sqlserver': SqlServerBackend,
+    'sqlite': SqliteBackend,
+}
+
+
+def backend_from_env():
+    # HMS_BACKEND=sqlite runs fully local; HMS_SQLITE_PATH picks the database file
+    name = os.environ.get('HMS_BACKEND', 'sqlserver').lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown HMS_BACKEND '{name}', expected one of {', '.join(BACKENDS)}")
+    if name == 'sqlite':
+        return SqliteBackend(os.environ.get('HMS_SQLITE_PATH', SQLITE_PATH))
+    return SqlServerBackend()
@@ -0,0 +1,2 @@
+# Benchmarks run against a throwaway SQLite database, so they work offline:
+#   cd python_code && python -m benchmarks.index_benchmark --rows 1000000
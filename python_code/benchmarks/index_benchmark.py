@@ -0,0 +1,101 @@
+import argparse
+import datetime
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from backends import SqliteBackend
+from migrations import apply_migrations
+from benchmarks import seed as synthetic
+
+
+# JOIN / lookup / cascade-delete latency before and after migration 1 (indexes).
+#   python -m benchmarks.index_benchmark --rows 1000000
+
+
+def volumes_for(rows):
+    return {'patients': max(rows // 10, 1), 'doctors': max(rows // 2000, 1), 'medicines': 500,
+            'appointments': rows, 'prescriptions': rows // 3, 'bills': rows // 3}
+
+
+def scenarios(patients, doctors):
+    return {
+        'appointments_join_by_patient': (
+            """SELECT a.AppointmentID, p.Name, d.Name, a.AppointmentDate, a.AppointmentTime
+               FROM Appointments a JOIN Patients p ON a.PatientID = p.PatientID
+               JOIN Doctors d ON a.DoctorID = d.DoctorID WHERE a.PatientID = ?""",
+            lambda rng: (rng.randint(1, patients),)),
+        'prescriptions_join_by_patient': (
+            """SELECT pr.PrescriptionID, p.Name, d.Name, pr.Diagnosis, pr.Medication
+               FROM Prescriptions pr JOIN Patients p ON pr.PatientID = p.PatientID
+               JOIN Doctors d ON pr.DoctorID = d.DoctorID WHERE pr.PatientID = ?""",
+            lambda rng: (rng.randint(1, patients),)),
+        'pending_bills_by_patient': (
+            "SELECT BillID, Amount FROM Bills WHERE PatientID = ? AND Status = 'Pending'",
+            lambda rng: (rng.randint(1, patients),)),
+        'doctor_day_schedule': (
+            "SELECT AppointmentTime FROM Appointments WHERE DoctorID = ? AND AppointmentDate = ?",
+            lambda rng: (rng.randint(1, doctors),
+                         synthetic.START_DATE + datetime.timedelta(days=rng.randrange(synthetic.DAYS)))),
+        'patient_by_name': (
+            "SELECT PatientID FROM Patients WHERE Name = ?",
+            lambda rng: (f"{rng.choice(synthetic.FIRST_NAMES)} {rng.choice(synthetic.LAST_NAMES)}",)),
+        'cascade_delete_patient': (
+            "DELETE FROM Patients WHERE PatientID = ?",
+            lambda rng: (rng.randint(1, patients),)),
+    }
+
+
+def run(conn, cases, repeat, rng):
+    results = {}
+    for name, (sql, params) in cases.items():
+        timings = []
+        for _ in range(repeat):
+            args = params(rng)
+            start = time.perf_counter()
+            conn.execute(sql, args).fetchall()
+            timings.append((time.perf_counter() - start) * 1000)
+            conn.rollback()  # keep the data identical for the next run
+        results[name] = round(statistics.median(timings), 3)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark schema indexes on SQLite.")
+    parser.add_argument('--rows', type=int, default=1_000_000, help="appointments to generate")
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = SqliteBackend(os.path.join(tmp, 'bench.db'), migrate=False)
+        conn = backend.connect()
+        start = time.perf_counter()
+        volumes = synthetic.seed(conn, volumes_for(args.rows), args.seed)
+        seed_seconds = time.perf_counter() - start
+
+        cases = scenarios(volumes['patients'], volumes['doctors'])
+        before = run(conn, cases, args.repeat, random.Random(args.seed))
+        start = time.perf_counter()
+        apply_migrations(conn, backend)
+        migrate_seconds = time.perf_counter() - start
+        after = run(conn, cases, args.repeat, random.Random(args.seed))
+        conn.close()
+
+    print(json.dumps({
+        'rows': args.rows,
+        'seed_seconds': round(seed_seconds, 2),
+        'migrate_seconds': round(migrate_seconds, 2),
+        'median_ms_before': before,
+        'median_ms_after': after,
+        'speedup': {name: round(before[name] / after[name], 1) if after[name] else None for name in before},
+    }, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,230 @@
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import queries
+from backends import SqliteBackend
+from database import Database, configure_pool, set_error_handler
+from benchmarks import seed as synthetic
+
+
+# Latency percentiles and throughput of the Database methods behind each screen,
+# on a throwaway SQLite database filled with synthetic data:
+#   python -m benchmarks.load_benchmark --appointments 200000 --output after.json
+#   python -m benchmarks.load_benchmark --baseline before.json
+# Keep the JSON of each commit to compare against the next one.
+
+REGRESSION = 1.2   # --baseline flags scenarios whose p95 grew by more than this factor
+
+
+def scenarios(db, volumes):
+    patients, doctors = volumes['patients'], volumes['doctors']
+    appointments = volumes['appointments']
+    cache = db.cache
+
+    def cold(fetch):
+        # Time the query, not a cache hit
+        def run(rng):
+            cache.clear()
+            return fetch(rng)
+        return run
+
+    def insert_patient(rng):
+        return db.execute_insert(queries.INSERT_PATIENT,
+                                 ("Bench Patient", rng.randint(1, 95), 'Other', "000"))
+
+    future = itertools.count(synthetic.DAYS)
+
+    def book_appointment(rng):
+        # A new day each time, so the booking never conflicts
+        return db.book_appointment(rng.randint(1, patients), rng.randint(1, doctors),
+                                   synthetic.START_DATE + datetime.timedelta(days=next(future)), "10:00")
+
+    def find_free_slots(rng):
+        # Two weeks across every doctor of a specialization
+        day = synthetic.START_DATE + datetime.timedelta(days=rng.randrange(synthetic.DAYS - 14))
+        return db.find_free_slots(rng.choice(synthetic.SPECIALIZATIONS)[0], day, day + datetime.timedelta(days=13),
+                                  now=datetime.datetime.combine(day, datetime.time()))
+
+    def check_slot(rng):
+        return db.check_slot(rng.randint(1, doctors),
+                             synthetic.START_DATE + datetime.timedelta(days=rng.randrange(synthetic.DAYS)),
+                             f"{rng.randint(8, 16):02d}:{rng.choice((0, 15, 30, 45)):02d}")
+
+    def update_patient(rng):
+        db.execute_query(queries.UPDATE_PATIENT_AGE, (rng.randint(1, 95), rng.randint(1, patients)))
+
+    def update_patients_batch(rng):
+        # 100 updates, one commit
+        with db.transaction() as work:
+            for _ in range(100):
+                work.defer(queries.UPDATE_PATIENT_AGE, (rng.randint(1, 95), rng.randint(1, patients)))
+
+    def resolve_bill(rng):
+        db.execute_query("UPDATE Bills SET Status = 'Resolved' WHERE BillID = ?", (rng.randint(1, volumes['bills']),))
+
+    deleted = iter(range(appointments, 0, -1))
+
+    def cancel_appointment(rng):
+        db.cancel_appointment(next(deleted))
+
+    # name -> (callable(rng), heavy); heavy scenarios read whole tables and run fewer times
+    return {
+        'fetch_patients': (cold(lambda rng: db.fetch_patients()), True),
+        'fetch_doctors': (cold(lambda rng: db.fetch_doctors()), False),
+        'fetch_medicines': (lambda rng: db.fetch_medicines(), False),
+        'fetch_appointments': (lambda rng: db.fetch_appointments(), True),
+        'fetch_prescriptions': (lambda rng: db.fetch_prescriptions(), True),
+        'fetch_bills': (lambda rng: db.fetch_bills(), True),
+        'fetch_page_first': (lambda rng: db.fetch_page('appointments'), False),
+        'fetch_page_deep': (lambda rng: db.fetch_page('appointments', after=rng.randrange(appointments)), False),
+        'fetch_page_back': (lambda rng: db.fetch_page('prescriptions', before=rng.randrange(volumes['prescriptions'])),
+                            False),
+        'fetch_row_bill': (lambda rng: db.fetch_row('bills', rng.randint(1, volumes['bills'])), False),
+        'search_patients': (lambda rng: db.search_patients(rng.choice(synthetic.LAST_NAMES)[:3]), False),
+        'search_patients_cold': (cold(lambda rng: db.search_patients(rng.choice(synthetic.FIRST_NAMES)[:2])), True),
+        'insert_patient': (insert_patient, False),
+        'check_slot': (check_slot, False),
+        'find_free_slots': (find_free_slots, False),
+        'book_appointment': (book_appointment, False),
+        'update_patient': (update_patient, False),
+        'update_patients_batch': (update_patients_batch, False),
+        'resolve_bill': (resolve_bill, False),
+        'cancel_appointment': (cancel_appointment, False),
+    }
+
+
+def percentile(sorted_values, p):
+    # Nearest-rank percentile of an already sorted list
+    index = max(int(round(p / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def measure(fn, iterations, warmup, rng):
+    for _ in range(warmup):
+        fn(rng)
+    timings = []
+    rows = 0
+    started = time.perf_counter()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = fn(rng)
+        timings.append((time.perf_counter() - start) * 1000)
+        if isinstance(result, list):
+            rows += len(result)
+    elapsed = time.perf_counter() - started
+    timings.sort()
+    return {
+        'iterations': iterations,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'max_ms': round(timings[-1], 3),
+        'ops_per_sec': round(iterations / elapsed, 1) if elapsed else None,
+        'rows_per_call': rows // iterations if rows else 0,
+    }
+
+
+def run(db, volumes, iterations, warmup, seed, only=None):
+    results = {}
+    for name, (fn, heavy) in scenarios(db, volumes).items():
+        if only and name not in only:
+            continue
+        count = max(iterations // 10, 3) if heavy else iterations
+        results[name] = measure(fn, count, min(warmup, count), random.Random(seed))
+    return results
+
+
+def compare(results, baseline, threshold=REGRESSION):
+    # p95 ratio per scenario present in both runs (> 1 means slower now)
+    report = {}
+    for name, current in results.items():
+        before = baseline.get(name)
+        if before and before['p95_ms']:
+            ratio = round(current['p95_ms'] / before['p95_ms'], 2)
+            report[name] = {'p95_before_ms': before['p95_ms'], 'p95_ms': current['p95_ms'],
+                            'ratio': ratio, 'regression': ratio > threshold}
+    return report
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _raise(title, message):
+    # No message boxes in a benchmark: a failing scenario should stop the run
+    raise RuntimeError(f"{title}: {message}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load benchmark of the Database methods on synthetic SQLite data.")
+    synthetic.add_volume_arguments(parser)
+    parser.add_argument('--iterations', type=int, default=200, help="calls per scenario (whole-table fetches run a tenth)")
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--only', nargs='+', metavar='SCENARIO', help="run just these scenarios")
+    parser.add_argument('--database', help="reuse (or create) this SQLite file instead of a temporary one")
+    parser.add_argument('--output', help="write the JSON report here as well as to stdout")
+    parser.add_argument('--baseline', help="JSON report of an earlier run to compare p95 against")
+    parser.add_argument('--threshold', type=float, default=REGRESSION, help="p95 ratio counted as a regression")
+    args = parser.parse_args(argv)
+
+    volumes = synthetic.volumes_from_args(args)
+    set_error_handler(_raise)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.database or os.path.join(tmp, 'bench.db')
+        existing = os.path.exists(path)
+        backend = SqliteBackend(path)
+        configure_pool(backend=backend)
+        db = Database()
+
+        seed_seconds = None
+        if not existing:
+            start = time.perf_counter()
+            with db.pool.connection() as conn:
+                synthetic.seed(conn, volumes, args.seed)
+            seed_seconds = round(time.perf_counter() - start, 2)
+
+        results = run(db, volumes, args.iterations, args.warmup, args.seed, args.only)
+        db.pool.close()
+
+    report = {
+        'commit': _git_commit(),
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'backend': backend.name,
+        'volumes': volumes,
+        'seed_seconds': seed_seconds,
+        'scenarios': results,
+        'statements': queries.stats(),    # registry statements behind the scenarios
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            report['comparison'] = compare(results, json.load(f)['scenarios'], args.threshold)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+    print(text)
+    regressions = [name for name, row in report.get('comparison', {}).items() if row['regression']]
+    if regressions:
+        print(f"p95 regressions: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
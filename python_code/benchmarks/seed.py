@@ -0,0 +1,175 @@
+import argparse
+import datetime
+import itertools
+import random
+import sys
+
+
+# Synthetic hospital data with roughly realistic shapes: a few frequent
+# patients and many occasional ones, weekday-heavy office-hour bookings,
+# log-normal bill amounts and mostly resolved older bills.
+
+DEFAULT_VOLUMES = {
+    'patients': 20_000,
+    'doctors': 200,
+    'medicines': 500,
+    'appointments': 100_000,
+    'prescriptions': 50_000,
+    'bills': 50_000,
+}
+
+START_DATE = datetime.date(2022, 1, 1)
+DAYS = 3 * 365
+CHUNK = 10_000
+
+FIRST_NAMES = ('James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda', 'David',
+               'Elizabeth', 'Ali', 'Fatemeh', 'Reza', 'Zahra', 'Mohammad', 'Maryam', 'Wei', 'Mei', 'Carlos',
+               'Sofia', 'Ahmed', 'Aisha', 'Ivan', 'Olga', 'Kenji', 'Yuki', 'Liam', 'Emma', 'Noah', 'Olivia')
+LAST_NAMES = ('Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez',
+              'Martinez', 'Hosseini', 'Ahmadi', 'Karimi', 'Rahimi', 'Chen', 'Wang', 'Kim', 'Nguyen', 'Silva',
+              'Khan', 'Ivanov', 'Sato', 'Tanaka', 'Muller', 'Rossi', 'Novak', 'Dubois', 'Cohen', 'Singh', 'Lee')
+SPECIALIZATIONS = (('General Practice', 30), ('Pediatrics', 12), ('Cardiology', 8), ('Orthopedics', 8),
+                   ('Dermatology', 7), ('Gynecology', 7), ('Neurology', 5), ('Psychiatry', 5),
+                   ('Ophthalmology', 5), ('ENT', 5), ('Oncology', 4), ('Radiology', 4))
+DIAGNOSES = (('Common cold', 'Paracetamol'), ('Hypertension', 'Amlodipine'), ('Type 2 diabetes', 'Metformin'),
+             ('Bacterial infection', 'Amoxicillin'), ('Migraine', 'Sumatriptan'), ('Asthma', 'Salbutamol'),
+             ('Back pain', 'Ibuprofen'), ('Gastritis', 'Omeprazole'), ('Allergy', 'Cetirizine'),
+             ('Depression', 'Sertraline'), ('High cholesterol', 'Atorvastatin'), ('Anemia', 'Ferrous sulfate'))
+MEDICINE_FORMS = ('Tablets 10mg', 'Tablets 20mg', 'Tablets 500mg', 'Capsules', 'Syrup 100ml', 'Injection', 'Cream')
+
+
+def _weighted(rng, items):
+    values, weights = zip(*items)
+    return lambda: rng.choices(values, weights)[0]
+
+
+def _frequent(rng, count):
+    # Pareto-skewed id: a small share of patients / doctors gets most visits
+    return lambda: min(int(rng.paretovariate(1.16)), count) if rng.random() < 0.2 else rng.randint(1, count)
+
+
+def _visit_date(rng):
+    # Weekdays are about four times as busy as weekends
+    while True:
+        day = START_DATE + datetime.timedelta(days=rng.randrange(DAYS))
+        if day.weekday() < 5 or rng.random() < 0.25:
+            return day
+
+
+def _visit_time(rng):
+    # 30-minute slots (the default appointment length) from 08:00 to 16:30, busiest mid-morning
+    hour = min(max(int(rng.gauss(11, 2.2)), 8), 16)
+    return f"{hour:02d}:{rng.choice((0, 30)):02d}:00"
+
+
+def generate(table, count, volumes, rng):
+    patients, doctors = volumes['patients'], volumes['doctors']
+    if table == 'patients':
+        for i in range(count):
+            age = min(max(int(rng.gauss(42, 22)), 0), 99)
+            yield (f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", age,
+                   rng.choices(('Male', 'Female', 'Other'), (48, 50, 2))[0], f"09{rng.randrange(10**9):09d}")
+    elif table == 'doctors':
+        specialization = _weighted(rng, SPECIALIZATIONS)
+        for i in range(count):
+            yield (f"Dr. {rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", specialization(), f"021{rng.randrange(10**8):08d}")
+    elif table == 'medicines':
+        for i in range(count):
+            # The first ones are named like the prescribed medications, so MedicineID i + 1 matches DIAGNOSES[i]
+            name = DIAGNOSES[i][1] if i < len(DIAGNOSES) else f"Medicine {i} {rng.choice(MEDICINE_FORMS)}"
+            yield (name, rng.randint(0, 2000), round(rng.lognormvariate(2.3, 0.9), 2))
+    elif table == 'appointments':
+        # No double bookings: the overlap guard of migration 2 would refuse them
+        patient, doctor = _frequent(rng, patients), _frequent(rng, doctors)
+        booked = set()
+        for i in range(count):
+            slot = (doctor(), _visit_date(rng), _visit_time(rng))
+            while slot in booked:
+                slot = (rng.randint(1, doctors), _visit_date(rng), _visit_time(rng))
+            booked.add(slot)
+            yield (patient(),) + slot
+    elif table == 'prescriptions':
+        patient, doctor = _frequent(rng, patients), _frequent(rng, doctors)
+        medicines = volumes['medicines']
+        for i in range(count):
+            d = rng.randrange(len(DIAGNOSES))
+            yield ((patient(), doctor()) + DIAGNOSES[d] +
+                   (d + 1 if d < medicines else None, rng.choice((1, 1, 1, 2, 3, 5, 10)), _visit_date(rng)))
+    elif table == 'bills':
+        patient = _frequent(rng, patients)
+        recent = START_DATE + datetime.timedelta(days=DAYS - 60)
+        for i in range(count):
+            day = _visit_date(rng)
+            status = 'Pending' if day >= recent or rng.random() < 0.05 else 'Resolved'
+            yield (patient(), round(rng.lognormvariate(4.5, 0.8), 2), day, status)
+
+
+INSERTS = {
+    'patients': "INSERT INTO Patients (Name, Age, Gender, Contact) VALUES (?, ?, ?, ?)",
+    'doctors': "INSERT INTO Doctors (Name, Specialization, Contact) VALUES (?, ?, ?)",
+    'medicines': "INSERT INTO Medicines (Name, Quantity, Price) VALUES (?, ?, ?)",
+    'appointments': "INSERT INTO Appointments (PatientID, DoctorID, AppointmentDate, AppointmentTime) VALUES (?, ?, ?, ?)",
+    'prescriptions': "INSERT INTO Prescriptions (PatientID, DoctorID, Diagnosis, Medication) VALUES (?, ?, ?, ?)",
+    'bills': "INSERT INTO Bills (PatientID, Amount, BillDate, Status) VALUES (?, ?, ?, ?)",
+}
+# Once migration 3 has run, prescriptions also carry the medicine, quantity and date
+PRICED_PRESCRIPTIONS = ("INSERT INTO Prescriptions (PatientID, DoctorID, Diagnosis, Medication, MedicineID, Quantity, "
+                        "PrescribedDate) VALUES (?, ?, ?, ?, ?, ?, ?)")
+
+
+def _has_column(conn, table, column):
+    try:
+        conn.cursor().execute(f"SELECT {column} FROM {table} WHERE 1 = 0")
+        return True
+    except Exception:
+        conn.rollback()
+        return False
+
+
+def seed(conn, volumes=None, seed=42):
+    # Fill an empty database (parents first so foreign keys resolve)
+    volumes = dict(DEFAULT_VOLUMES, **(volumes or {}))
+    rng = random.Random(seed)
+    cursor = conn.cursor()
+    priced = _has_column(conn, 'Prescriptions', 'MedicineID')
+    for table, query in INSERTS.items():
+        rows = generate(table, volumes[table], volumes, rng)
+        if table == 'prescriptions':
+            if priced:
+                query = PRICED_PRESCRIPTIONS
+            else:
+                rows = (row[:4] for row in rows)
+        while True:
+            chunk = list(itertools.islice(rows, CHUNK))
+            if not chunk:
+                break
+            cursor.executemany(query, chunk)
+        conn.commit()
+    return volumes
+
+
+def add_volume_arguments(parser):
+    for table, count in DEFAULT_VOLUMES.items():
+        parser.add_argument(f'--{table}', type=int, default=count, help=f"rows in {table} (default {count})")
+
+
+def volumes_from_args(args):
+    return {table: getattr(args, table) for table in DEFAULT_VOLUMES}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fill the configured database with synthetic data.")
+    add_volume_arguments(parser)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    from database import Database
+    db = Database()
+    with db.pool.connection() as conn:
+        volumes = seed(conn, volumes_from_args(args), args.seed)
+    print(f"Seeded {', '.join(f'{count} {table}' for table, count in volumes.items())}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
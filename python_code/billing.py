@@ -0,0 +1,174 @@
+import argparse
+import datetime
+import sys
+import time
+from decimal import Decimal
+
+
+# Bills built from what was actually provided: one line item per appointment
+# (the doctor's consultation fee) and per priced prescription (medicine price
+# x quantity). UX_BillItems_Source makes sure nothing is billed twice.
+
+CENT = Decimal('0.01')
+EARLIEST = datetime.date(1900, 1, 1)
+
+# Unbilled appointments / prescriptions in a date range (params: start, end),
+# as FROM / JOIN and WHERE parts so the batch can join Bills in between.
+# Legacy prescriptions have no date and are billed with the next run.
+# Medicines without a price are left unbilled until they are priced.
+# Appointments marked as a no-show are not billed: the visit never happened.
+_APPOINTMENT_SOURCE = """
+    FROM Appointments a
+    JOIN Doctors d ON d.DoctorID = a.DoctorID"""
+_APPOINTMENT_FILTER = """
+    WHERE a.AppointmentDate BETWEEN ? AND ?
+      AND COALESCE(a.Attendance, '') <> 'NoShow'
+      AND NOT EXISTS (SELECT 1 FROM BillItems bi WHERE bi.ItemType = 'Appointment' AND bi.SourceID = a.AppointmentID)"""
+_PRESCRIPTION_SOURCE = """
+    FROM Prescriptions pr
+    JOIN Medicines m ON m.MedicineID = pr.MedicineID"""
+_UNBILLED_PRESCRIPTIONS = """
+    WHERE (pr.PrescribedDate BETWEEN ? AND ? OR pr.PrescribedDate IS NULL)
+      AND NOT EXISTS (SELECT 1 FROM BillItems bi WHERE bi.ItemType = 'Medicine' AND bi.SourceID = pr.PrescriptionID)"""
+_PRESCRIPTION_FILTER = _UNBILLED_PRESCRIPTIONS + """
+      AND m.Price IS NOT NULL"""
+
+_APPOINTMENTS = _APPOINTMENT_SOURCE + _APPOINTMENT_FILTER
+_PRESCRIPTIONS = _PRESCRIPTION_SOURCE + _PRESCRIPTION_FILTER
+
+_INSERT_ITEM = ("INSERT INTO BillItems (BillID, ItemType, SourceID, Description, Quantity, UnitPrice, Amount) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)")
+
+
+def _decimal(value):
+    # NULL totals (nothing summed) count as zero
+    if value is None:
+        return Decimal('0.00')
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def unpriced_medicines(work, start=EARLIEST, end=None, patient_id=None):
+    # Names of the medicines that keep unbilled prescriptions from being billed
+    end = end or datetime.date.today()
+    query = f"SELECT DISTINCT m.Name {_PRESCRIPTION_SOURCE} {_UNBILLED_PRESCRIPTIONS} AND m.Price IS NULL"
+    params = (start, end)
+    if patient_id is not None:
+        query += " AND pr.PatientID = ?"
+        params += (patient_id,)
+    work.execute(query + " ORDER BY m.Name", params)
+    return [row[0] for row in work.fetchall()]
+
+
+def line_items(work, patient_id, start=EARLIEST, end=None):
+    # (item type, source id, description, quantity, unit price, amount) for
+    # everything not billed yet; amounts are Decimal, rounded to cents.
+    # Raises ValueError naming any prescribed medicine that has no price.
+    end = end or datetime.date.today()
+    unpriced = unpriced_medicines(work, start, end, patient_id)
+    if unpriced:
+        raise ValueError(f"No price set for {', '.join(unpriced)}. "
+                         f"Set it on the Medicines screen before billing this patient.")
+    work.execute(f"SELECT 'Appointment', a.AppointmentID, d.Name, 1, d.ConsultationFee {_APPOINTMENTS} "
+                   f"AND a.PatientID = ? ORDER BY a.AppointmentDate", (start, end, patient_id))
+    rows = work.fetchall()
+    work.execute(f"SELECT 'Medicine', pr.PrescriptionID, m.Name, pr.Quantity, m.Price {_PRESCRIPTIONS} "
+                   f"AND pr.PatientID = ? ORDER BY pr.PrescriptionID", (start, end, patient_id))
+    rows += work.fetchall()
+    items = []
+    for item_type, source_id, description, quantity, price in rows:
+        price = _decimal(price)
+        items.append((item_type, source_id, description, quantity, price, (price * quantity).quantize(CENT)))
+    return items
+
+
+def bill_patient(db, patient_id, start=EARLIEST, end=None, bill_date=None):
+    # Creates one Pending bill with its line items in a single transaction.
+    # Returns (bill_id, total, items), or None when there is nothing to bill.
+    with db.transaction('bills') as work:
+        items = line_items(work, patient_id, start, end)
+        if not items:
+            return None
+        total = sum((item[-1] for item in items), Decimal('0.00'))
+        bill_id = work.insert(
+            "INSERT INTO Bills (PatientID, Amount, BillDate, Status) VALUES (?, ?, ?, 'Pending')",
+            (patient_id, total, bill_date or datetime.date.today()))
+        work.executemany(_INSERT_ITEM, [(bill_id,) + item for item in items])
+    return bill_id, total, items
+
+
+def bill_range(db, start, end, bill_date=None):
+    # Month-end mode: bills every patient with unbilled items in [start, end]
+    # using a handful of set-based statements instead of per-patient round trips.
+    # Prescriptions of unpriced medicines are skipped (see unpriced_medicines).
+    # Returns (batch_id, bill count, total).
+    bill_date = bill_date or end
+    with db.transaction('bills') as work:
+        batch_id = work.insert("INSERT INTO BillingBatches (StartDate, EndDate) VALUES (?, ?)", (start, end))
+        # One bill per patient...
+        work.execute(f"""
+            INSERT INTO Bills (PatientID, Amount, BillDate, Status, BatchID)
+            SELECT PatientID, 0, ?, 'Pending', ? FROM (
+                SELECT a.PatientID {_APPOINTMENTS}
+                UNION
+                SELECT pr.PatientID {_PRESCRIPTIONS}
+            ) billable""", (bill_date, batch_id, start, end, start, end))
+        # ...its line items...
+        work.execute(f"""
+            INSERT INTO BillItems (BillID, ItemType, SourceID, Description, Quantity, UnitPrice, Amount)
+            SELECT b.BillID, 'Appointment', a.AppointmentID, d.Name, 1, d.ConsultationFee, d.ConsultationFee
+            {_APPOINTMENT_SOURCE}
+            JOIN Bills b ON b.BatchID = ? AND b.PatientID = a.PatientID
+            {_APPOINTMENT_FILTER}""",
+                       (batch_id, start, end))
+        work.execute(f"""
+            INSERT INTO BillItems (BillID, ItemType, SourceID, Description, Quantity, UnitPrice, Amount)
+            SELECT b.BillID, 'Medicine', pr.PrescriptionID, m.Name, pr.Quantity, m.Price, ROUND(m.Price * pr.Quantity, 2)
+            {_PRESCRIPTION_SOURCE}
+            JOIN Bills b ON b.BatchID = ? AND b.PatientID = pr.PatientID
+            {_PRESCRIPTION_FILTER}""",
+                       (batch_id, start, end))
+        # ...and the totals
+        work.execute("""
+            UPDATE Bills SET Amount = (SELECT ROUND(SUM(bi.Amount), 2) FROM BillItems bi WHERE bi.BillID = Bills.BillID)
+            WHERE BatchID = ?""", (batch_id,))
+        work.execute("""
+            UPDATE BillingBatches
+            SET BillCount = (SELECT COUNT(*) FROM Bills WHERE BatchID = ?),
+                Total = (SELECT COALESCE(ROUND(SUM(Amount), 2), 0) FROM Bills WHERE BatchID = ?)
+            WHERE BatchID = ?""", (batch_id, batch_id, batch_id))
+        work.execute("SELECT BillCount, Total FROM BillingBatches WHERE BatchID = ?", (batch_id,))
+        count, total = work.fetchone()
+    return batch_id, count, _decimal(total).quantize(CENT)
+
+
+def fetch_bill_items(db, bill_id):
+    return db._fetch_all("SELECT ItemType, Description, Quantity, UnitPrice, Amount FROM BillItems "
+                         "WHERE BillID = ? ORDER BY BillItemID", (bill_id,))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate bills from appointments and prescriptions.")
+    parser.add_argument('--start', type=datetime.date.fromisoformat, required=True, help="YYYY-MM-DD")
+    parser.add_argument('--end', type=datetime.date.fromisoformat, required=True, help="YYYY-MM-DD")
+    parser.add_argument('--bill-date', type=datetime.date.fromisoformat, help="default: the end date")
+    parser.add_argument('--patient', type=int, help="bill just this patient")
+    args = parser.parse_args(argv)
+
+    from database import Database
+    db = Database()
+    started = time.perf_counter()
+    if args.patient:
+        result = bill_patient(db, args.patient, args.start, args.end, args.bill_date)
+        print(f"Bill {result[0]}: {len(result[2])} items, total {result[1]}" if result else "Nothing to bill.")
+    else:
+        batch_id, count, total = bill_range(db, args.start, args.end, args.bill_date)
+        print(f"Batch {batch_id}: {count} bills, total {total} in {time.perf_counter() - started:.1f}s")
+        with db.transaction() as work:
+            unpriced = unpriced_medicines(work, args.start, args.end)
+        if unpriced:
+            print(f"Not billed, no price set: {', '.join(unpriced)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
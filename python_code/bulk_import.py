@@ -0,0 +1,174 @@
+import argparse
+import csv
+import json
+import sys
+import time
+
+from stock import OPENING_BALANCES
+from validation import parse_patient, parse_medicine, parse_bill, parse_appointment
+
+
+CHUNK_SIZE = 5000          # rows per executemany / commit
+
+
+# Rows are checked with the same parsers the services (and so the screens) use
+TABLES = {
+    'patients': ("INSERT INTO Patients (Name, Age, Gender, Contact) VALUES (?, ?, ?, ?)", parse_patient),
+    'medicines': ("INSERT INTO Medicines (Name, Quantity, Price) VALUES (?, ?, ?)", parse_medicine),
+    'bills': ("INSERT INTO Bills (PatientID, Amount, BillDate, Status) VALUES (?, ?, ?, ?)", parse_bill),
+    'appointments': ("INSERT INTO Appointments (PatientID, DoctorID, AppointmentDate, AppointmentTime) "
+                     "VALUES (?, ?, ?, ?)", parse_appointment),
+}
+
+
+##########################
+# READERS
+##########################
+
+def read_records(f, fmt):
+    # Yields (line number, record dict or None, error) without loading the whole file
+    if fmt == 'jsonl':
+        for line, text in enumerate(f, 1):
+            if not text.strip():
+                continue
+            try:
+                record = json.loads(text)
+            except ValueError as e:
+                yield line, None, f"Invalid JSON: {e}"
+                continue
+            if isinstance(record, dict):
+                yield line, {str(k).lower(): v for k, v in record.items()}, None
+            else:
+                yield line, None, "Expected a JSON object"
+    else:
+        reader = csv.DictReader(f)
+        for record in reader:
+            yield reader.line_num, {(k or '').strip().lower(): v for k, v in record.items()}, None
+
+
+def format_of(path):
+    return 'jsonl' if path.lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+##########################
+# IMPORT
+##########################
+
+class _Rejects:
+    # Rejected rows go to a JSONL side file, opened only if something is rejected
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = None
+
+    def add(self, line, record, error):
+        if self._file is None:
+            self._file = open(self.path, 'w', encoding='utf-8')
+        self._file.write(json.dumps({'line': line, 'error': error, 'row': record}, default=str) + "\n")
+        self.count += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def _insert_chunk(conn, backend, query, chunk, rejects):
+    # Returns the rows actually committed. Every attempt is its own
+    # transaction: on SQL Server an error raised in a trigger (the overlap
+    # guard) ends the whole transaction, so rows inserted before it in the
+    # same transaction would be lost. A failed chunk is split in halves and
+    # retried until the offending rows stand alone, so the good rows still go
+    # in with executemany and only the bad ones are rejected.
+    cursor = conn.cursor()
+    try:
+        if len(chunk) == 1:
+            cursor.execute(query, chunk[0][2])
+        else:
+            backend.executemany(cursor, query, [values for _, _, values in chunk])
+        conn.commit()
+        return len(chunk)
+    except Exception as e:
+        conn.rollback()
+        if len(chunk) == 1:
+            line, record, _ = chunk[0]
+            rejects.add(line, record, str(e))
+            return 0
+    half = len(chunk) // 2
+    return (_insert_chunk(conn, backend, query, chunk[:half], rejects)
+            + _insert_chunk(conn, backend, query, chunk[half:], rejects))
+
+
+def import_file(path, table, db=None, chunk_size=CHUNK_SIZE, rejected_path=None, fmt=None, progress=None):
+    # Stream a CSV / JSONL file into `table`, committing every `chunk_size` rows.
+    # Returns counts; rejected rows are written to `rejected_path`.
+    if table not in TABLES:
+        raise ValueError(f"Unknown table: {table}, expected one of {', '.join(TABLES)}")
+    if db is None:
+        from database import Database
+        db = Database()
+    query, parse = TABLES[table]
+    fmt = fmt or format_of(path)
+    rejects = _Rejects(rejected_path or path + '.rejected.jsonl')
+
+    started = time.perf_counter()
+    imported = 0
+    try:
+        with open(path, newline='', encoding='utf-8-sig') as f, db.pool.connection() as conn:
+            chunk = []
+            for line, record, error in read_records(f, fmt):
+                if error is None:
+                    try:
+                        chunk.append((line, record, parse(record)))
+                    except ValueError as e:
+                        error = str(e)
+                if error is not None:
+                    rejects.add(line, record, error)
+                if len(chunk) >= chunk_size:
+                    imported += _insert_chunk(conn, db.backend, query, chunk, rejects)
+                    chunk = []
+                    if progress:
+                        progress(imported, rejects.count)
+            if chunk:
+                imported += _insert_chunk(conn, db.backend, query, chunk, rejects)
+    finally:
+        rejects.close()
+        if imported:
+            db.cache.invalidate(table)
+            if table == 'appointments':
+                db.schedule.clear()
+            if table == 'medicines':
+                # Imported stock enters the ledger as opening balances
+                with db.transaction('stockledger') as work:
+                    work.execute(OPENING_BALANCES)
+                db.stock.clear()
+
+    return {
+        'table': table,
+        'imported': imported,
+        'rejected': rejects.count,
+        'rejected_path': rejects.path if rejects.count else None,
+        'seconds': round(time.perf_counter() - started, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import rows from a CSV or JSONL file.")
+    parser.add_argument('table', choices=sorted(TABLES))
+    parser.add_argument('path', help="CSV with a header row (column names as in the schema) or JSONL")
+    parser.add_argument('--format', dest='fmt', choices=('csv', 'jsonl'), help="default: from the file extension")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--rejected', help="side file for rejected rows (default: <path>.rejected.jsonl)")
+    args = parser.parse_args(argv)
+
+    result = import_file(args.path, args.table, chunk_size=args.chunk_size, rejected_path=args.rejected,
+                         fmt=args.fmt, progress=lambda done, bad: print(f"\r{done} imported, {bad} rejected",
+                                                                         end='', file=sys.stderr))
+    print(file=sys.stderr)
+    print(f"Imported {result['imported']} {args.table} in {result['seconds']}s")
+    if result['rejected']:
+        print(f"Rejected {result['rejected']} rows, see {result['rejected_path']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+CACHE_MAXSIZE = 64      # entries kept before the least recently used is dropped
+CACHE_TTL = 300         # seconds an entry may be served without reloading
+CACHE_CHECK = 10        # seconds between change-detection probes (0 = never probe)
+
+
+class _Entry:
+    __slots__ = ('value', 'loaded_at', 'checked_at', 'fingerprint')
+
+    def __init__(self, value, fingerprint, now):
+        self.value = value
+        self.fingerprint = fingerprint
+        self.loaded_at = now
+        self.checked_at = now
+
+
+##########################
+# ENTITY CACHE
+##########################
+
+class EntityCache:
+    # In-process cache of query results, keyed by (table, ...) tuples.
+    # Entries expire after `ttl`, the least recently used entries are evicted
+    # past `maxsize`, and invalidate(table) drops everything read from a table.
+    # A fingerprint callable (e.g. COUNT/MAX over the table) lets an entry
+    # notice changes made by other workstations between TTL expiries.
+
+    def __init__(self, maxsize=CACHE_MAXSIZE, ttl=CACHE_TTL, check_every=CACHE_CHECK):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.check_every = check_every
+        self._entries = OrderedDict()
+        self._generations = {}   # table -> bumped on every invalidate
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key, loader, fingerprint=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.loaded_at > self.ttl:
+                del self._entries[key]
+                entry = None
+            probe = (entry is not None and fingerprint is not None and self.check_every
+                     and now - entry.checked_at > self.check_every)
+
+        if probe:
+            current = fingerprint()
+            with self._lock:
+                if current != entry.fingerprint:
+                    self._entries.pop(key, None)
+                    entry = None
+                else:
+                    entry.checked_at = now
+
+        if entry is not None:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                self.hits += 1
+            return entry.value
+
+        with self._lock:
+            self.misses += 1
+            generation = self._generations.get(key[0], 0)
+        # Take the fingerprint before the data so a write in between causes a reload
+        current = fingerprint() if fingerprint is not None and self.check_every else None
+        value = loader()
+        with self._lock:
+            # Don't store a result that a write invalidated while it was loading
+            if self._generations.get(key[0], 0) == generation:
+                self._entries[key] = _Entry(value, current, time.monotonic())
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, table):
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+            for key in [key for key in self._entries if key[0] == table]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            for table in {key[0] for key in self._entries}:
+                self._generations[table] = self._generations.get(table, 0) + 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+# Shared by every Database instance in the process
+entity_cache = EntityCache()
@@ -0,0 +1,42 @@
+import datetime
+from decimal import Decimal
+
+
+# Dashboard figures come from three small aggregate tables (migration 6)
+# that triggers keep current on every write to Appointments and Bills, from
+# any screen, import or workstation:
+#   DailyAppointments   (AppointmentDate, DoctorID) -> Appointments
+#   DailyRevenue        BillDate -> Bills, Billed, Resolved
+#   BillStatusTotals    Status -> Bills, Amount
+# Reading the dashboard is a handful of primary-key lookups, so it costs the
+# same with one month of history as with ten years. Low stock comes from the
+# ledger-driven LowStockAlerts.
+
+REVENUE_DAYS = 14           # days of revenue shown, ending today
+DASHBOARD_REFRESH = 30      # seconds between refreshes while the dashboard is shown
+
+CENT = Decimal('0.01')
+
+# Fill the aggregate tables from existing rows (only while they are empty)
+BACKFILL = (
+    "INSERT INTO DailyAppointments (AppointmentDate, DoctorID, Appointments) "
+    "SELECT AppointmentDate, DoctorID, COUNT(*) FROM Appointments "
+    "WHERE AppointmentDate IS NOT NULL AND DoctorID IS NOT NULL "
+    "AND NOT EXISTS (SELECT 1 FROM DailyAppointments) GROUP BY AppointmentDate, DoctorID",
+    "INSERT INTO DailyRevenue (BillDate, Bills, Billed, Resolved) "
+    "SELECT BillDate, COUNT(*), COALESCE(SUM(Amount), 0), "
+    "COALESCE(SUM(CASE WHEN Status = 'Resolved' THEN Amount ELSE 0 END), 0) FROM Bills "
+    "WHERE BillDate IS NOT NULL AND NOT EXISTS (SELECT 1 FROM DailyRevenue) GROUP BY BillDate",
+    "INSERT INTO BillStatusTotals (Status, Bills, Amount) "
+    "SELECT Status, COUNT(*), COALESCE(SUM(Amount), 0) FROM Bills "
+    "WHERE Status IS NOT NULL AND NOT EXISTS (SELECT 1 FROM BillStatusTotals) GROUP BY Status",
+)
+
+
+def money(value):
+    # SQLite sums in floating point: back to exact cents
+    return Decimal(str(value or 0)).quantize(CENT)
+
+
+def as_date(value):
+    return value if isinstance(value, datetime.date) else datetime.date.fromisoformat(str(value))
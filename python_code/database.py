@@ -0,0 +1,942 @@
+import re
+import datetime
+import itertools
+import threading
+import time
+import atexit
+import logging
+from contextlib import contextmanager
+from backends import backend_from_env
+from cache import entity_cache
+from prefix_index import PrefixIndex, SEARCH_LIMIT
+from scheduling import appointment_schedule, to_minutes, SlotConflict, APPOINTMENT_MINUTES, FREE_SLOT_LIMIT
+from stock import low_stock_alerts, OutOfStock
+from history import patient_history, HISTORY_PAGE, HISTORY_TABLES
+from text_search import parse_query, TEXT_SEARCH_LIMIT
+from dashboard import REVENUE_DAYS, money, as_date
+from metrics import query_metrics, query_name, result_bytes
+import queries
+from queries import Statement
+
+log = logging.getLogger('hms.database')
+
+# Pool settings (can be changed at startup with configure_pool)
+POOL_SIZE = 4              # max open connections for the whole process
+POOL_TIMEOUT = 10          # seconds to wait for a free connection
+POOL_MAX_IDLE = 300        # idle connections older than this are closed
+POOL_HEALTH_CHECK = 30     # ping a connection that sat idle longer than this
+
+PAGE_SIZE = 100            # rows per keyset page for the Treeviews
+STREAM_CHUNK = 10000       # rows per fetchmany when streaming an export
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+##########################
+# CONNECTION POOL
+##########################
+
+class ConnectionPool:
+    def __init__(self, connect, size=POOL_SIZE, timeout=POOL_TIMEOUT,
+                 max_idle=POOL_MAX_IDLE, health_check=POOL_HEALTH_CHECK, backend=None):
+        self._connect = connect
+        self.backend = backend
+        self.size = size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.health_check = health_check
+
+        self._idle = []        # stack of (conn, last_used), most recently used on top
+        self._open = 0         # idle + borrowed
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+                self._evict_idle()
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    conn, last_used = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(f"No free database connection after {self.timeout}s")
+                self._cond.wait(remaining)
+
+        # Connect / ping outside the lock so other threads are not held up
+        try:
+            if conn is None:
+                return self._connect()
+            if time.monotonic() - last_used > self.health_check and not self._is_healthy(conn):
+                self._close_quietly(conn)
+                return self._connect()
+            return conn
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn, discard=False):
+        if not discard:
+            try:
+                conn.rollback()  # never hand out a connection with an open transaction
+            except Exception:
+                discard = True
+
+        with self._cond:
+            if discard or self._closed:
+                self._open -= 1
+                self._close_quietly(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+                self._evict_idle()
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            self.release(conn, discard=not self._is_healthy(conn))
+            raise
+        else:
+            self.release(conn)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            for conn, _ in self._idle:
+                self._close_quietly(conn)
+            self._open -= len(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {'size': self.size, 'open': self._open,
+                    'idle': len(self._idle), 'in_use': self._open - len(self._idle)}
+
+    def _evict_idle(self):
+        # Oldest connections sit at the bottom of the stack
+        cutoff = time.monotonic() - self.max_idle
+        while self._idle and self._idle[0][1] < cutoff:
+            conn, _ = self._idle.pop(0)
+            self._open -= 1
+            self._close_quietly(conn)
+
+    @staticmethod
+    def _is_healthy(conn):
+        try:
+            conn.cursor().execute("SELECT 1").fetchone()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            backend = backend_from_env()
+            _pool = ConnectionPool(backend.connect, backend=backend)
+        return _pool
+
+
+def configure_pool(backend=None, **settings):
+    # Replace the process-wide pool, e.g. configure_pool(size=8, max_idle=60)
+    # or configure_pool(backend=SqliteBackend('clinic.db'))
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        backend = backend or backend_from_env()
+        _pool = ConnectionPool(backend.connect, backend=backend, **settings)
+        return _pool
+
+
+def _pool_metrics():
+    # Connection pool and entity cache state for the metrics export
+    stats = _pool.stats() if _pool is not None else {'size': 0, 'open': 0, 'idle': 0, 'in_use': 0}
+    return [('hms_db_pool_size', 'gauge', 'Maximum pooled connections.', stats['size']),
+            ('hms_db_pool_open', 'gauge', 'Open pooled connections.', stats['open']),
+            ('hms_db_pool_in_use', 'gauge', 'Pooled connections lent out.', stats['in_use']),
+            ('hms_entity_cache_hits_total', 'counter', 'Entity cache hits since startup.', entity_cache.hits),
+            ('hms_entity_cache_misses_total', 'counter', 'Entity cache misses since startup.', entity_cache.misses)]
+
+
+query_metrics.add_collector(_pool_metrics)
+
+
+@atexit.register
+def _close_pool():
+    if _pool is not None:
+        _pool.close()
+
+
+def _log_error(title, message):
+    log.error("%s: %s", title, message)
+
+
+_error_handler = _log_error
+
+
+def set_error_handler(handler=None):
+    # The database layer never touches Tk: errors are logged unless a front end
+    # installs its own handler (the Tk app shows a messagebox, and QueryExecutor
+    # forwards errors raised on worker threads to the Tk thread). None restores
+    # logging; the previous handler is returned so it can be put back.
+    global _error_handler
+    previous, _error_handler = _error_handler, handler or _log_error
+    return previous
+
+
+def report_error(title, message):
+    _error_handler(title, message)
+
+
+##########################
+# UNIT OF WORK
+##########################
+
+_WRITE_TABLE = re.compile(r'\s*(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM)\s+\[?(\w+)', re.IGNORECASE)
+
+def _sql(query):
+    return query.sql if isinstance(query, Statement) else query
+
+
+def _execute(backend, cursor, query, params=(), insert=False, fetch=False):
+    # Every call is timed into query_metrics. A registry Statement also has its
+    # parameters converted to the declared types and passed with those types.
+    statement = query if isinstance(query, Statement) else None
+    if statement is not None:
+        params = statement.bind(params)
+        backend.set_input_sizes(cursor, statement)
+    sql = _sql(query)
+    name = statement.name if statement is not None else query_name(sql)
+    started = time.perf_counter()
+    try:
+        if insert:
+            result = backend.insert_returning_id(cursor, sql, params)
+            rows = 1
+        else:
+            cursor.execute(sql, params)
+            result = cursor.fetchall() if fetch else None
+            rows = len(result) if fetch else cursor.rowcount
+    except Exception:
+        query_metrics.record(name, sql, params, time.perf_counter() - started, error=True)
+        raise
+    finally:
+        if statement is not None:
+            backend.set_input_sizes(cursor, None)
+    seconds = time.perf_counter() - started
+    if statement is not None:
+        statement.record(seconds, rows)
+    query_metrics.record(name, sql, params, seconds, rows, result_bytes(result) if fetch else 0)
+    return result
+
+
+def _executemany(backend, cursor, query, rows):
+    statement = query if isinstance(query, Statement) else None
+    if statement is not None:
+        rows = [statement.bind(params) for params in rows]
+        backend.set_input_sizes(cursor, statement)
+    sql = _sql(query)
+    name = statement.name if statement is not None else query_name(sql)
+    started = time.perf_counter()
+    try:
+        backend.executemany(cursor, sql, rows)
+    except Exception:
+        query_metrics.record(name, sql, f"<{len(rows)} rows>", time.perf_counter() - started, error=True)
+        raise
+    finally:
+        if statement is not None:
+            backend.set_input_sizes(cursor, None)
+    seconds = time.perf_counter() - started
+    if statement is not None:
+        statement.record(seconds, len(rows))
+    query_metrics.record(name, sql, f"<{len(rows)} rows>", seconds, len(rows))
+
+
+# The unit of work open on each thread; Database.transaction() and the
+# execute_* methods join it instead of committing on their own
+_active = threading.local()
+
+
+class UnitOfWork:
+    # Many statements on one pooled connection, committed once.
+    # defer() queues a statement and sends runs of the same statement with one
+    # executemany; the queue is flushed before anything that could depend on it.
+
+    def __init__(self, backend, cursor):
+        self.backend = backend
+        self.cursor = cursor
+        self.writes = []            # statements to invalidate caches for after the commit
+        self.tables = set()         # tables whose side indexes the callers maintain themselves
+        self._pending = []          # [(query, [params, ...])]
+        self._savepoints = 0
+        self.aborted = None         # error that made the server roll the whole transaction back
+
+    def execute(self, query, params=()):
+        self.flush()
+        _execute(self.backend, self.cursor, query, params)
+        self.writes.append(_sql(query))
+        return self.cursor
+
+    def executemany(self, query, rows):
+        self.flush()
+        _executemany(self.backend, self.cursor, query, rows)
+        self.writes.append(_sql(query))
+
+    def insert(self, query, params=()):
+        # INSERT returning the new identity value
+        self.flush()
+        self.writes.append(_sql(query))
+        return _execute(self.backend, self.cursor, query, params, insert=True)
+
+    def defer(self, query, params=()):
+        if self._pending and self._pending[-1][0] == query:
+            self._pending[-1][1].append(params)
+        else:
+            self._pending.append((query, [params]))
+
+    def flush(self):
+        pending, self._pending = self._pending, []
+        for query, rows in pending:
+            if len(rows) == 1:
+                _execute(self.backend, self.cursor, query, rows[0])
+            else:
+                _executemany(self.backend, self.cursor, query, rows)
+            self.writes.append(_sql(query))
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+
+    @contextmanager
+    def savepoint(self):
+        # Nested all-or-nothing block: on error only its own statements are
+        # undone and the exception propagates to the enclosing block. If the
+        # server already rolled back the whole transaction, the savepoint went
+        # with it: the error is re-raised as is and the transaction cannot commit.
+        self.flush()
+        self._savepoints += 1
+        name = f"uow_{self._savepoints}"
+        writes = len(self.writes)
+        self.backend.savepoint(self.cursor, name)
+        try:
+            yield self
+            self.flush()
+        except BaseException as e:
+            self._pending = []
+            if not self.backend.transaction_usable(self.cursor):
+                self.aborted = self.aborted or e
+                raise
+            self.backend.rollback_to(self.cursor, name)
+            self.backend.release(self.cursor, name)
+            del self.writes[writes:]
+            raise
+        self.backend.release(self.cursor, name)
+
+
+##########################
+# DATABASE
+##########################
+
+
+class Database:
+    # Cheap to create: every call borrows a pooled connection and returns it
+    def __init__(self, pool=None, cache=entity_cache, schedule=appointment_schedule, stock=low_stock_alerts,
+                 history=patient_history):
+        self.pool = pool or get_pool()
+        self.backend = self.pool.backend
+        self.cache = cache
+        self.schedule = schedule
+        self.stock = stock
+        self.history = history
+
+    def _drop_cached(self, table):
+        self.cache.invalidate(table)
+        if table in HISTORY_TABLES:
+            self.history.invalidate('history')
+
+    def _invalidate(self, query):
+        # Drop cached lookups for whatever table this statement wrote to
+        match = _WRITE_TABLE.match(_sql(query))
+        if match:
+            table = match.group(1).lower()
+            self._drop_cached(table)
+            # Appointments written (or cascade-deleted) outside the booking methods
+            if table == 'appointments' or (table in ('patients', 'doctors') and
+                                           _sql(query).lstrip()[:6].upper() == 'DELETE'):
+                self.schedule.clear()
+            # Stock changed without a ledger entry
+            if table == 'medicines':
+                self.stock.clear()
+
+    def execute_query(self, query, params=()):
+        work = getattr(_active, 'work', None)
+        if work is not None:
+            work.execute(query, params)
+            return
+        try:
+            with self.pool.connection() as conn:
+                _execute(self.backend, conn.cursor(), query, params)
+                conn.commit()
+            self._invalidate(query)
+        except Exception as e:
+            report_error("Database Error", str(e))
+            raise e
+
+    def execute_insert(self, query, params=()):
+        # Runs an INSERT and returns the new identity value, so the caller can
+        # patch its view instead of reloading the table
+        work = getattr(_active, 'work', None)
+        if work is not None:
+            return work.insert(query, params)
+        try:
+            with self.pool.connection() as conn:
+                new_id = _execute(self.backend, conn.cursor(), query, params, insert=True)
+                conn.commit()
+            self._invalidate(query)
+            return new_id
+        except Exception as e:
+            report_error("Database Error", str(e))
+            raise e
+
+    @contextmanager
+    def transaction(self, *tables):
+        # Unit of work: every statement run through it (or through execute_query /
+        # execute_insert on this thread) is committed once at the end, or all
+        # rolled back if the block raises. A nested transaction() becomes a savepoint.
+        #   with db.transaction() as work:
+        #       for row in rows:
+        #           work.defer("INSERT INTO ...", row)
+        # Caches are invalidated for the tables written. Tables named in `tables`
+        # only get their entity cache dropped: the caller keeps the schedule /
+        # stock indexes for them up to date itself.
+        outer = getattr(_active, 'work', None)
+        if outer is not None:
+            outer.tables.update(tables)
+            with outer.savepoint():
+                yield outer
+            return
+        with self.pool.connection() as conn:
+            work = _active.work = UnitOfWork(self.backend, conn.cursor())
+            work.tables.update(tables)
+            try:
+                self.backend.begin(work.cursor)
+                yield work
+                if work.aborted is not None:
+                    # A savepoint failed and took the transaction with it; the
+                    # caller carried on, but its earlier statements are gone
+                    raise work.aborted
+                work.flush()
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                if not isinstance(e, ValueError):  # SlotConflict, OutOfStock, ...: the caller explains
+                    report_error("Database Error", str(e))
+                raise
+            finally:
+                _active.work = None
+        for table in work.tables:
+            self._drop_cached(table)
+        for query in set(work.writes):
+            match = _WRITE_TABLE.match(query)
+            if match and match.group(1).lower() not in work.tables:
+                self._invalidate(query)
+
+    def _query(self, query, params=()):
+        with self.pool.connection() as conn:
+            return _execute(self.backend, conn.cursor(), query, params, fetch=True)
+
+    @contextmanager
+    def stream(self, query, params=(), chunk_size=STREAM_CHUNK, measure=True, describe=False):
+        # For exports: yields (column names, iterator of row lists) and reads
+        # with fetchmany, so memory stays at one chunk whatever the row count.
+        # The pooled connection is held until the with-block ends.
+        # Recorded in query_metrics once, with the time and rows up to the end of the block.
+        # measure=False counts 8 bytes a value instead of inspecting each one (numeric pulls).
+        # describe=True yields the full cursor.description instead of the column names.
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            started = time.perf_counter()
+            cursor.execute(query, params)
+            columns = [d[0] for d in cursor.description]
+            fetched = [0, 0]    # rows, bytes
+
+            def chunks():
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        return
+                    fetched[0] += len(rows)
+                    fetched[1] += result_bytes(rows) if measure else 8 * len(rows) * len(columns)
+                    yield rows
+
+            try:
+                yield (cursor.description if describe else columns), chunks()
+            finally:
+                query_metrics.record(query_name(query), query, params, time.perf_counter() - started,
+                                     fetched[0], fetched[1])
+
+    def _fetch_all(self, query, params=()):
+        try:
+            return self._query(query, params)
+        except Exception as e:
+            report_error("Database Error", str(e))
+            return []
+
+    def _fetch_cached(self, entity, kind='all', build=list):
+        # Whole-table lookups (patient / doctor lists and their search indexes)
+        # shared through the entity cache; treat the results as read-only
+        columns, source, key = self._list_query(entity)
+        try:
+            return self.cache.get_or_load(
+                (entity, kind),
+                lambda: build(self._query(f"SELECT {columns} FROM {source}")),
+                fingerprint=lambda: tuple(self._query(self.backend.fingerprint_sql(source, key))[0]))
+        except Exception as e:
+            report_error("Database Error", str(e))
+            return build([])
+
+    def _search(self, entity, fields, text, limit):
+        index = self._fetch_cached(entity, 'index', lambda rows: PrefixIndex(
+            rows, fields=fields, label=lambda row: f"{row[1]} ({row[0]})"))
+        return index.search(text, limit)
+
+    def search_patients(self, text, limit=SEARCH_LIMIT):
+        # "Name (ID)" labels of patients whose name or contact starts with the typed words
+        return self._search('patients', lambda p: (p[1], p[4]), text, limit)
+
+    def search_doctors(self, text, limit=SEARCH_LIMIT):
+        return self._search('doctors', lambda d: (d[1], d[2], d[3]), text, limit)
+
+    # Column list, FROM clause and key column behind each screen's Treeview
+    def _list_query(self, entity):
+        label = self.backend.label
+        if entity == 'patients':
+            return "PatientID, Name, Age, Gender, Contact", "Patients", "PatientID"
+        if entity == 'doctors':
+            return "DoctorID, Name, Specialization, Contact", "Doctors", "DoctorID"
+        if entity == 'medicines':
+            return "MedicineID, Name, Quantity, Price", "Medicines", "MedicineID"
+        if entity == 'appointments':
+            return (f"""a.AppointmentID,
+                   {label('p.Name', 'p.PatientID')} AS Patient,
+                   {label('d.Name', 'd.DoctorID')} AS Doctor,
+                   a.AppointmentDate,
+                   a.AppointmentTime,
+                   a.DurationMinutes,
+                   a.Attendance""",
+                    """Appointments a
+            JOIN Patients p ON a.PatientID = p.PatientID
+            JOIN Doctors d ON a.DoctorID = d.DoctorID""",
+                    "a.AppointmentID")
+        if entity == 'prescriptions':
+            return (f"""pr.PrescriptionID,
+                   {label('p.Name', 'p.PatientID')} AS Patient,
+                   {label('d.Name', 'd.DoctorID')} AS Doctor,
+                   pr.Diagnosis,
+                   COALESCE({label('pr.Medication', 'pr.MedicineID')}, pr.Medication) AS Medication,
+                   pr.Quantity""",
+                    """Prescriptions pr
+            JOIN Patients p ON pr.PatientID = p.PatientID
+            JOIN Doctors d ON pr.DoctorID = d.DoctorID""",
+                    "pr.PrescriptionID")
+        if entity == 'bills':
+            return (f"""b.BillID,
+                   {label('p.Name', 'p.PatientID')} AS Patient,
+                   b.Amount,
+                   {self.backend.date_text('b.BillDate')} AS BillDate,
+                   b.Status""",
+                    """Bills b
+            JOIN Patients p ON b.PatientID = p.PatientID""",
+                    "b.BillID")
+        raise ValueError(f"Unknown entity: {entity}")
+
+    def entity_query(self, entity):
+        # The full SELECT behind a screen, in key order (used by exports)
+        columns, source, key = self._list_query(entity)
+        return f"SELECT {columns} FROM {source} ORDER BY {key}"
+
+    def _fetch_list(self, entity):
+        columns, source, _ = self._list_query(entity)
+        return self._fetch_all(f"SELECT {columns} FROM {source}")
+
+    def fetch_page(self, entity, after=None, before=None, limit=PAGE_SIZE):
+        # Keyset paging: rows with key > after (or the page just before `before`),
+        # always returned in ascending key order. Uses the primary key index, so
+        # the cost does not grow with how deep the user has scrolled.
+        columns, source, key = self._list_query(entity)
+        where, params = "", ()
+        if after is not None:
+            where, params = f"WHERE {key} > ?", (after,)
+        elif before is not None:
+            where, params = f"WHERE {key} < ?", (before,)
+        order = "DESC" if before is not None else "ASC"
+        rows = self._fetch_all(
+            self.backend.select_top(f"{columns} FROM {source} {where} ORDER BY {key} {order}", limit),
+            params)
+        return rows[::-1] if before is not None else rows
+
+    def fetch_row(self, entity, key):
+        # One row shaped exactly like the Treeview rows of fetch_page
+        columns, source, key_col = self._list_query(entity)
+        rows = self._fetch_all(f"SELECT {columns} FROM {source} WHERE {key_col} = ?", (key,))
+        return rows[0] if rows else None
+
+    def search_prescriptions(self, text, limit=TEXT_SEARCH_LIMIT):
+        # Prescriptions whose diagnosis or medication match the query (syntax in
+        # text_search), best match first, shaped like the Prescriptions screen rows.
+        # The full-text index yields the top `limit` keys; only those are joined.
+        terms = parse_query(text)
+        if not terms:
+            return []
+        columns, source, _ = self._list_query('prescriptions')
+        return self._fetch_all(
+            f"WITH PrescriptionMatches AS ({self.backend.prescription_matches_sql(limit)}) "
+            f"SELECT {columns} FROM PrescriptionMatches hit, {source} "
+            "WHERE pr.PrescriptionID = hit.PrescriptionID ORDER BY hit.Score DESC, pr.PrescriptionID",
+            (self.backend.full_text_query(terms),))
+
+    def fetch_patients(self):
+        return self._fetch_cached('patients')
+
+    def fetch_doctors(self):
+        return self._fetch_cached('doctors')
+
+    def fetch_medicines(self):
+        return self._fetch_list('medicines')
+
+    def fetch_appointments(self):
+        return self._fetch_list('appointments')
+
+    def fetch_prescriptions(self):
+        return self._fetch_list('prescriptions')
+
+    def fetch_bills(self):
+        return self._fetch_list('bills')
+
+    ##########################
+    # PATIENT HISTORY
+    ##########################
+
+    def _history_query(self, before=None, limit=HISTORY_PAGE):
+        # One UNION ALL over the three tables, each branch seeking on its
+        # PatientID index; newest first. Undated (old) prescriptions sort last.
+        # The first branch fixes the column types for SQL Server, hence the casts.
+        date_text = self.backend.date_text
+        where = ""
+        if before is not None:
+            where = "WHERE EventDate < ? OR (EventDate = ? AND (Kind < ? OR (Kind = ? AND SourceID < ?)))"
+        return ("WITH PatientHistory AS ("
+                f"SELECT COALESCE({date_text('a.AppointmentDate')}, '') AS EventDate, 'Appointment' AS Kind, "
+                "a.AppointmentID AS SourceID, a.AppointmentTime AS EventTime, d.Name AS Doctor, "
+                "CAST(NULL AS NVARCHAR(200)) AS Description, CAST(NULL AS NVARCHAR(100)) AS Item, "
+                "a.DurationMinutes AS Quantity, CAST(NULL AS DECIMAL(10,2)) AS Amount "
+                "FROM Appointments a JOIN Doctors d ON a.DoctorID = d.DoctorID WHERE a.PatientID = ? "
+                "UNION ALL "
+                f"SELECT COALESCE({date_text('pr.PrescribedDate')}, ''), 'Prescription', pr.PrescriptionID, NULL, "
+                "d.Name, pr.Diagnosis, pr.Medication, pr.Quantity, NULL "
+                "FROM Prescriptions pr JOIN Doctors d ON pr.DoctorID = d.DoctorID WHERE pr.PatientID = ? "
+                "UNION ALL "
+                f"SELECT COALESCE({date_text('b.BillDate')}, ''), 'Bill', b.BillID, NULL, NULL, b.Status, NULL, "
+                "NULL, b.Amount "
+                "FROM Bills b WHERE b.PatientID = ?) "
+                + self.backend.select_top("EventDate, Kind, SourceID, EventTime, Doctor, Description, Item, "
+                                          f"Quantity, Amount FROM PatientHistory {where} "
+                                          "ORDER BY EventDate DESC, Kind DESC, SourceID DESC", limit))
+
+    def fetch_patient_history(self, patient_id, before=None, limit=HISTORY_PAGE):
+        # One page of the patient's timeline, newest first, as
+        # (EventDate 'YYYY-MM-DD', Kind, SourceID, EventTime, Doctor, Description, Item, Quantity, Amount).
+        # `before` is history_cursor() of the last row already shown. Pages
+        # are cached per patient until a write to one of HISTORY_TABLES.
+        params = (patient_id,) * 3
+        if before is not None:
+            date, kind, source_id = before
+            params += (date, date, kind, kind, source_id)
+        before = tuple(before) if before is not None else None
+        try:
+            return self.history.get_or_load(
+                ('history', patient_id, before, limit),
+                lambda: self._query(self._history_query(before, limit), params),
+                fingerprint=lambda: tuple(self._query(queries.PATIENT_HISTORY_FINGERPRINT, (patient_id,) * 6)[0]))
+        except Exception as e:
+            report_error("Database Error", str(e))
+            return []
+
+    ##########################
+    # APPOINTMENT SCHEDULING
+    ##########################
+
+    def _load_day(self, doctor_id, date):
+        rows = self._query(queries.SELECT_DOCTOR_DAY, (doctor_id, date))
+        return [(appointment_id, to_minutes(time), duration) for appointment_id, time, duration in rows]
+
+    def check_slot(self, doctor_id, date, time, duration=APPOINTMENT_MINUTES, ignore=None):
+        # (appointment_id, start, end) of an appointment of this doctor that
+        # overlaps the slot, or None if it is free. `ignore` skips the
+        # appointment being moved.
+        start = to_minutes(time)
+        return self.schedule.day(doctor_id, date, self._load_day).conflict(start, start + duration, ignore)
+
+    def _load_days(self, keys):
+        # Appointments for many doctor-days in one query per 500 doctors:
+        # {(doctor_id, date): [(appointment_id, start, duration), ...]}
+        doctor_ids = sorted({doctor_id for doctor_id, _ in keys})
+        first, last = min(date for _, date in keys), max(date for _, date in keys)
+        wanted = set(keys)
+        days = {}
+        for i in range(0, len(doctor_ids), 500):
+            chunk = doctor_ids[i:i + 500]
+            rows = self._query(
+                "SELECT DoctorID, AppointmentDate, AppointmentID, AppointmentTime, DurationMinutes FROM Appointments "
+                f"WHERE AppointmentDate BETWEEN ? AND ? AND DoctorID IN ({', '.join('?' * len(chunk))})",
+                (first, last, *chunk))
+            for doctor_id, date, appointment_id, time, duration in rows:
+                if (doctor_id, date) in wanted:
+                    days.setdefault((doctor_id, date), []).append((appointment_id, to_minutes(time), duration))
+        return days
+
+    def fetch_specializations(self):
+        return sorted({d[2] for d in self.fetch_doctors() if d[2]})
+
+    def find_free_slots(self, specialization, start_date, end_date, minutes=APPOINTMENT_MINUTES,
+                        limit=FREE_SLOT_LIMIT, now=None):
+        # The earliest `limit` free slots of `minutes` among all doctors with this
+        # specialization, as (date, 'HH:MM', doctor_id, 'Name (ID)') tuples.
+        # Slots earlier than `now` (default: the current time) are skipped.
+        now = now or datetime.datetime.now()
+        doctors = {d[0]: f"{d[1]} ({d[0]})" for d in self.fetch_doctors()
+                   if (d[2] or '').strip().lower() == specialization.strip().lower()}
+        start_date = max(start_date, now.date())
+        dates = [start_date + datetime.timedelta(days=n) for n in range((end_date - start_date).days + 1)]
+        if not doctors or not dates:
+            return []
+
+        schedules = self.schedule.days([(doctor_id, date) for date in dates for doctor_id in doctors],
+                                       self._load_days)
+        slots = []
+        for date in dates:
+            earliest = now.hour * 60 + now.minute + 1 if date == now.date() else 0
+            remaining = limit - len(slots)
+            day = []
+            for doctor_id, label in doctors.items():
+                starts = schedules[(doctor_id, date)].free_starts(minutes, earliest)
+                day.extend((start, label, doctor_id) for start in itertools.islice(starts, remaining))
+            # Within a day the earliest time wins, whoever the doctor is
+            for start, label, doctor_id in sorted(day)[:remaining]:
+                slots.append((date, f"{start // 60:02d}:{start % 60:02d}", doctor_id, label))
+            if len(slots) >= limit:
+                break
+        return slots
+
+    def _write_appointment(self, write, doctor_id, date, time, duration, ignore=None):
+        # Check the slot and write under the schedule lock, then patch the index
+        if isinstance(time, str):
+            time = datetime.time.fromisoformat(time)
+        with self.schedule.lock:
+            conflict = self.check_slot(doctor_id, date, time, duration, ignore)
+            if conflict:
+                raise SlotConflict(*conflict)
+            try:
+                with self.pool.connection() as conn:
+                    appointment_id = write(conn.cursor(), time)
+                    conn.commit()
+            except Exception as e:
+                # Most likely booked from another workstation meanwhile: reload the day
+                self.schedule.forget(doctor_id, date)
+                conflict = self.check_slot(doctor_id, date, time, duration, ignore)
+                if conflict:
+                    raise SlotConflict(*conflict) from e
+                report_error("Database Error", str(e))
+                raise e
+            self.schedule.add(appointment_id, doctor_id, date, to_minutes(time), duration)
+        self._drop_cached('appointments')
+        return appointment_id
+
+    def book_appointment(self, patient_id, doctor_id, date, time, duration=APPOINTMENT_MINUTES):
+        # Inserts the appointment and returns its ID; raises SlotConflict if
+        # the doctor is busy at that time
+        return self._write_appointment(
+            lambda cursor, time: _execute(self.backend, cursor, queries.INSERT_APPOINTMENT,
+                                          (patient_id, doctor_id, date, time, duration), insert=True),
+            doctor_id, date, time, duration)
+
+    def reschedule_appointment(self, appointment_id, patient_id, doctor_id, date, time, duration=APPOINTMENT_MINUTES):
+        def update(cursor, time):
+            _execute(self.backend, cursor, queries.UPDATE_APPOINTMENT,
+                     (patient_id, doctor_id, date, time, duration, appointment_id))
+            return appointment_id
+        return self._write_appointment(update, doctor_id, date, time, duration, ignore=appointment_id)
+
+    def cancel_appointment(self, appointment_id):
+        with self.schedule.lock:
+            try:
+                with self.pool.connection() as conn:
+                    _execute(self.backend, conn.cursor(), queries.DELETE_APPOINTMENT, (appointment_id,))
+                    conn.commit()
+            except Exception as e:
+                report_error("Database Error", str(e))
+                raise e
+            self.schedule.remove(appointment_id)
+        self._drop_cached('appointments')
+
+    ##########################
+    # MEDICINE STOCK
+    ##########################
+    # Every stock change is a conditional UPDATE of Medicines.Quantity plus a
+    # StockLedger row in the same transaction. Two pharmacy terminals cannot
+    # both take the last box: the second UPDATE ... WHERE Quantity >= ? waits
+    # for the first to commit and then matches no row.
+
+    def search_medicines(self, text, limit=SEARCH_LIMIT):
+        return self._search('medicines', lambda m: (m[1],), text, limit)
+
+    def _ledger(self, work, medicine_id, change, reason, prescription_id=None):
+        # Runs after the Medicines update, so it records the quantity that update left
+        work.execute(queries.INSERT_LEDGER_ENTRY, (change, reason, prescription_id, medicine_id))
+
+    def _take_stock(self, work, medicine_id, quantity):
+        work.execute(queries.TAKE_STOCK, (quantity, medicine_id, quantity))
+        if work.rowcount != 1:
+            work.execute(queries.SELECT_STOCK, (medicine_id,))
+            row = work.fetchone()
+            if row is None:
+                raise ValueError(f"Medicine {medicine_id} does not exist.")
+            raise OutOfStock(row[0], quantity, row[1])
+
+    def _return_stock(self, work, medicine_id, quantity):
+        work.execute(queries.RETURN_STOCK, (quantity, medicine_id))
+
+    def prescribe(self, patient_id, doctor_id, diagnosis, medicine_id, quantity, date=None):
+        # Takes `quantity` of the medicine from stock and records the
+        # prescription, or raises OutOfStock and records nothing
+        with self.transaction('prescriptions', 'medicines') as work:
+            self._take_stock(work, medicine_id, quantity)
+            prescription_id = work.insert(
+                queries.INSERT_PRESCRIPTION,
+                (patient_id, doctor_id, diagnosis, quantity, date or datetime.date.today(), medicine_id))
+            self._ledger(work, medicine_id, -quantity, 'Prescription', prescription_id)
+        self.refresh_stock_alerts()
+        return prescription_id
+
+    def update_prescription(self, prescription_id, patient_id, doctor_id, diagnosis, medicine_id, quantity):
+        # A changed medicine or quantity first puts the old amount back, then takes the new one
+        with self.transaction('prescriptions', 'medicines') as work:
+            work.execute(queries.SELECT_PRESCRIBED, (prescription_id,))
+            row = work.fetchone()
+            if row is None:
+                raise ValueError(f"Prescription {prescription_id} does not exist.")
+            old_medicine, old_quantity = row
+            if (old_medicine, old_quantity) != (medicine_id, quantity):
+                if old_medicine is not None:
+                    self._return_stock(work, old_medicine, old_quantity)
+                    self._ledger(work, old_medicine, old_quantity, 'Prescription changed', prescription_id)
+                self._take_stock(work, medicine_id, quantity)
+                self._ledger(work, medicine_id, -quantity, 'Prescription changed', prescription_id)
+            work.execute(queries.UPDATE_PRESCRIPTION,
+                         (patient_id, doctor_id, diagnosis, medicine_id, quantity, medicine_id, prescription_id))
+        self.refresh_stock_alerts()
+
+    def delete_prescription(self, prescription_id):
+        # Deleting a prescription puts its medicine back in stock
+        with self.transaction('prescriptions', 'medicines') as work:
+            work.execute(queries.SELECT_PRESCRIBED, (prescription_id,))
+            row = work.fetchone()
+            work.execute(queries.DELETE_PRESCRIPTION, (prescription_id,))
+            if row and row[0] is not None:
+                self._return_stock(work, row[0], row[1])
+                self._ledger(work, row[0], row[1], 'Prescription deleted', prescription_id)
+        self.refresh_stock_alerts()
+
+    def add_medicine(self, name, quantity, price):
+        with self.transaction('medicines') as work:
+            medicine_id = work.insert(queries.INSERT_MEDICINE, (name, quantity, price))
+            self._ledger(work, medicine_id, quantity, 'Opening balance')
+        self.refresh_stock_alerts()
+        return medicine_id
+
+    def update_medicine(self, medicine_id, name, quantity, price):
+        # `quantity` is a stock count: the ledger records the difference to what was there
+        with self.transaction('medicines') as work:
+            work.execute(queries.UPDATE_MEDICINE_DETAILS, (name, price, medicine_id))
+            work.execute(queries.SELECT_STOCK, (medicine_id,))
+            row = work.fetchone()
+            if row is None:
+                raise ValueError(f"Medicine {medicine_id} does not exist.")
+            if quantity != row[1]:
+                work.execute(queries.SET_STOCK, (quantity, medicine_id))
+                self._ledger(work, medicine_id, quantity - row[1], 'Stock count')
+        self.refresh_stock_alerts()
+
+    def restock(self, medicine_id, quantity, reason='Delivery'):
+        with self.transaction('medicines') as work:
+            self._return_stock(work, medicine_id, quantity)
+            self._ledger(work, medicine_id, quantity, reason)
+        self.refresh_stock_alerts()
+
+    def refresh_stock_alerts(self):
+        # Loads the low-stock list once, then applies only the ledger rows
+        # written since (by this terminal or any other)
+        try:
+            applied = False
+            if self.stock.loaded:
+                # False if another thread cleared the list meanwhile: reload it then
+                applied = self.stock.apply(self._query(queries.SELECT_LEDGER_SINCE, (self.stock.last_entry,)))
+            if not applied:
+                last_entry = self._query(queries.SELECT_LAST_LEDGER_ENTRY)[0][0]
+                self.stock.load(self._query(queries.SELECT_LOW_STOCK), last_entry)
+        except Exception as e:
+            report_error("Database Error", str(e))
+        return self.stock.low()
+
+    def fetch_dashboard(self, today=None, days=REVENUE_DAYS):
+        # Key lookups on the trigger-maintained aggregates: constant time
+        # however many appointments and bills the tables hold
+        today = today or datetime.date.today()
+        start = today - datetime.timedelta(days=days - 1)
+        totals = {status: (bills, money(amount))
+                  for status, bills, amount in self._fetch_all(queries.SELECT_BILL_STATUS_TOTALS)}
+        revenue = {as_date(day): (bills, money(billed), money(resolved))
+                   for day, bills, billed, resolved in self._fetch_all(queries.SELECT_DAILY_REVENUE, (start, today))}
+        return {
+            'date': today,
+            'appointments': [tuple(row) for row in self._fetch_all(queries.SELECT_DOCTOR_DAY_TOTALS, (today,))],
+            'pending': totals.get('Pending', (0, money(0))),
+            'bill_totals': totals,
+            # Every day in the range, including those without bills
+            'revenue': [(day, *revenue.get(day, (0, money(0), money(0))))
+                        for day in (start + datetime.timedelta(days=n) for n in range(days))],
+            'low_stock': self.refresh_stock_alerts(),
+        }
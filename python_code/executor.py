@@ -0,0 +1,112 @@
+import queue
+import threading
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import messagebox
+
+import database
+
+
+POLL_MS = 16      # ~60fps; how often the Tk thread picks up finished queries
+
+
+##########################
+# QUERY EXECUTOR
+##########################
+
+class QueryExecutor:
+    # Runs database calls on worker threads so the Tk main loop never waits
+    # on a round trip. Callbacks always run on the Tk thread: workers only put
+    # them on a queue that the main loop drains with root.after().
+
+    def __init__(self, root, workers=database.POOL_SIZE):
+        self.root = root
+        self._workers = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='db')
+        self._callbacks = queue.SimpleQueue()
+        self._tasks = {}       # future -> (owner path, busy indicator)
+        self._lock = threading.Lock()
+        self._previous_handler = database.set_error_handler(self._report_error)
+        self._poll_id = self.root.after(POLL_MS, self._poll)
+
+    def submit(self, fn, *args, owner=None, busy=None, on_done=None, on_error=None, **kwargs):
+        # owner is the widget the result is for; cancel(owner) drops it
+        if busy is not None:
+            busy.start()
+        future = self._workers.submit(fn, *args, **kwargs)
+        with self._lock:
+            self._tasks[future] = (str(owner) if owner is not None else None, busy)
+        future.add_done_callback(
+            lambda f: self._callbacks.put(lambda: self._deliver(f, on_done, on_error)))
+        return future
+
+    def call_soon(self, fn, *args):
+        # Safe from any thread: run fn(*args) on the Tk thread
+        self._callbacks.put(lambda: fn(*args))
+
+    def cancel(self, owner):
+        # Cancel work for a widget and all of its children, e.g. a manager
+        # that clear_content() is about to destroy. Queries already running
+        # finish in the background, but their results are dropped.
+        path = str(owner)
+        with self._lock:
+            dropped = [(future, busy) for future, (task_owner, busy) in self._tasks.items()
+                       if task_owner is not None and (task_owner == path or task_owner.startswith(path + '.'))]
+            for future, _ in dropped:
+                del self._tasks[future]
+        for future, busy in dropped:
+            future.cancel()
+            self._stop_busy(busy)
+
+    def pending(self, owner=None):
+        # Tasks not yet delivered, for a widget and its children or for everyone
+        path = str(owner) if owner is not None else None
+        with self._lock:
+            return sum(1 for task_owner, _ in self._tasks.values()
+                       if path is None or (task_owner is not None and
+                                           (task_owner == path or task_owner.startswith(path + '.'))))
+
+    def shutdown(self):
+        self.root.after_cancel(self._poll_id)
+        self._workers.shutdown(wait=False, cancel_futures=True)
+        database.set_error_handler(self._previous_handler)
+
+    def _deliver(self, future, on_done, on_error):
+        with self._lock:
+            task = self._tasks.pop(future, None)
+        if task is None or future.cancelled():
+            return  # cancelled, owner may already be destroyed
+        self._stop_busy(task[1])
+        error = future.exception()
+        if error is not None:
+            if on_error is not None:
+                on_error(error)
+            else:
+                messagebox.showerror("Error", str(error))
+        elif on_done is not None:
+            on_done(future.result())
+
+    def _poll(self):
+        while True:
+            try:
+                callback = self._callbacks.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback()
+            except Exception as e:
+                messagebox.showerror("Error", str(e))
+        self._poll_id = self.root.after(POLL_MS, self._poll)
+
+    def _report_error(self, title, message):
+        if threading.current_thread() is threading.main_thread():
+            messagebox.showerror(title, message)
+        else:
+            self.call_soon(messagebox.showerror, title, message)
+
+    @staticmethod
+    def _stop_busy(busy):
+        if busy is not None:
+            try:
+                busy.stop()
+            except tk.TclError:
+                pass  # indicator was destroyed with its screen
@@ -0,0 +1,200 @@
+import argparse
+import csv
+import datetime
+import re
+import sys
+import time
+from decimal import Decimal
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet / Arrow export is optional
+    pa = pq = None
+
+from database import Database, STREAM_CHUNK
+
+
+# Streams a table, view or screen listing to CSV, Parquet or Arrow one
+# fetchmany chunk at a time, so a year of bills never sits in memory at once:
+#   python -m export bills bills.parquet
+#   python -m export --query "SELECT * FROM Bills WHERE BillDate >= '2024-01-01'" bills_2024.csv
+
+SCREENS = ('patients', 'doctors', 'medicines', 'appointments', 'prescriptions', 'bills')
+
+
+def source_query(db, source):
+    # Screen names export what the screen shows (names instead of IDs);
+    # anything else is taken as a table or view name
+    if source.lower() in SCREENS:
+        return db.entity_query(source.lower())
+    if not re.match(r'^[A-Za-z_][\w.]*$', source):
+        raise ValueError(f"Not a table or view name: {source}")
+    return f"SELECT * FROM {source}"
+
+
+def format_of(path):
+    lowered = path.lower()
+    if lowered.endswith('.parquet'):
+        return 'parquet'
+    if lowered.endswith(('.arrow', '.feather')):
+        return 'arrow'
+    return 'csv'
+
+
+##########################
+# WRITERS
+##########################
+
+class CsvWriter:
+    def __init__(self, path, columns):
+        self._file = open(path, 'w', newline='', encoding='utf-8')
+        self._csv = csv.writer(self._file)
+        self._csv.writerow(columns)
+
+    def write(self, rows):
+        self._csv.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+# Arrow type of a column the driver reports the type of (pyodbc gives the
+# Python class, plus precision and scale for DECIMAL)
+_ARROW_TYPES = [
+    (bool, lambda: pa.bool_()),
+    (int, lambda: pa.int64()),
+    (float, lambda: pa.float64()),
+    (datetime.datetime, lambda: pa.timestamp('us')),
+    (datetime.date, lambda: pa.date32()),
+    (datetime.time, lambda: pa.time64('us')),
+    ((bytes, bytearray), lambda: pa.binary()),
+    (str, lambda: pa.string()),
+]
+
+
+def _declared_type(type_code, precision, scale):
+    if not isinstance(type_code, type):
+        return None     # SQLite reports no types
+    if issubclass(type_code, Decimal):
+        return pa.decimal128(precision, scale) if precision else None
+    for python_type, arrow_type in _ARROW_TYPES:
+        if issubclass(type_code, python_type):
+            return arrow_type()
+    return pa.string()
+
+
+def _sniffed_type(values):
+    # Untyped (SQLite) columns: decided by the first chunk's values. A column
+    # with no value yet becomes string, which later values are widened to.
+    present = [v for v in values if v is not None]
+    if not present:
+        return pa.string()
+    if all(isinstance(v, Decimal) for v in present):
+        # Generous fixed scale: later chunks may carry more decimals than the first
+        scale = max(-v.as_tuple().exponent for v in present)
+        return pa.decimal128(38, max(scale, 9))
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+        return pa.float64() if any(isinstance(v, float) for v in present) else pa.int64()
+    kinds = {type(v) for v in present}
+    if len(kinds) == 1:
+        arrow_type = _declared_type(kinds.pop(), None, None)
+        if arrow_type is not None:
+            return arrow_type
+    return pa.string()
+
+
+def _widen(values, arrow_type):
+    # Anything can be written to a string column as text
+    if pa.types.is_string(arrow_type):
+        return [v if v is None or isinstance(v, str) else str(v) for v in values]
+    return values
+
+
+class ArrowWriter:
+    # One Parquet row group / Arrow record batch per chunk. The schema comes
+    # from the cursor description where the driver reports column types, and
+    # from the first chunk's values only for untyped (SQLite) columns.
+    def __init__(self, path, description, fmt='parquet'):
+        if pa is None:
+            raise RuntimeError("pyarrow is not installed. Run 'pip install pyarrow' or export to CSV")
+        self.path = path
+        self.fmt = fmt
+        self.columns = [d[0] for d in description]
+        self.declared = [_declared_type(d[1], d[4], d[5]) for d in description]
+        self.schema = None
+        self._writer = None
+
+    def _open(self, schema):
+        self.schema = schema
+        self._writer = (pq.ParquetWriter(self.path, schema) if self.fmt == 'parquet'
+                        else pa.ipc.new_file(self.path, schema))
+
+    def write(self, rows):
+        data = [[row[i] for row in rows] for i in range(len(self.columns))]
+        if self._writer is None:
+            self._open(pa.schema([(name, declared or _sniffed_type(values))
+                                  for name, declared, values in zip(self.columns, self.declared, data)]))
+        self._writer.write_batch(pa.record_batch(
+            [pa.array(_widen(values, field.type), type=field.type) for values, field in zip(data, self.schema)],
+            schema=self.schema))
+
+    def close(self):
+        if self._writer is None:
+            # No rows: still leave a readable file
+            self._open(pa.schema([(name, declared or pa.string())
+                                  for name, declared in zip(self.columns, self.declared)]))
+        self._writer.close()
+
+
+##########################
+# EXPORT
+##########################
+
+def export(source, path, db=None, query=None, params=(), fmt=None, chunk_size=STREAM_CHUNK, progress=None):
+    # Returns the number of rows written; progress(rows) is called after every chunk
+    db = db or Database()
+    fmt = fmt or format_of(path)
+    query = query or source_query(db, source)
+
+    rows_written = 0
+    with db.stream(query, params, chunk_size, describe=True) as (description, chunks):
+        writer = (CsvWriter(path, [d[0] for d in description]) if fmt == 'csv'
+                  else ArrowWriter(path, description, fmt))
+        try:
+            for rows in chunks:
+                writer.write(rows)
+                rows_written += len(rows)
+                if progress:
+                    progress(rows_written)
+        finally:
+            writer.close()
+    return rows_written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream a table, view or screen listing to CSV / Parquet / Arrow.")
+    parser.add_argument('source', nargs='?', help=f"table or view name, or one of: {', '.join(SCREENS)}")
+    parser.add_argument('path', help="output file; the format follows the extension (.csv, .parquet, .arrow)")
+    parser.add_argument('--query', help="export the result of this SELECT instead of a table")
+    parser.add_argument('--format', dest='fmt', choices=('csv', 'parquet', 'arrow'))
+    parser.add_argument('--chunk-size', type=int, default=STREAM_CHUNK)
+    args = parser.parse_args(argv)
+    if not args.source and not args.query:
+        parser.error("give a table name or --query")
+
+    started = time.perf_counter()
+
+    def progress(rows):
+        elapsed = time.perf_counter() - started
+        print(f"\r{rows} rows ({rows / elapsed:,.0f} rows/s)", end='', file=sys.stderr)
+
+    rows = export(args.source, args.path, query=args.query, fmt=args.fmt,
+                  chunk_size=args.chunk_size, progress=progress)
+    print(file=sys.stderr)
+    print(f"Exported {rows} rows to {args.path} in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
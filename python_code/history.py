@@ -0,0 +1,38 @@
+from cache import EntityCache
+
+
+# A patient's chart: appointments, prescriptions and bills in one timeline,
+# newest first. Database.fetch_patient_history reads it with one UNION ALL
+# query over the PatientID indexes and pages it by keyset, using the
+# (EventDate, Kind, SourceID) of the last row shown as the cursor, so the
+# tenth page costs the same as the first.
+
+HISTORY_PAGE = 50           # events per page
+HISTORY_CACHE_SIZE = 256    # pages kept, across all patients
+
+# Writes to these tables can change a timeline (doctor names are shown,
+# deleting a patient or doctor cascades)
+HISTORY_TABLES = frozenset({'appointments', 'prescriptions', 'bills', 'patients', 'doctors'})
+
+# Row layout of fetch_patient_history
+EVENT_FIELDS = ('EventDate', 'Kind', 'SourceID', 'EventTime', 'Doctor', 'Description', 'Item', 'Quantity', 'Amount')
+
+
+def history_cursor(row):
+    # The `before` argument that continues after this row
+    return tuple(row[:3])
+
+
+def describe(row):
+    # One line of text for an event, as shown on the History screen
+    _, kind, _, _, _, description, item, quantity, amount = row
+    if kind == 'Appointment':
+        return f"{quantity} min"
+    if kind == 'Prescription':
+        return f"{description}: {item or '?'} x {quantity}"
+    return f"{amount} ({description})"
+
+
+# Shared by every Database instance in the process. Kept apart from the entity
+# cache so that opening many charts does not evict the patient / doctor lists.
+patient_history = EntityCache(maxsize=HISTORY_CACHE_SIZE)
@@ -0,0 +1,205 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+
+
+# Per-query instrumentation: every statement Database runs is recorded here
+# with its latency, rows and (approximate) bytes fetched. Queries slower than
+# SLOW_QUERY_MS are logged with their SQL and parameters, and the counters can
+# be written out in the Prometheus text format for a node_exporter textfile
+# collector (HMS_METRICS_FILE=/var/lib/node_exporter/hms.prom).
+
+SLOW_QUERY_MS = float(os.environ.get('HMS_SLOW_QUERY_MS', 500))
+METRICS_FILE = os.environ.get('HMS_METRICS_FILE')
+METRICS_INTERVAL = 15       # seconds between metrics file writes
+SLOW_QUERY_KEEP = 50        # recent slow queries kept for the debug panel
+
+# Histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+slow_query_log = logging.getLogger('hms.slow_queries')
+
+_CTE = re.compile(r'\s*WITH\s+(\w+)\s+AS\b', re.IGNORECASE)
+_VERB_TABLE = re.compile(r'\s*(?:SET\s+NOCOUNT\s+ON;\s*)?(?:(INSERT)\s+INTO|(UPDATE)|(DELETE)\s+FROM|(SELECT)\b.*?\bFROM)'
+                         r'\s+\[?(\w+)', re.IGNORECASE | re.DOTALL)
+
+
+@lru_cache(maxsize=1024)
+def query_name(sql):
+    # Metric name for SQL that is not a registry Statement: verb_table, e.g. select_appointments
+    # (select_<name> for a query built on a common table expression)
+    match = _CTE.match(sql)
+    if match:
+        return f"select_{match.group(1)}".lower()
+    match = _VERB_TABLE.match(sql)
+    if not match:
+        return sql.split(None, 1)[0].lower() if sql.strip() else 'empty'
+    verb = next(group for group in match.groups()[:4] if group)
+    return f"{verb}_{match.group(5)}".lower()
+
+
+def result_bytes(rows):
+    # Rough payload size of fetched rows: text and binary by length, anything else as 8 bytes
+    total = 0
+    for row in rows:
+        for value in row:
+            if isinstance(value, (str, bytes)):
+                total += len(value)
+            elif value is not None:
+                total += 8
+    return total
+
+
+class _Series:
+    __slots__ = ('calls', 'errors', 'seconds', 'max_seconds', 'rows', 'bytes', 'buckets', 'slow')
+
+    def __init__(self, buckets):
+        self.calls = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.buckets = [0] * (len(buckets) + 1)     # last one is +Inf
+        self.slow = 0
+
+    def percentile(self, bounds, fraction):
+        # Upper bound of the bucket holding the given fraction of calls
+        wanted = fraction * self.calls
+        seen = 0
+        for bound, count in zip(bounds, self.buckets):
+            seen += count
+            if seen >= wanted:
+                return bound
+        return self.max_seconds
+
+
+##########################
+# QUERY METRICS
+##########################
+
+class QueryMetrics:
+    def __init__(self, slow_ms=SLOW_QUERY_MS, buckets=LATENCY_BUCKETS):
+        self.slow_seconds = slow_ms / 1000
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self._series = {}
+        self._collectors = []
+        self.slow_queries = deque(maxlen=SLOW_QUERY_KEEP)    # (time, name, ms, sql, params)
+        self.started = time.time()
+
+    def record(self, name, sql, params, seconds, rows=0, nbytes=0, error=False):
+        with self.lock:
+            series = self._series.get(name)
+            if series is None:
+                series = self._series[name] = _Series(self.buckets)
+            series.calls += 1
+            series.seconds += seconds
+            series.max_seconds = max(series.max_seconds, seconds)
+            series.rows += max(rows, 0)
+            series.bytes += nbytes
+            index = 0
+            while index < len(self.buckets) and seconds > self.buckets[index]:
+                index += 1
+            series.buckets[index] += 1
+            if error:
+                series.errors += 1
+            slow = seconds >= self.slow_seconds
+            if slow:
+                series.slow += 1
+                self.slow_queries.append((time.time(), name, seconds * 1000, sql, params))
+        if slow:
+            slow_query_log.warning("Slow query %s: %.1f ms, %d rows\n%s\nparams: %r",
+                                   name, seconds * 1000, rows, sql.strip(), params)
+
+    def set_slow_threshold(self, ms):
+        self.slow_seconds = ms / 1000
+
+    def snapshot(self):
+        # [{name, calls, errors, total_ms, avg_ms, p50_ms, p95_ms, max_ms, rows, bytes, slow}], slowest total first
+        with self.lock:
+            rows = [{'name': name, 'calls': s.calls, 'errors': s.errors,
+                     'total_ms': round(s.seconds * 1000, 3), 'avg_ms': round(s.seconds * 1000 / s.calls, 3),
+                     'p50_ms': round(s.percentile(self.buckets, 0.5) * 1000, 3),
+                     'p95_ms': round(s.percentile(self.buckets, 0.95) * 1000, 3),
+                     'max_ms': round(s.max_seconds * 1000, 3), 'rows': s.rows, 'bytes': s.bytes, 'slow': s.slow}
+                    for name, s in self._series.items()]
+        return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+    def reset(self):
+        with self.lock:
+            self._series.clear()
+            self.slow_queries.clear()
+
+    def add_collector(self, collect):
+        # collect() -> [(metric name, type, help text, value)] of extra series for the
+        # export; type is 'gauge' for a current level, 'counter' (name ending in
+        # _total) for a running count
+        self._collectors.append(collect)
+
+    def prometheus_text(self):
+        lines = []
+
+        def family(metric, kind, help_text):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {kind}")
+
+        with self.lock:
+            series = sorted(self._series.items())
+            family('hms_db_queries_total', 'counter', 'Statements executed.')
+            lines += [f'hms_db_queries_total{{query="{name}"}} {s.calls}' for name, s in series]
+            family('hms_db_query_errors_total', 'counter', 'Statements that raised.')
+            lines += [f'hms_db_query_errors_total{{query="{name}"}} {s.errors}' for name, s in series]
+            family('hms_db_slow_queries_total', 'counter', 'Statements slower than the slow-query threshold.')
+            lines += [f'hms_db_slow_queries_total{{query="{name}"}} {s.slow}' for name, s in series]
+            family('hms_db_rows_total', 'counter', 'Rows fetched or affected.')
+            lines += [f'hms_db_rows_total{{query="{name}"}} {s.rows}' for name, s in series]
+            family('hms_db_fetched_bytes_total', 'counter', 'Approximate bytes fetched.')
+            lines += [f'hms_db_fetched_bytes_total{{query="{name}"}} {s.bytes}' for name, s in series]
+            family('hms_db_query_duration_seconds', 'histogram', 'Statement latency.')
+            for name, s in series:
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), s.buckets):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'hms_db_query_duration_seconds_bucket{{query="{name}",le="{le}"}} {cumulative}')
+                lines.append(f'hms_db_query_duration_seconds_sum{{query="{name}"}} {s.seconds:.6f}')
+                lines.append(f'hms_db_query_duration_seconds_count{{query="{name}"}} {s.calls}')
+        for collect in list(self._collectors):
+            for metric, kind, help_text, value in collect():
+                family(metric, kind, help_text)
+                lines.append(f"{metric} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        # Written to a temporary file and renamed, so a scraper never reads half a file
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, path)
+
+    def start_exporter(self, path=METRICS_FILE, interval=METRICS_INTERVAL):
+        # Rewrites the metrics file every `interval` seconds from a daemon thread
+        if not path:
+            return None
+        stop = threading.Event()
+
+        def run():
+            while True:
+                try:
+                    self.write_prometheus(path)
+                except OSError as e:
+                    slow_query_log.error("Could not write metrics to %s: %s", path, e)
+                if stop.wait(interval):
+                    return
+
+        threading.Thread(target=run, name='metrics-exporter', daemon=True).start()
+        return stop
+
+
+# Shared by every Database instance in the process
+query_metrics = QueryMetrics()
@@ -0,0 +1,440 @@
+import argparse
+import sys
+from stock import OPENING_BALANCES, REORDER_LEVEL
+from dashboard import BACKFILL
+
+
+# Each migration is (version, description, steps). A step takes the backend
+# and returns the SQL statements to run, so one list serves both engines.
+# Every statement must be idempotent: a migration that failed half way can be re-run.
+
+def create_index(name, table, columns, unique=False):
+    return lambda backend: [backend.create_index_sql(name, table, columns, unique)]
+
+
+def add_column(table, column, definition):
+    return lambda backend: [backend.add_column_sql(table, column, definition)]
+
+
+def create_table(table, columns):
+    return lambda backend: [backend.create_table_sql(table, columns)]
+
+
+def sql(*statements):
+    # Plain statements valid on both engines
+    return lambda backend: list(statements)
+
+
+def outside_transaction(step):
+    # SQL Server refuses full-text DDL inside a user transaction: the statements
+    # of such a step run with autocommit, after committing what came before them
+    step.outside_transaction = True
+    return step
+
+
+def appointment_overlap_guard(backend):
+    # Refuse an appointment that overlaps another one of the same doctor, as a
+    # backstop for the in-process check in Database.book_appointment (covers
+    # other workstations and plain INSERT / UPDATE statements). Slots are
+    # compared as date-times, so an end time cannot wrap past midnight, and a
+    # slot that ends after midnight is refused: schedules are kept per day.
+    if backend.name == 'sqlite':
+        def slot(row):
+            start = f"datetime({row}.AppointmentDate || ' ' || time({row}.AppointmentTime))"
+            return start, f"datetime({start}, '+' || {row}.DurationMinutes || ' minutes')"
+        (new_start, new_end), (start, end) = slot('NEW'), slot('a')
+        checks = (
+            f"SELECT RAISE(ABORT, 'An appointment must end by midnight') "
+            f"WHERE {new_end} > datetime(NEW.AppointmentDate, '+1 day'); "
+            f"""SELECT RAISE(ABORT, 'Doctor is already booked at this time')
+            WHERE EXISTS (SELECT 1 FROM Appointments a
+                WHERE a.DoctorID = NEW.DoctorID AND a.AppointmentDate = NEW.AppointmentDate
+                  AND a.AppointmentID IS NOT NEW.AppointmentID
+                  AND {start} < {new_end} AND {new_start} < {end});""")
+        return [
+            f"CREATE TRIGGER IF NOT EXISTS TR_Appointments_NoOverlap_Insert BEFORE INSERT ON Appointments "
+            f"BEGIN {checks} END",
+            f"CREATE TRIGGER IF NOT EXISTS TR_Appointments_NoOverlap_Update "
+            f"BEFORE UPDATE OF DoctorID, AppointmentDate, AppointmentTime, DurationMinutes ON Appointments "
+            f"BEGIN {checks} END",
+        ]
+    # CREATE TRIGGER must start its own batch, hence EXEC. A THROW in a
+    # trigger runs with XACT_ABORT on: it ends the batch and rolls back the
+    # caller's whole transaction, savepoints included (UnitOfWork.savepoint
+    # checks for that). The application checks the slot first (check_slot),
+    # so this only fires when another workstation got there first.
+    def slot(row):
+        start = f"CAST({row}.AppointmentDate AS DATETIME) + CAST({row}.AppointmentTime AS DATETIME)"
+        return start, f"DATEADD(MINUTE, {row}.DurationMinutes, {start})"
+    (new_start, new_end), (start, end) = slot('i'), slot('a')
+    return [f"""EXEC('CREATE OR ALTER TRIGGER TR_Appointments_NoOverlap ON Appointments AFTER INSERT, UPDATE AS
+BEGIN
+    SET NOCOUNT ON;
+    IF EXISTS (SELECT 1 FROM inserted i
+               WHERE {new_end} > DATEADD(DAY, 1, CAST(i.AppointmentDate AS DATETIME)))
+        THROW 50001, ''An appointment must end by midnight'', 1;
+    IF EXISTS (SELECT 1 FROM inserted i JOIN Appointments a
+               ON a.DoctorID = i.DoctorID AND a.AppointmentDate = i.AppointmentDate
+              AND a.AppointmentID <> i.AppointmentID
+              AND {start} < {new_end}
+              AND {new_start} < {end})
+        THROW 50001, ''Doctor is already booked at this time'', 1;
+END')"""]
+
+
+def replace_appointment_overlap_guard(backend):
+    # SQLite has no CREATE OR ALTER TRIGGER: drop the old triggers first
+    drops = []
+    if backend.name == 'sqlite':
+        drops = [f"DROP TRIGGER IF EXISTS TR_Appointments_NoOverlap_{action}" for action in ('Insert', 'Update')]
+    return drops + appointment_overlap_guard(backend)
+
+
+def table_versions(*tables):
+    # SQLite only: COUNT/MAX over a table misses rows edited in place (a
+    # renamed doctor, a corrected contact), so an update trigger bumps a
+    # per-table counter that SqliteBackend.fingerprint_sql reads as well.
+    # SQL Server's fingerprint already sees updates through CHECKSUM_AGG.
+    def step(backend):
+        if backend.name != 'sqlite':
+            return []
+        return ["CREATE TABLE IF NOT EXISTS TableVersions (TableName TEXT PRIMARY KEY, Version INTEGER NOT NULL)"] + [
+            f"CREATE TRIGGER IF NOT EXISTS TR_{table}_Version AFTER UPDATE ON {table} "
+            f"BEGIN INSERT INTO TableVersions (TableName, Version) VALUES ('{table}', 1) "
+            f"ON CONFLICT (TableName) DO UPDATE SET Version = Version + 1; END"
+            for table in tables]
+    return step
+
+
+def append_only_guard(table):
+    # Refuse UPDATE and DELETE on a ledger table
+    def step(backend):
+        if backend.name == 'sqlite':
+            return [f"CREATE TRIGGER IF NOT EXISTS TR_{table}_No{action.title()} BEFORE {action} ON {table} "
+                    f"BEGIN SELECT RAISE(ABORT, '{table} is append-only'); END"
+                    for action in ('UPDATE', 'DELETE')]
+        return [f"""EXEC('CREATE OR ALTER TRIGGER TR_{table}_AppendOnly ON {table} INSTEAD OF UPDATE, DELETE AS
+BEGIN
+    THROW 50002, ''{table} is append-only'', 1;
+END')"""]
+    return step
+
+
+@outside_transaction
+def prescription_search_index(backend):
+    # Inverted index over Diagnosis and Medication for text_search
+    if backend.name == 'sqlite':
+        insert = ("INSERT INTO PrescriptionSearch (rowid, Diagnosis, Medication) "
+                  "VALUES (NEW.PrescriptionID, NEW.Diagnosis, NEW.Medication);")
+        delete = ("INSERT INTO PrescriptionSearch (PrescriptionSearch, rowid, Diagnosis, Medication) "
+                  "VALUES ('delete', OLD.PrescriptionID, OLD.Diagnosis, OLD.Medication);")
+        return [
+            # External content: the index holds only the tokens, the text stays in Prescriptions
+            "CREATE VIRTUAL TABLE IF NOT EXISTS PrescriptionSearch USING fts5(Diagnosis, Medication, "
+            "content='Prescriptions', content_rowid='PrescriptionID', "
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+            f"CREATE TRIGGER IF NOT EXISTS TR_Prescriptions_Search_Insert AFTER INSERT ON Prescriptions "
+            f"BEGIN {insert} END",
+            f"CREATE TRIGGER IF NOT EXISTS TR_Prescriptions_Search_Delete AFTER DELETE ON Prescriptions "
+            f"BEGIN {delete} END",
+            f"CREATE TRIGGER IF NOT EXISTS TR_Prescriptions_Search_Update AFTER UPDATE OF Diagnosis, Medication "
+            f"ON Prescriptions BEGIN {delete} {insert} END",
+            "INSERT INTO PrescriptionSearch (PrescriptionSearch) VALUES ('rebuild')",
+        ]
+    # Needs the Full-Text Search feature; skipped (and searches fail) without it
+    installed = "FULLTEXTSERVICEPROPERTY('IsFullTextInstalled') = 1"
+    return [
+        f"IF {installed} AND NOT EXISTS (SELECT 1 FROM sys.fulltext_catalogs WHERE name = 'HmsFullText') "
+        "CREATE FULLTEXT CATALOG HmsFullText",
+        f"""IF {installed} AND NOT EXISTS (SELECT 1 FROM sys.fulltext_indexes WHERE object_id = OBJECT_ID('Prescriptions'))
+BEGIN
+    DECLARE @sql NVARCHAR(400) = N'CREATE FULLTEXT INDEX ON Prescriptions (Diagnosis, Medication) KEY INDEX '
+        + QUOTENAME((SELECT name FROM sys.indexes WHERE object_id = OBJECT_ID('Prescriptions') AND is_primary_key = 1))
+        + N' ON HmsFullText WITH CHANGE_TRACKING AUTO';
+    EXEC(@sql);
+END""",
+    ]
+
+
+def dashboard_aggregates(backend):
+    # Keep DailyAppointments, DailyRevenue and BillStatusTotals current: every
+    # write adds its row's contribution and takes away the old row's
+    if backend.name == 'sqlite':
+        def appointment(row, sign):
+            return (f"INSERT INTO DailyAppointments (AppointmentDate, DoctorID, Appointments) "
+                    f"SELECT {row}.AppointmentDate, {row}.DoctorID, {sign}1 "
+                    f"WHERE {row}.AppointmentDate IS NOT NULL AND {row}.DoctorID IS NOT NULL "
+                    "ON CONFLICT (AppointmentDate, DoctorID) DO UPDATE SET "
+                    "Appointments = Appointments + excluded.Appointments;")
+
+        def bill(row, sign):
+            amount = f"{sign}COALESCE({row}.Amount, 0)"
+            return (f"INSERT INTO DailyRevenue (BillDate, Bills, Billed, Resolved) "
+                    f"SELECT {row}.BillDate, {sign}1, {amount}, CASE WHEN {row}.Status = 'Resolved' "
+                    f"THEN {amount} ELSE 0 END WHERE {row}.BillDate IS NOT NULL "
+                    "ON CONFLICT (BillDate) DO UPDATE SET Bills = Bills + excluded.Bills, "
+                    "Billed = Billed + excluded.Billed, Resolved = Resolved + excluded.Resolved; "
+                    f"INSERT INTO BillStatusTotals (Status, Bills, Amount) "
+                    f"SELECT {row}.Status, {sign}1, {amount} WHERE {row}.Status IS NOT NULL "
+                    "ON CONFLICT (Status) DO UPDATE SET Bills = Bills + excluded.Bills, "
+                    "Amount = Amount + excluded.Amount;")
+
+        return [
+            f"CREATE TRIGGER IF NOT EXISTS TR_Appointments_Dashboard_Insert AFTER INSERT ON Appointments "
+            f"BEGIN {appointment('NEW', '+')} END",
+            f"CREATE TRIGGER IF NOT EXISTS TR_Appointments_Dashboard_Delete AFTER DELETE ON Appointments "
+            f"BEGIN {appointment('OLD', '-')} END",
+            f"CREATE TRIGGER IF NOT EXISTS TR_Appointments_Dashboard_Update "
+            f"AFTER UPDATE OF AppointmentDate, DoctorID ON Appointments "
+            f"BEGIN {appointment('OLD', '-')} {appointment('NEW', '+')} END",
+            f"CREATE TRIGGER IF NOT EXISTS TR_Bills_Dashboard_Insert AFTER INSERT ON Bills "
+            f"BEGIN {bill('NEW', '+')} END",
+            f"CREATE TRIGGER IF NOT EXISTS TR_Bills_Dashboard_Delete AFTER DELETE ON Bills "
+            f"BEGIN {bill('OLD', '-')} END",
+            f"CREATE TRIGGER IF NOT EXISTS TR_Bills_Dashboard_Update AFTER UPDATE OF Amount, BillDate, Status ON Bills "
+            f"BEGIN {bill('OLD', '-')} {bill('NEW', '+')} END",
+        ]
+    # One set-based trigger per table: inserted rows count +1, deleted rows -1
+    appointments = """CREATE OR ALTER TRIGGER TR_Appointments_Dashboard ON Appointments AFTER INSERT, UPDATE, DELETE AS
+BEGIN
+    SET NOCOUNT ON;
+    MERGE DailyAppointments WITH (HOLDLOCK) AS t
+    USING (SELECT AppointmentDate, DoctorID, SUM(Delta) AS Delta
+           FROM (SELECT AppointmentDate, DoctorID, 1 AS Delta FROM inserted
+                 UNION ALL SELECT AppointmentDate, DoctorID, -1 FROM deleted) c
+           WHERE AppointmentDate IS NOT NULL AND DoctorID IS NOT NULL
+           GROUP BY AppointmentDate, DoctorID HAVING SUM(Delta) <> 0) AS d
+    ON t.AppointmentDate = d.AppointmentDate AND t.DoctorID = d.DoctorID
+    WHEN MATCHED THEN UPDATE SET Appointments = t.Appointments + d.Delta
+    WHEN NOT MATCHED THEN INSERT (AppointmentDate, DoctorID, Appointments)
+        VALUES (d.AppointmentDate, d.DoctorID, d.Delta);
+END"""
+    bills = """CREATE OR ALTER TRIGGER TR_Bills_Dashboard ON Bills AFTER INSERT, UPDATE, DELETE AS
+BEGIN
+    SET NOCOUNT ON;
+    SELECT BillDate, Status, Sign, COALESCE(Amount, 0) * Sign AS Amount INTO #changes
+    FROM (SELECT BillDate, Status, Amount, 1 AS Sign FROM inserted
+          UNION ALL SELECT BillDate, Status, Amount, -1 FROM deleted) c;
+    MERGE DailyRevenue WITH (HOLDLOCK) AS t
+    USING (SELECT BillDate, SUM(Sign) AS Bills, SUM(Amount) AS Billed,
+                  SUM(CASE WHEN Status = 'Resolved' THEN Amount ELSE 0 END) AS Resolved
+           FROM #changes WHERE BillDate IS NOT NULL GROUP BY BillDate) AS d
+    ON t.BillDate = d.BillDate
+    WHEN MATCHED THEN UPDATE SET Bills = t.Bills + d.Bills, Billed = t.Billed + d.Billed,
+                                 Resolved = t.Resolved + d.Resolved
+    WHEN NOT MATCHED THEN INSERT (BillDate, Bills, Billed, Resolved) VALUES (d.BillDate, d.Bills, d.Billed, d.Resolved);
+    MERGE BillStatusTotals WITH (HOLDLOCK) AS t
+    USING (SELECT Status, SUM(Sign) AS Bills, SUM(Amount) AS Amount
+           FROM #changes WHERE Status IS NOT NULL GROUP BY Status) AS d
+    ON t.Status = d.Status
+    WHEN MATCHED THEN UPDATE SET Bills = t.Bills + d.Bills, Amount = t.Amount + d.Amount
+    WHEN NOT MATCHED THEN INSERT (Status, Bills, Amount) VALUES (d.Status, d.Bills, d.Amount);
+END"""
+    # CREATE TRIGGER must start its own batch, hence EXEC
+    return ["EXEC('%s')" % trigger.replace("'", "''") for trigger in (appointments, bills)]
+
+
+MIGRATIONS = [
+    (1, "Nonclustered indexes for JOINs, cascade deletes and name lookups", [
+        # Foreign keys: JOINs in fetch_appointments / fetch_prescriptions / fetch_bills
+        # and the ON DELETE CASCADE from Patients and Doctors
+        create_index('IX_Appointments_PatientID', 'Appointments', ('PatientID',)),
+        create_index('IX_Appointments_Doctor_Slot', 'Appointments', ('DoctorID', 'AppointmentDate', 'AppointmentTime')),
+        create_index('IX_Prescriptions_PatientID', 'Prescriptions', ('PatientID',)),
+        create_index('IX_Prescriptions_DoctorID', 'Prescriptions', ('DoctorID',)),
+        create_index('IX_Bills_Patient_Status', 'Bills', ('PatientID', 'Status')),
+        # Lookups by name
+        create_index('IX_Patients_Name', 'Patients', ('Name',)),
+        create_index('IX_Medicines_Name', 'Medicines', ('Name',)),
+    ]),
+    (2, "Appointment duration and double-booking guard", [
+        add_column('Appointments', 'DurationMinutes', 'INT NOT NULL DEFAULT 30'),
+        appointment_overlap_guard,
+    ]),
+    (3, "Billing line items, batches, consultation fees and priced prescriptions", [
+        add_column('Doctors', 'ConsultationFee', 'DECIMAL(10,2) NOT NULL DEFAULT 50.00'),
+        add_column('Prescriptions', 'MedicineID', 'INT NULL REFERENCES Medicines(MedicineID) ON DELETE SET NULL'),
+        add_column('Prescriptions', 'Quantity', 'INT NOT NULL DEFAULT 1'),
+        add_column('Prescriptions', 'PrescribedDate', 'DATE NULL'),
+        # Link existing free-text prescriptions to the medicine of the same name
+        sql("UPDATE Prescriptions SET MedicineID = (SELECT MIN(m.MedicineID) FROM Medicines m "
+            "WHERE m.Name = Prescriptions.Medication) WHERE MedicineID IS NULL"),
+        create_table('BillingBatches', """
+            BatchID INT PRIMARY KEY IDENTITY(1,1),
+            StartDate DATE NOT NULL,
+            EndDate DATE NOT NULL,
+            CreatedAt DATETIME DEFAULT GETDATE(),
+            BillCount INT,
+            Total DECIMAL(12,2)"""),
+        add_column('Bills', 'BatchID', 'INT NULL REFERENCES BillingBatches(BatchID)'),
+        create_table('BillItems', """
+            BillItemID INT PRIMARY KEY IDENTITY(1,1),
+            BillID INT NOT NULL FOREIGN KEY REFERENCES Bills(BillID) ON DELETE CASCADE,
+            ItemType NVARCHAR(20) NOT NULL,
+            SourceID INT NOT NULL,
+            Description NVARCHAR(200),
+            Quantity INT NOT NULL,
+            UnitPrice DECIMAL(10,2) NOT NULL,
+            Amount DECIMAL(10,2) NOT NULL"""),
+        # One line item per appointment / prescription: nothing is billed twice
+        create_index('UX_BillItems_Source', 'BillItems', ('ItemType', 'SourceID'), unique=True),
+        create_index('IX_BillItems_BillID', 'BillItems', ('BillID',)),
+        create_index('IX_Bills_Batch_Patient', 'Bills', ('BatchID', 'PatientID')),
+        # Date-range scans of batch billing
+        create_index('IX_Appointments_Date', 'Appointments', ('AppointmentDate', 'PatientID')),
+        create_index('IX_Prescriptions_Date', 'Prescriptions', ('PrescribedDate', 'PatientID')),
+    ]),
+    (4, "Stock ledger and reorder levels", [
+        add_column('Medicines', 'ReorderLevel', f'INT NOT NULL DEFAULT {REORDER_LEVEL}'),
+        # No foreign keys: the history stays when a medicine or prescription is deleted
+        create_table('StockLedger', """
+            EntryID INT PRIMARY KEY IDENTITY(1,1),
+            MedicineID INT NOT NULL,
+            Change INT NOT NULL,
+            QuantityAfter INT NOT NULL,
+            Reason NVARCHAR(50) NOT NULL,
+            PrescriptionID INT NULL,
+            CreatedAt DATETIME DEFAULT GETDATE()"""),
+        create_index('IX_StockLedger_Medicine', 'StockLedger', ('MedicineID', 'EntryID')),
+        append_only_guard('StockLedger'),
+        # Current stock becomes the first ledger entry of every medicine
+        sql(OPENING_BALANCES),
+    ]),
+    (5, "Full-text index over prescription diagnoses and medications", [
+        prescription_search_index,
+    ]),
+    (6, "Dashboard aggregates kept current by triggers", [
+        create_table('DailyAppointments', """
+            AppointmentDate DATE NOT NULL,
+            DoctorID INT NOT NULL,
+            Appointments INT NOT NULL,
+            PRIMARY KEY (AppointmentDate, DoctorID)"""),
+        create_table('DailyRevenue', """
+            BillDate DATE NOT NULL PRIMARY KEY,
+            Bills INT NOT NULL,
+            Billed DECIMAL(14,2) NOT NULL,
+            Resolved DECIMAL(14,2) NOT NULL"""),
+        create_table('BillStatusTotals', """
+            Status NVARCHAR(20) NOT NULL PRIMARY KEY,
+            Bills INT NOT NULL,
+            Amount DECIMAL(14,2) NOT NULL"""),
+        # Existing rows first, then the triggers take over
+        sql(*BACKFILL),
+        dashboard_aggregates,
+    ]),
+    (7, "Appointment attendance and analytics indexes", [
+        # 'Attended' / 'NoShow'; NULL until the front desk records it
+        add_column('Appointments', 'Attendance', 'NVARCHAR(20) NULL'),
+        # Cover the date-range pulls of analytics.py, so a multi-year report
+        # reads one index in order instead of looking up every row
+        create_index('IX_Bills_Date', 'Bills', ('BillDate', 'Status', 'Amount')),
+        create_index('IX_Appointments_Date_Doctor', 'Appointments',
+                     ('AppointmentDate', 'DoctorID', 'DurationMinutes', 'Attendance')),
+        create_index('IX_Prescriptions_Date_Medicine', 'Prescriptions', ('PrescribedDate', 'MedicineID', 'Quantity')),
+    ]),
+    (8, "Double-booking guard on date-times, refusing slots past midnight", [
+        replace_appointment_overlap_guard,
+    ]),
+    (9, "Update counters for the cached SQLite tables", [
+        table_versions('Patients', 'Doctors', 'Medicines'),
+    ]),
+]
+
+
+##########################
+# RUNNER
+##########################
+
+def applied_versions(conn, backend):
+    cursor = conn.cursor()
+    cursor.execute(backend.migrations_table_sql())
+    conn.commit()
+    cursor.execute("SELECT Version FROM SchemaMigrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def apply_migrations(conn, backend, target=None):
+    # Apply every pending migration up to `target`, each in its own transaction
+    done = applied_versions(conn, backend)
+    applied = []
+    for version, description, steps in MIGRATIONS:
+        if version in done or (target is not None and version > target):
+            continue
+        cursor = conn.cursor()
+        try:
+            if backend.name == 'sqlite':
+                cursor.execute("BEGIN")  # sqlite3 would run the DDL outside a transaction
+            for step in steps:
+                autocommit = backend.name == 'sqlserver' and getattr(step, 'outside_transaction', False)
+                if autocommit:
+                    conn.commit()
+                    conn.autocommit = True
+                try:
+                    for statement in step(backend):
+                        cursor.execute(statement)
+                finally:
+                    if autocommit:
+                        conn.autocommit = False
+            cursor.execute("INSERT INTO SchemaMigrations (Version, Description) VALUES (?, ?)",
+                           (version, description))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+
+def migrate(db=None, target=None):
+    if db is None:
+        from database import Database
+        db = Database()
+    with db.pool.connection() as conn:
+        return apply_migrations(conn, db.backend, target)
+
+
+def render_script(backend):
+    # Whole migration pack as a script, e.g. to run in SSMS. On SQL Server
+    # every statement is its own guarded batch: a batch is compiled as a whole,
+    # so a column added by one statement is not visible to the next in the same batch.
+    lines = [backend.migrations_table_sql() + ";"]
+    for version, description, steps in MIGRATIONS:
+        lines.append(f"\n-- {version}: {description}")
+        statements = [statement for step in steps for statement in step(backend)]
+        statements.append(f"INSERT INTO SchemaMigrations (Version, Description) VALUES ({version}, '{description}')")
+        for statement in statements:
+            if backend.name == 'sqlserver':
+                lines.append(f"IF NOT EXISTS (SELECT 1 FROM SchemaMigrations WHERE Version = {version})")
+                lines.append(f"BEGIN\n{statement};\nEND\nGO")
+            else:
+                lines.append(statement + ";")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply schema migrations to the configured database.")
+    parser.add_argument('--target', type=int, help="stop after this version")
+    parser.add_argument('--list', action='store_true', help="show applied and pending versions")
+    parser.add_argument('--print', dest='print_script', action='store_true',
+                        help="print the migration script instead of running it")
+    args = parser.parse_args(argv)
+
+    from database import Database
+    db = Database()
+    if args.print_script:
+        print(render_script(db.backend))
+        return 0
+    if args.list:
+        with db.pool.connection() as conn:
+            done = applied_versions(conn, db.backend)
+        for version, description, _ in MIGRATIONS:
+            print(f"{version:4d}  {'applied' if version in done else 'pending':8s} {description}")
+        return 0
+
+    applied = migrate(db, args.target)
+    print(f"Applied migrations: {', '.join(map(str, applied))}" if applied else "Database is up to date.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
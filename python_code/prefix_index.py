@@ -0,0 +1,51 @@
+import bisect
+
+
+SEARCH_LIMIT = 50       # matches shown in a type-ahead dropdown
+
+_SEP = '\x00'           # sorts before any printable character
+
+
+##########################
+# PREFIX INDEX
+##########################
+
+class PrefixIndex:
+    # Sorted token index for type-ahead lookups. Every word of the indexed
+    # fields (name, contact, ...) is a key, so "smi" finds "John Smith".
+    # A search is one bisect plus a walk over the matching keys.
+    # Entries are stored as "token\0label" strings: one flat sorted list is
+    # much cheaper to build and bisect than tuples for 100k+ rows.
+
+    def __init__(self, rows, fields, label):
+        entries = []
+        for row in rows:
+            display = label(row)
+            for text in fields(row):
+                if text:
+                    for token in str(text).lower().split():
+                        entries.append(token + _SEP + display)
+        entries.sort()
+        self._entries = entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def search(self, text, limit=SEARCH_LIMIT):
+        words = text.lower().split()
+        first, rest = (words[0], words[1:]) if words else ('', [])
+
+        matches, seen = [], set()
+        entries = self._entries
+        i = bisect.bisect_left(entries, first)
+        while i < len(entries) and entries[i].startswith(first) and len(matches) < limit:
+            display = entries[i].split(_SEP, 1)[1]
+            i += 1
+            if display in seen:
+                continue
+            # Further words narrow the result: "john sm" -> John Smith
+            lowered = display.lower()
+            if all(word in lowered for word in rest):
+                seen.add(display)
+                matches.append(display)
+        return matches
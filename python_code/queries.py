@@ -0,0 +1,271 @@
+import datetime
+import re
+import threading
+from decimal import Decimal
+
+try:
+    import pyodbc
+except ImportError:  # only needed for the SQL Server backend
+    pyodbc = None
+
+
+# Every fixed statement the application runs, declared once with the SQL type
+# of each parameter. Values are converted before they reach the driver (a
+# combobox "12" becomes INT 12), and on SQL Server the types are passed with
+# setinputsizes, so the parameters match the column types: one cached plan per
+# statement and no implicit conversions in the WHERE clauses.
+#   db.execute_insert(queries.INSERT_PATIENT, (name, age, gender, contact))
+#   db.execute_query(queries.DELETE_PATIENT, (patient_id,))
+# stats() has the call count and time of every statement since startup.
+
+
+##########################
+# PARAMETER TYPES
+##########################
+
+class SqlType:
+    def __init__(self, name, convert, odbc_type, size=0, scale=0):
+        self.name = name
+        self.convert = convert
+        self.odbc_type = odbc_type      # pyodbc constant name, looked up when first used
+        self.size = size
+        self.scale = scale
+
+    def __call__(self, value):
+        return None if value is None else self.convert(value)
+
+    def input_size(self):
+        return getattr(pyodbc, self.odbc_type), self.size, self.scale
+
+    def __repr__(self):
+        return self.name
+
+
+def _date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    return value if isinstance(value, datetime.date) else datetime.date.fromisoformat(str(value))
+
+
+def _time(value):
+    return value if isinstance(value, datetime.time) else datetime.time.fromisoformat(str(value))
+
+
+def _decimal(scale):
+    quantum = Decimal(1).scaleb(-scale)
+    return lambda value: Decimal(str(value)).quantize(quantum)
+
+
+INT = SqlType('INT', int, 'SQL_INTEGER')
+DATE = SqlType('DATE', _date, 'SQL_TYPE_DATE', 10)
+TIME = SqlType('TIME', _time, 'SQL_SS_TIME2', 16, 7)
+
+
+def NVARCHAR(length):
+    return SqlType(f'NVARCHAR({length})', str, 'SQL_WVARCHAR', length)
+
+
+def DECIMAL(precision, scale):
+    return SqlType(f'DECIMAL({precision},{scale})', _decimal(scale), 'SQL_DECIMAL', precision, scale)
+
+
+##########################
+# STATEMENTS
+##########################
+
+_TABLE = re.compile(r'\s*(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM|SELECT\b.*?\bFROM)\s+\[?(\w+)',
+                    re.IGNORECASE | re.DOTALL)
+
+
+class Statement:
+    def __init__(self, name, sql, params):
+        self.name = name
+        self.sql = sql
+        self.params = params            # ((name, SqlType), ...) in placeholder order
+        self.table = _TABLE.match(sql).group(1)
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+        self._input_sizes = None
+
+    def bind(self, args):
+        if len(args) != len(self.params):
+            raise TypeError(f"{self.name} takes {len(self.params)} parameters, got {len(args)}")
+        values = []
+        for value, (param, sql_type) in zip(args, self.params):
+            try:
+                values.append(sql_type(value))
+            except (TypeError, ValueError, ArithmeticError):
+                raise ValueError(f"{self.name}: {param} must be {sql_type}, got {value!r}") from None
+        return tuple(values)
+
+    def input_sizes(self):
+        if self._input_sizes is None:
+            self._input_sizes = [sql_type.input_size() for _, sql_type in self.params]
+        return self._input_sizes
+
+    def record(self, seconds, rows):
+        with _stats_lock:
+            self.calls += 1
+            self.seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+            self.rows += max(rows, 0)
+
+    def __repr__(self):
+        return f"<Statement {self.name}>"
+
+
+STATEMENTS = {}
+_stats_lock = threading.Lock()
+
+
+def statement(name, sql, *params):
+    if name in STATEMENTS:
+        raise ValueError(f"Statement {name} is declared twice")
+    if sql.count('?') != len(params):
+        raise ValueError(f"{name}: {sql.count('?')} placeholders but {len(params)} parameter types")
+    STATEMENTS[name] = Statement(name, sql, params)
+    return STATEMENTS[name]
+
+
+def stats():
+    # [{name, calls, total_ms, avg_ms, max_ms, rows}] of the statements run so far, slowest total first
+    with _stats_lock:
+        rows = [{'name': s.name, 'calls': s.calls, 'total_ms': round(s.seconds * 1000, 3),
+                 'avg_ms': round(s.seconds * 1000 / s.calls, 3), 'max_ms': round(s.max_seconds * 1000, 3),
+                 'rows': s.rows}
+                for s in STATEMENTS.values() if s.calls]
+    return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+
+def reset_stats():
+    with _stats_lock:
+        for s in STATEMENTS.values():
+            s.calls = s.rows = 0
+            s.seconds = s.max_seconds = 0.0
+
+
+PATIENT_ID = ('patient_id', INT)
+DOCTOR_ID = ('doctor_id', INT)
+MEDICINE_ID = ('medicine_id', INT)
+PRESCRIPTION_ID = ('prescription_id', INT)
+QUANTITY = ('quantity', INT)
+PRICE = ('price', DECIMAL(10, 2))
+
+# Patients
+INSERT_PATIENT = statement(
+    'insert_patient', "INSERT INTO Patients (Name, Age, Gender, Contact) VALUES (?, ?, ?, ?)",
+    ('name', NVARCHAR(100)), ('age', INT), ('gender', NVARCHAR(10)), ('contact', NVARCHAR(20)))
+UPDATE_PATIENT = statement(
+    'update_patient', "UPDATE Patients SET Name = ?, Age = ?, Gender = ?, Contact = ? WHERE PatientID = ?",
+    ('name', NVARCHAR(100)), ('age', INT), ('gender', NVARCHAR(10)), ('contact', NVARCHAR(20)), PATIENT_ID)
+UPDATE_PATIENT_AGE = statement('update_patient_age', "UPDATE Patients SET Age = ? WHERE PatientID = ?",
+                               ('age', INT), PATIENT_ID)
+DELETE_PATIENT = statement('delete_patient', "DELETE FROM Patients WHERE PatientID = ?", PATIENT_ID)
+
+# Doctors
+INSERT_DOCTOR = statement(
+    'insert_doctor', "INSERT INTO Doctors (Name, Specialization, Contact) VALUES (?, ?, ?)",
+    ('name', NVARCHAR(100)), ('specialization', NVARCHAR(100)), ('contact', NVARCHAR(20)))
+UPDATE_DOCTOR = statement(
+    'update_doctor', "UPDATE Doctors SET Name = ?, Specialization = ?, Contact = ? WHERE DoctorID = ?",
+    ('name', NVARCHAR(100)), ('specialization', NVARCHAR(100)), ('contact', NVARCHAR(20)), DOCTOR_ID)
+DELETE_DOCTOR = statement('delete_doctor', "DELETE FROM Doctors WHERE DoctorID = ?", DOCTOR_ID)
+
+# Appointments
+SELECT_DOCTOR_DAY = statement(
+    'select_doctor_day', "SELECT AppointmentID, AppointmentTime, DurationMinutes FROM Appointments "
+                         "WHERE DoctorID = ? AND AppointmentDate = ?",
+    DOCTOR_ID, ('date', DATE))
+INSERT_APPOINTMENT = statement(
+    'insert_appointment', "INSERT INTO Appointments (PatientID, DoctorID, AppointmentDate, AppointmentTime, "
+                          "DurationMinutes) VALUES (?, ?, ?, ?, ?)",
+    PATIENT_ID, DOCTOR_ID, ('date', DATE), ('time', TIME), ('duration', INT))
+UPDATE_APPOINTMENT = statement(
+    'update_appointment', "UPDATE Appointments SET PatientID = ?, DoctorID = ?, AppointmentDate = ?, "
+                          "AppointmentTime = ?, DurationMinutes = ? WHERE AppointmentID = ?",
+    PATIENT_ID, DOCTOR_ID, ('date', DATE), ('time', TIME), ('duration', INT), ('appointment_id', INT))
+SET_ATTENDANCE = statement(
+    'set_attendance', "UPDATE Appointments SET Attendance = ? WHERE AppointmentID = ?",
+    ('attendance', NVARCHAR(20)), ('appointment_id', INT))
+DELETE_APPOINTMENT = statement('delete_appointment', "DELETE FROM Appointments WHERE AppointmentID = ?",
+                               ('appointment_id', INT))
+
+# Prescriptions
+INSERT_PRESCRIPTION = statement(
+    'insert_prescription', "INSERT INTO Prescriptions (PatientID, DoctorID, Diagnosis, Medication, MedicineID, "
+                           "Quantity, PrescribedDate) SELECT ?, ?, ?, Name, MedicineID, ?, ? FROM Medicines "
+                           "WHERE MedicineID = ?",
+    PATIENT_ID, DOCTOR_ID, ('diagnosis', NVARCHAR(200)), QUANTITY, ('date', DATE), MEDICINE_ID)
+SELECT_PRESCRIBED = statement(
+    'select_prescribed', "SELECT MedicineID, Quantity FROM Prescriptions WHERE PrescriptionID = ?", PRESCRIPTION_ID)
+UPDATE_PRESCRIPTION = statement(
+    'update_prescription', "UPDATE Prescriptions SET PatientID = ?, DoctorID = ?, Diagnosis = ?, MedicineID = ?, "
+                           "Quantity = ?, Medication = (SELECT Name FROM Medicines WHERE MedicineID = ?) "
+                           "WHERE PrescriptionID = ?",
+    PATIENT_ID, DOCTOR_ID, ('diagnosis', NVARCHAR(200)), MEDICINE_ID, QUANTITY, MEDICINE_ID, PRESCRIPTION_ID)
+DELETE_PRESCRIPTION = statement('delete_prescription', "DELETE FROM Prescriptions WHERE PrescriptionID = ?",
+                                PRESCRIPTION_ID)
+
+# Medicines and stock
+INSERT_MEDICINE = statement(
+    'insert_medicine', "INSERT INTO Medicines (Name, Quantity, Price) VALUES (?, ?, ?)",
+    ('name', NVARCHAR(100)), QUANTITY, PRICE)
+UPDATE_MEDICINE_DETAILS = statement(
+    'update_medicine_details', "UPDATE Medicines SET Name = ?, Price = ? WHERE MedicineID = ?",
+    ('name', NVARCHAR(100)), PRICE, MEDICINE_ID)
+DELETE_MEDICINE = statement('delete_medicine', "DELETE FROM Medicines WHERE MedicineID = ?", MEDICINE_ID)
+SELECT_STOCK = statement('select_stock', "SELECT Name, Quantity FROM Medicines WHERE MedicineID = ?", MEDICINE_ID)
+TAKE_STOCK = statement(
+    'take_stock', "UPDATE Medicines SET Quantity = Quantity - ? WHERE MedicineID = ? AND Quantity >= ?",
+    QUANTITY, MEDICINE_ID, QUANTITY)
+RETURN_STOCK = statement(
+    'return_stock', "UPDATE Medicines SET Quantity = Quantity + ? WHERE MedicineID = ?", QUANTITY, MEDICINE_ID)
+SET_STOCK = statement('set_stock', "UPDATE Medicines SET Quantity = ? WHERE MedicineID = ?", QUANTITY, MEDICINE_ID)
+INSERT_LEDGER_ENTRY = statement(
+    'insert_ledger_entry', "INSERT INTO StockLedger (MedicineID, Change, Reason, PrescriptionID, QuantityAfter) "
+                           "SELECT MedicineID, ?, ?, ?, Quantity FROM Medicines WHERE MedicineID = ?",
+    ('change', INT), ('reason', NVARCHAR(50)), PRESCRIPTION_ID, MEDICINE_ID)
+SELECT_LAST_LEDGER_ENTRY = statement('select_last_ledger_entry', "SELECT MAX(EntryID) FROM StockLedger")
+SELECT_LOW_STOCK = statement(
+    'select_low_stock', "SELECT MedicineID, Name, Quantity, ReorderLevel FROM Medicines WHERE Quantity <= ReorderLevel")
+SELECT_LEDGER_SINCE = statement(
+    'select_ledger_since', "SELECT l.EntryID, l.MedicineID, m.Name, l.QuantityAfter, m.ReorderLevel "
+                           "FROM StockLedger l JOIN Medicines m ON m.MedicineID = l.MedicineID "
+                           "WHERE l.EntryID > ? ORDER BY l.EntryID",
+    ('entry_id', INT))
+
+# Bills
+INSERT_BILL = statement(
+    'insert_bill', "INSERT INTO Bills (PatientID, Amount, BillDate, Status) VALUES (?, ?, ?, ?)",
+    PATIENT_ID, ('amount', DECIMAL(10, 2)), ('date', DATE), ('status', NVARCHAR(20)))
+UPDATE_BILL = statement(
+    'update_bill', "UPDATE Bills SET PatientID = ?, Amount = ?, BillDate = ?, Status = ? WHERE BillID = ?",
+    PATIENT_ID, ('amount', DECIMAL(10, 2)), ('date', DATE), ('status', NVARCHAR(20)), ('bill_id', INT))
+DELETE_BILL = statement('delete_bill', "DELETE FROM Bills WHERE BillID = ?", ('bill_id', INT))
+
+# Patient history
+PATIENT_HISTORY_FINGERPRINT = statement(
+    'patient_history_fingerprint',
+    "SELECT (SELECT COUNT(*) FROM Appointments WHERE PatientID = ?), "
+    "(SELECT MAX(AppointmentID) FROM Appointments WHERE PatientID = ?), "
+    "(SELECT COUNT(*) FROM Prescriptions WHERE PatientID = ?), "
+    "(SELECT MAX(PrescriptionID) FROM Prescriptions WHERE PatientID = ?), "
+    "(SELECT COUNT(*) FROM Bills WHERE PatientID = ?), "
+    "(SELECT MAX(BillID) FROM Bills WHERE PatientID = ?)",
+    *[PATIENT_ID] * 6)
+
+# Dashboard aggregates (kept current by the triggers of migration 6)
+SELECT_DOCTOR_DAY_TOTALS = statement(
+    'select_doctor_day_totals', "SELECT d.DoctorID, d.Name, a.Appointments FROM DailyAppointments a "
+                                "JOIN Doctors d ON d.DoctorID = a.DoctorID "
+                                "WHERE a.AppointmentDate = ? AND a.Appointments > 0 "
+                                "ORDER BY a.Appointments DESC, d.Name",
+    ('date', DATE))
+SELECT_BILL_STATUS_TOTALS = statement(
+    'select_bill_status_totals', "SELECT Status, Bills, Amount FROM BillStatusTotals")
+SELECT_DAILY_REVENUE = statement(
+    'select_daily_revenue', "SELECT BillDate, Bills, Billed, Resolved FROM DailyRevenue "
+                            "WHERE BillDate BETWEEN ? AND ? ORDER BY BillDate",
+    ('start_date', DATE), ('end_date', DATE))
@@ -0,0 +1,199 @@
+import bisect
+import datetime
+import threading
+from collections import OrderedDict
+
+
+APPOINTMENT_MINUTES = 30    # default appointment length
+SCHEDULE_MAXDAYS = 16384    # doctor-days kept in memory before the least recently used is dropped
+
+# Free-slot search works on busy bitmaps: one bit per SLOT_GRAIN minutes of the working day
+WORKDAY_START = 8 * 60
+WORKDAY_END = 17 * 60
+SLOT_GRAIN = 5
+SLOT_STEP = 15              # offered start times are multiples of this
+FREE_SLOT_LIMIT = 10        # slots returned by a search
+FREE_SLOT_DAYS = 14         # days searched when no end date is given
+
+_DAY_BITS = (WORKDAY_END - WORKDAY_START) // SLOT_GRAIN
+_STEP_MASK = sum(1 << i for i in range(0, _DAY_BITS, SLOT_STEP // SLOT_GRAIN))
+
+
+class SlotConflict(ValueError):
+    def __init__(self, appointment_id, start, end):
+        super().__init__(f"The doctor already has an appointment (ID {appointment_id}) "
+                         f"from {_clock(start)} to {_clock(end)}.")
+        self.appointment_id = appointment_id
+
+
+def _clock(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def to_minutes(value):
+    # datetime.time or 'HH:MM[:SS]' -> minutes since midnight
+    if isinstance(value, str):
+        value = datetime.time.fromisoformat(value)
+    return value.hour * 60 + value.minute
+
+
+##########################
+# DAY SCHEDULE
+##########################
+
+class DaySchedule:
+    # One doctor's appointments on one day as parallel lists sorted by start.
+    # Overlap check: bisect to the first appointment starting at or after the
+    # new end, then walk left only while an earlier start could still reach
+    # the new start (bounded by the longest appointment of the day).
+
+    __slots__ = ('starts', 'ends', 'ids', 'longest', '_busy')
+
+    def __init__(self, rows=()):
+        # rows: (appointment_id, start_minutes, duration)
+        rows = sorted(rows, key=lambda r: r[1])
+        self.ids = [r[0] for r in rows]
+        self.starts = [r[1] for r in rows]
+        self.ends = [r[1] + r[2] for r in rows]
+        self.longest = max((r[2] for r in rows), default=0)
+        self._busy = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def conflict(self, start, end, ignore=None):
+        # (id, start, end) of an appointment overlapping [start, end), or None
+        i = bisect.bisect_left(self.starts, end) - 1
+        floor = start - self.longest
+        while i >= 0 and self.starts[i] > floor:
+            if self.ends[i] > start and self.ids[i] != ignore:
+                return self.ids[i], self.starts[i], self.ends[i]
+            i -= 1
+        return None
+
+    def add(self, appointment_id, start, duration):
+        i = bisect.bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, start + duration)
+        self.ids.insert(i, appointment_id)
+        self.longest = max(self.longest, duration)
+        self._busy = None
+
+    def remove(self, appointment_id):
+        if appointment_id in self.ids:
+            i = self.ids.index(appointment_id)
+            del self.starts[i], self.ends[i], self.ids[i]
+            self._busy = None
+
+    def busy(self):
+        # Bit i set = the SLOT_GRAIN minutes from WORKDAY_START + i * SLOT_GRAIN
+        # are (at least partly) taken. Built once, dropped on every change.
+        if self._busy is None:
+            bits = 0
+            for start, end in zip(self.starts, self.ends):
+                first = max(start - WORKDAY_START, 0) // SLOT_GRAIN
+                last = min(-(-(end - WORKDAY_START) // SLOT_GRAIN), _DAY_BITS)
+                if last > first:
+                    bits |= ((1 << (last - first)) - 1) << first
+            self._busy = bits
+        return self._busy
+
+    def free_starts(self, minutes, earliest=WORKDAY_START):
+        # Start times (minutes) on the SLOT_STEP grid where `minutes` fit
+        free = ~self.busy() & ((1 << _DAY_BITS) - 1)
+        fits = free
+        for shift in range(1, -(-minutes // SLOT_GRAIN)):
+            fits &= free >> shift      # bit i stays set only if bits i .. i+shift are free
+        fits &= _STEP_MASK
+        if earliest > WORKDAY_START:
+            fits &= ~0 << -(-(earliest - WORKDAY_START) // SLOT_GRAIN)
+        while fits:
+            low = fits & -fits
+            yield WORKDAY_START + (low.bit_length() - 1) * SLOT_GRAIN
+            fits ^= low
+
+
+##########################
+# SCHEDULE INDEX
+##########################
+
+class ScheduleIndex:
+    # Doctor-day schedules loaded on first use and kept in LRU order.
+    # `lock` is held by Database around check + write so two bookings from
+    # this process can't both pass the check; other workstations are stopped
+    # by the overlap trigger in the database.
+
+    def __init__(self, maxdays=SCHEDULE_MAXDAYS):
+        self.maxdays = maxdays
+        self.lock = threading.RLock()
+        self._days = OrderedDict()      # (doctor_id, date) -> DaySchedule
+        self._where = {}                # appointment_id -> (doctor_id, date)
+
+    def day(self, doctor_id, date, load):
+        key = (doctor_id, date)
+        with self.lock:
+            schedule = self._days.get(key)
+            if schedule is None:
+                schedule = DaySchedule(load(doctor_id, date))
+                self._days[key] = schedule
+                for appointment_id in schedule.ids:
+                    self._where[appointment_id] = key
+                while len(self._days) > self.maxdays:
+                    self._drop(next(iter(self._days)))
+            else:
+                self._days.move_to_end(key)
+            return schedule
+
+    def days(self, keys, load_many):
+        # Schedules for many (doctor_id, date) keys; the missing ones come from
+        # one load_many(missing keys) call returning {key: rows}
+        with self.lock:
+            found = {}
+            for key in keys:
+                if key in self._days:
+                    self._days.move_to_end(key)
+                    found[key] = self._days[key]
+            missing = [key for key in keys if key not in found]
+            if missing:
+                loaded = load_many(missing)
+                for key in missing:
+                    schedule = found[key] = DaySchedule(loaded.get(key, ()))
+                    self._days[key] = schedule
+                    for appointment_id in schedule.ids:
+                        self._where[appointment_id] = key
+                while len(self._days) > self.maxdays:
+                    self._drop(next(iter(self._days)))
+            return found
+
+    def add(self, appointment_id, doctor_id, date, start, duration):
+        with self.lock:
+            self.remove(appointment_id)
+            schedule = self._days.get((doctor_id, date))
+            if schedule is not None:
+                schedule.add(appointment_id, start, duration)
+                self._where[appointment_id] = (doctor_id, date)
+
+    def remove(self, appointment_id):
+        with self.lock:
+            key = self._where.pop(appointment_id, None)
+            if key in self._days:
+                self._days[key].remove(appointment_id)
+
+    def forget(self, doctor_id, date):
+        with self.lock:
+            self._drop((doctor_id, date))
+
+    def clear(self):
+        with self.lock:
+            self._days.clear()
+            self._where.clear()
+
+    def _drop(self, key):
+        schedule = self._days.pop(key, None)
+        if schedule is not None:
+            for appointment_id in schedule.ids:
+                self._where.pop(appointment_id, None)
+
+
+# Shared by every Database instance in the process
+appointment_schedule = ScheduleIndex()
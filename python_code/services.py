@@ -0,0 +1,256 @@
+import datetime
+
+import billing
+import queries
+from database import Database, PAGE_SIZE
+from history import HISTORY_PAGE, EVENT_FIELDS
+from text_search import TEXT_SEARCH_LIMIT
+from dashboard import REVENUE_DAYS
+from prefix_index import SEARCH_LIMIT
+from scheduling import APPOINTMENT_MINUTES, FREE_SLOT_LIMIT, FREE_SLOT_DAYS
+from validation import (normalize, parse_patient, parse_doctor, parse_medicine, parse_bill,
+                        parse_appointment, parse_duration, parse_attendance, parse_prescription,
+                        parse_restock)
+
+
+# What the screens do, without the screens: each service validates a record
+# keyed by schema column names, writes it through Database and returns the
+# saved row shaped like a Treeview row. Used by the Tk managers on their
+# worker threads and by the HTTP API. Errors are raised, never shown:
+# ValueError for bad input (SlotConflict / OutOfStock are ValueErrors too)
+# and NotFound for a missing row.
+
+MAX_PAGE = 1000         # largest page a caller may ask for
+MAX_REVENUE_DAYS = 366  # longest revenue range on the dashboard
+
+
+class NotFound(LookupError):
+    pass
+
+
+class EntityService:
+    entity = None
+    noun = None
+    fields = ()         # names of the row columns, for as_dict()
+
+    def __init__(self, db=None):
+        self.db = db or Database()
+
+    def page(self, after=None, before=None, limit=PAGE_SIZE):
+        limit = max(1, min(int(limit), MAX_PAGE))
+        return self.db.fetch_page(self.entity, after=after, before=before, limit=limit)
+
+    def get(self, key):
+        row = self.db.fetch_row(self.entity, key)
+        if row is None:
+            raise NotFound(f"{self.noun} {key} does not exist.")
+        return row
+
+    def as_dict(self, row):
+        return dict(zip(self.fields, row))
+
+
+class PatientService(EntityService):
+    entity, noun = 'patients', 'Patient'
+    fields = ('PatientID', 'Name', 'Age', 'Gender', 'Contact')
+
+    def create(self, record):
+        patient_id = self.db.execute_insert(queries.INSERT_PATIENT, parse_patient(normalize(record)))
+        return self.get(patient_id)
+
+    def update(self, patient_id, record):
+        self.db.execute_query(queries.UPDATE_PATIENT, parse_patient(normalize(record)) + (patient_id,))
+        return self.get(patient_id)
+
+    def delete(self, patient_id):
+        self.db.execute_query(queries.DELETE_PATIENT, (patient_id,))
+
+    def search(self, text, limit=SEARCH_LIMIT):
+        return self.db.search_patients(text, limit)
+
+    def history(self, patient_id, before=None, limit=HISTORY_PAGE):
+        # A page of the patient's timeline, newest first; `before` is
+        # history_cursor() of the last event already shown
+        return self.db.fetch_patient_history(patient_id, before, max(1, min(int(limit), MAX_PAGE)))
+
+    def event_dict(self, row):
+        return dict(zip(EVENT_FIELDS, row))
+
+
+class DoctorService(EntityService):
+    entity, noun = 'doctors', 'Doctor'
+    fields = ('DoctorID', 'Name', 'Specialization', 'Contact')
+
+    def create(self, record):
+        doctor_id = self.db.execute_insert(queries.INSERT_DOCTOR, parse_doctor(normalize(record)))
+        return self.get(doctor_id)
+
+    def update(self, doctor_id, record):
+        self.db.execute_query(queries.UPDATE_DOCTOR, parse_doctor(normalize(record)) + (doctor_id,))
+        return self.get(doctor_id)
+
+    def delete(self, doctor_id):
+        self.db.execute_query(queries.DELETE_DOCTOR, (doctor_id,))
+
+    def search(self, text, limit=SEARCH_LIMIT):
+        return self.db.search_doctors(text, limit)
+
+    def specializations(self):
+        return self.db.fetch_specializations()
+
+
+class AppointmentService(EntityService):
+    entity, noun = 'appointments', 'Appointment'
+    fields = ('AppointmentID', 'Patient', 'Doctor', 'AppointmentDate', 'AppointmentTime', 'DurationMinutes',
+              'Attendance')
+
+    def create(self, record):
+        # Raises SlotConflict if the doctor is already booked
+        record = normalize(record)
+        appointment = parse_appointment(record)
+        appointment_id = self.db.book_appointment(*appointment, parse_duration(record, appointment[3]))
+        return self.get(appointment_id)
+
+    def update(self, appointment_id, record):
+        record = normalize(record)
+        appointment = parse_appointment(record)
+        self.db.reschedule_appointment(appointment_id, *appointment, parse_duration(record, appointment[3]))
+        return self.get(appointment_id)
+
+    def delete(self, appointment_id):
+        self.db.cancel_appointment(appointment_id)
+
+    def record_attendance(self, appointment_id, record):
+        # Whether the patient came: 'Attended' or 'NoShow' (for no-show rates)
+        attendance = parse_attendance(normalize(record))
+        self.get(appointment_id)
+        self.db.execute_query(queries.SET_ATTENDANCE, (attendance, appointment_id))
+        return self.get(appointment_id)
+
+    def free_slots(self, specialization, start_date, end_date=None, minutes=APPOINTMENT_MINUTES,
+                   limit=FREE_SLOT_LIMIT):
+        # [(date, 'HH:MM', doctor_id, 'Name (ID)')], earliest first
+        if not specialization:
+            raise ValueError("Please choose a specialization.")
+        if minutes <= 0:
+            raise ValueError("Minutes must be a positive number!")
+        end_date = end_date or start_date + datetime.timedelta(days=FREE_SLOT_DAYS - 1)
+        if end_date < start_date:
+            raise ValueError("The end date is before the start date.")
+        return self.db.find_free_slots(specialization, start_date, end_date, minutes, min(limit, MAX_PAGE))
+
+
+class PrescriptionService(EntityService):
+    entity, noun = 'prescriptions', 'Prescription'
+    fields = ('PrescriptionID', 'Patient', 'Doctor', 'Diagnosis', 'Medication', 'Quantity')
+
+    def create(self, record):
+        # Takes the medicine from stock in the same transaction; raises OutOfStock
+        prescription_id = self.db.prescribe(*parse_prescription(normalize(record)))
+        return self.get(prescription_id)
+
+    def update(self, prescription_id, record):
+        self.db.update_prescription(prescription_id, *parse_prescription(normalize(record)))
+        return self.get(prescription_id)
+
+    def delete(self, prescription_id):
+        self.db.delete_prescription(prescription_id)
+
+    def search(self, text, limit=TEXT_SEARCH_LIMIT):
+        # Full-text search over diagnoses and medications, best match first
+        return self.db.search_prescriptions(text, max(1, min(int(limit), MAX_PAGE)))
+
+
+class MedicineService(EntityService):
+    entity, noun = 'medicines', 'Medicine'
+    fields = ('MedicineID', 'Name', 'Quantity', 'Price')
+
+    def create(self, record):
+        medicine_id = self.db.add_medicine(*parse_medicine(normalize(record)))
+        return self.get(medicine_id)
+
+    def update(self, medicine_id, record):
+        # Quantity is a stock count: the ledger records the difference
+        self.db.update_medicine(medicine_id, *parse_medicine(normalize(record)))
+        return self.get(medicine_id)
+
+    def delete(self, medicine_id):
+        self.db.execute_query(queries.DELETE_MEDICINE, (medicine_id,))
+
+    def search(self, text, limit=SEARCH_LIMIT):
+        return self.db.search_medicines(text, limit)
+
+    def restock(self, medicine_id, record):
+        self.get(medicine_id)
+        self.db.restock(medicine_id, *parse_restock(normalize(record)))
+        return self.get(medicine_id)
+
+    def low_stock(self):
+        # [(medicine_id, name, quantity, reorder level)], lowest stock first
+        return self.db.refresh_stock_alerts()
+
+
+class BillService(EntityService):
+    entity, noun = 'bills', 'Bill'
+    fields = ('BillID', 'Patient', 'Amount', 'BillDate', 'Status')
+
+    def create(self, record):
+        bill_id = self.db.execute_insert(queries.INSERT_BILL, parse_bill(normalize(record)))
+        return self.get(bill_id)
+
+    def update(self, bill_id, record):
+        self.db.execute_query(queries.UPDATE_BILL, parse_bill(normalize(record)) + (bill_id,))
+        return self.get(bill_id)
+
+    def delete(self, bill_id):
+        self.db.execute_query(queries.DELETE_BILL, (bill_id,))
+
+    def generate(self, patient_id, end=None):
+        # Bills the patient's unbilled appointments and prescriptions up to `end`;
+        # the new bill row, or None when there was nothing to bill
+        result = billing.bill_patient(self.db, patient_id, end=end, bill_date=end)
+        return result and self.get(result[0])
+
+    def items(self, bill_id):
+        self.get(bill_id)
+        return billing.fetch_bill_items(self.db, bill_id)
+
+
+class DashboardService:
+    # The KPI panel: read from aggregates, so it is cheap to poll
+    def __init__(self, db=None):
+        self.db = db or Database()
+
+    def summary(self, today=None, days=REVENUE_DAYS):
+        days = max(1, min(int(days), MAX_REVENUE_DAYS))
+        data = self.db.fetch_dashboard(today, days)
+        pending_bills, pending_amount = data['pending']
+        return {
+            'Date': data['date'],
+            'AppointmentsToday': [{'DoctorID': doctor_id, 'Doctor': name, 'Appointments': count}
+                                  for doctor_id, name, count in data['appointments']],
+            'Pending': {'Bills': pending_bills, 'Amount': pending_amount},
+            'Revenue': [{'Date': day, 'Bills': bills, 'Billed': billed, 'Resolved': resolved}
+                        for day, bills, billed, resolved in data['revenue']],
+            'LowStock': [{'MedicineID': medicine_id, 'Name': name, 'Quantity': quantity, 'ReorderLevel': reorder_level}
+                         for medicine_id, name, quantity, reorder_level in data['low_stock']],
+        }
+
+
+class Services:
+    # One of each service over a shared Database
+    def __init__(self, db=None):
+        self.db = db or Database()
+        self.patients = PatientService(self.db)
+        self.doctors = DoctorService(self.db)
+        self.appointments = AppointmentService(self.db)
+        self.prescriptions = PrescriptionService(self.db)
+        self.medicines = MedicineService(self.db)
+        self.bills = BillService(self.db)
+        self.dashboard = DashboardService(self.db)
+
+    def __getitem__(self, entity):
+        service = getattr(self, entity, None)
+        if not isinstance(service, EntityService):
+            raise NotFound(f"Unknown entity: {entity}")
+        return service
@@ -0,0 +1,89 @@
+import threading
+
+
+REORDER_LEVEL = 10      # default Medicines.ReorderLevel: at or below this a medicine is "low"
+
+# First ledger entry for medicines that have none (existing or bulk-imported rows)
+OPENING_BALANCES = ("INSERT INTO StockLedger (MedicineID, Change, QuantityAfter, Reason) "
+                    "SELECT MedicineID, Quantity, Quantity, 'Opening balance' FROM Medicines m "
+                    "WHERE NOT EXISTS (SELECT 1 FROM StockLedger l WHERE l.MedicineID = m.MedicineID)")
+
+
+class OutOfStock(ValueError):
+    def __init__(self, name, requested, available):
+        super().__init__(f"Not enough {name} in stock: {requested} requested, {available} available.")
+        self.requested = requested
+        self.available = available
+
+
+##########################
+# LOW STOCK ALERTS
+##########################
+
+class LowStockAlerts:
+    # Medicines at or below their reorder level. Loaded with one query, then
+    # kept current from the stock ledger: every stock change appends a ledger
+    # row carrying the quantity after it, so only rows newer than the last one
+    # seen need to be read, instead of scanning Medicines again.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._low = None                # medicine_id -> (name, quantity, reorder level); None = not loaded
+        self.last_entry = 0             # highest StockLedger.EntryID applied
+        self._listeners = []
+
+    @property
+    def loaded(self):
+        return self._low is not None
+
+    def load(self, rows, last_entry):
+        # rows: (medicine_id, name, quantity, reorder level) of every low medicine
+        with self.lock:
+            self._low = {row[0]: tuple(row[1:]) for row in rows}
+            self.last_entry = last_entry or 0
+            changed = sorted(self._low)
+        self._notify(changed)
+
+    def apply(self, entries):
+        # entries: (entry_id, medicine_id, name, quantity after, reorder level) in EntryID order.
+        # False if the list is not loaded (e.g. cleared by another thread since
+        # the caller checked): the caller must load() it instead
+        changed = []
+        with self.lock:
+            if self._low is None:
+                return False
+            for entry_id, medicine_id, name, quantity, reorder_level in entries:
+                self.last_entry = max(self.last_entry, entry_id)
+                if quantity <= reorder_level:
+                    if medicine_id not in self._low:
+                        changed.append(medicine_id)
+                    self._low[medicine_id] = (name, quantity, reorder_level)
+                elif self._low.pop(medicine_id, None) is not None:
+                    changed.append(medicine_id)
+        if changed:
+            self._notify(changed)
+        return True
+
+    def low(self):
+        # [(medicine_id, name, quantity, reorder level)], lowest stock first
+        with self.lock:
+            return sorted(((medicine_id,) + values for medicine_id, values in (self._low or {}).items()),
+                          key=lambda row: (row[2], row[1]))
+
+    def subscribe(self, listener):
+        # listener(changed medicine ids) is called from the thread that applied the change
+        self._listeners.append(listener)
+
+    def clear(self):
+        # Stock was changed outside the ledger (plain UPDATE, import, delete): reload on next use
+        with self.lock:
+            self._low = None
+            self.last_entry = 0
+
+    def _notify(self, changed):
+        for listener in list(self._listeners):
+            listener(changed)
+
+
+# Shared by every Database instance in the process
+low_stock_alerts = LowStockAlerts()
@@ -0,0 +1,32 @@
+import re
+
+
+# Full-text search over Prescriptions.Diagnosis and Medication. The inverted
+# index lives in the database (migration 5): an FTS5 table kept current by
+# triggers on SQLite, a full-text index with automatic change tracking on
+# SQL Server. So every write is indexed as it happens, whichever screen,
+# import or workstation made it. Query syntax, all terms must match:
+#   amox              words starting with "amox" (Amoxicillin, ...)
+#   "chest pain"      the exact phrase
+#   "chest pa"*       the phrase with its last word as a prefix
+# Results are ranked by relevance (bm25 on SQLite, RANK on SQL Server).
+# Scoring every match of a very common word would cost time proportional to
+# the table, so SQLite ranks only the newest RANK_WINDOW matches.
+
+TEXT_SEARCH_LIMIT = 100     # prescriptions returned by a search
+RANK_WINDOW = 5000          # newest matches ranked on SQLite
+MIN_PREFIX = 2              # shorter words are matched whole, not as prefixes
+
+_TERM = re.compile(r'"([^"]*)"(\*?)|(\S+)')
+_WORD = re.compile(r'\w+')
+
+
+def parse_query(text):
+    # [(words, prefix)]: one entry per bare word or quoted phrase. Only word
+    # characters are kept, so nothing the user types reaches the engine's syntax.
+    terms = []
+    for phrase, star, bare in _TERM.findall(text or ''):
+        words = tuple(_WORD.findall((bare or phrase).lower()))
+        if words:
+            terms.append((words, (bool(bare) or bool(star)) and len(words[-1]) >= MIN_PREFIX))
+    return terms
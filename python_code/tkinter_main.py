@@ -1,135 +1,76 @@
 import tkinter as tk
 from tkinter import messagebox
+from tkinter import filedialog
 from tkinter import ttk
-import pyodbc
 from PIL import Image, ImageTk
 from tkcalendar import DateEntry
-import re  
-
-class Database:
-    def __init__(self):
-        try:
-            self.conn = pyodbc.connect(
-                r'DRIVER={ODBC Driver 18 for SQL Server};'
-                r'SERVER=.\SQLEXPRESS;'
-                r'DATABASE=HospitalDB;'
-                r'TrustServerCertificate=yes;'
-                r'Authentication=ActiveDirectoryIntegrated;'
-            )
-            self.cursor = self.conn.cursor()
-        except Exception as e:
-            messagebox.showerror("Database Error", str(e))
-    
-    def __del__(self):
-        self.conn.close()
-
-    def execute_query(self, query, params=()):
-        try:
-            self.cursor.execute(query, params)
-            self.conn.commit()
-        except Exception as e:
-            messagebox.showerror("Database Error", str(e))
-            raise e
-
-    def fetch_patients(self):
-        try:
-            self.cursor.execute("SELECT PatientID, Name, Age, Gender, Contact FROM Patients")
-            return self.cursor.fetchall()
-        except Exception as e:
-            messagebox.showerror("Database Error", str(e))
-            return []
-
-    def fetch_doctors(self):
-        try:
-            self.cursor.execute("SELECT DoctorID, Name, Specialization, Contact FROM Doctors")
-            return self.cursor.fetchall()
-        except Exception as e:
-            messagebox.showerror("Database Error", str(e))
-            return []
-
-    def fetch_medicines(self):
-        try:
-            self.cursor.execute("SELECT MedicineID, Name, Quantity, Price FROM Medicines")
-            return self.cursor.fetchall()
-        except Exception as e:
-            messagebox.showerror("Database Error", str(e))
-            return []
-
-
-    def fetch_appointments(self):
-        try:
-            self.cursor.execute("""
-                SELECT a.AppointmentID, 
-                       p.Name + ' (' + CAST(p.PatientID AS NVARCHAR) + ')', 
-                       d.Name + ' (' + CAST(d.DoctorID AS NVARCHAR) + ')', 
-                       a.AppointmentDate, 
-                       a.AppointmentTime 
-                FROM Appointments a
-                JOIN Patients p ON a.PatientID = p.PatientID
-                JOIN Doctors d ON a.DoctorID = d.DoctorID
-            """)
-            return self.cursor.fetchall()
-        except Exception as e:
-            messagebox.showerror("Database Error", str(e))
-            return []
-
-    def fetch_prescriptions(self):
-        try:
-            self.cursor.execute("""
-                SELECT pr.PrescriptionID, 
-                       p.Name + ' (' + CAST(p.PatientID AS NVARCHAR) + ')', 
-                       d.Name + ' (' + CAST(d.DoctorID AS NVARCHAR) + ')', 
-                       pr.Diagnosis, 
-                       pr.Medication 
-                FROM Prescriptions pr
-                JOIN Patients p ON pr.PatientID = p.PatientID
-                JOIN Doctors d ON pr.DoctorID = d.DoctorID
-            """)
-            return self.cursor.fetchall()
-        except Exception as e:
-            messagebox.showerror("Database Error", str(e))
-            return []
-
-    def fetch_bills(self):
-        try:
-            self.cursor.execute("""
-                SELECT b.BillID, 
-                       p.Name + ' (' + CAST(p.PatientID AS NVARCHAR) + ')', 
-                       b.Amount, 
-                       FORMAT(b.BillDate, 'yyyy-MM-dd'), 
-                       b.Status 
-                FROM Bills b
-                JOIN Patients p ON b.PatientID = p.PatientID
-            """)
-            return self.cursor.fetchall()
-        except Exception as e:
-            messagebox.showerror("Database Error", str(e))
-            return []
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+import os
+import datetime
+import database
+from database import Database
+import queries
+from services import (PatientService, DoctorService, AppointmentService, PrescriptionService,
+                      MedicineService, BillService, DashboardService)
+from metrics import query_metrics
+from widgets import VirtualTreeview, BusyIndicator, SearchCombobox, ViewCache, VIEW_CACHE_SIZE
+from executor import QueryExecutor
+import ui_profiler
+from ui_profiler import UiProfiler, timed
+from scheduling import APPOINTMENT_MINUTES, FREE_SLOT_LIMIT, FREE_SLOT_DAYS
+from history import HISTORY_PAGE, history_cursor, describe
+from dashboard import DASHBOARD_REFRESH
+
+
+# Screens to build in the background at startup, e.g. HMS_WARM_SCREENS=appointments,patients
+WARM_SCREENS = [name for name in os.environ.get('HMS_WARM_SCREENS', '').split(',') if name]
 
 
 class HospitalManagementSystem:
-    def __init__(self, root):
+    def __init__(self, root, profile_dir=ui_profiler.PROFILE_DIR, warm_screens=WARM_SCREENS,
+                 view_cache_size=VIEW_CACHE_SIZE):
         self.root = root
         self.root.title("Hospital Management System")
 
         # *** KEY CHANGE 1: Configure root background ***
         self.root.configure(bg='black')  # Or #000000 for black
 
+        # Dark theme for the ttk widgets of every screen. Styles belong to the
+        # Tk root, so they are configured here once rather than per screen
+        self.style = ttk.Style()
+        self.style.theme_use('default')
+        self.style.configure('TFrame', background='#38475c')
+        self.style.configure('TLabel', background='#38475c', foreground='white', font=('Times New Roman', 11))
+        self.style.configure('TButton',
+                             font=('Arial', 10, 'bold'),
+                             background='#1976D2',
+                             foreground='white',
+                             borderwidth=1,
+                             focuscolor='#2e2e2e')
+        self.style.map('TButton',
+                       background=[('active', '#2a4e64'), ('pressed', '#6a6a6a')],
+                       foreground=[('active', 'white')])
+        self.style.configure('Treeview',
+                             background='#38475c',
+                             foreground='white',
+                             fieldbackground='#38475c',
+                             borderwidth=0)
+        self.style.configure('Treeview.Heading',
+                             font=('Times New Roman', 13),
+                             padding=2,
+                             background='#232c39',
+                             foreground='white',
+                             relief='flat')
+        self.style.map('Treeview',
+                       background=[('selected', '#2d6355')],
+                       foreground=[('selected', 'white')])
+        self.style.configure('TEntry', fieldbackground='#e9e9e9', foreground='black')
+        self.style.configure('TCombobox', fieldbackground='#e9e9e9', foreground='black')
+
+        # Database errors on the Tk thread open a dialog (the database layer
+        # itself only logs them)
+        database.set_error_handler(messagebox.showerror)
         self.db = Database()
+        self.executor = QueryExecutor(root)
 
         # Main Container
         self.main_frame = tk.Frame(root, bg='black') # Added background
@@ -146,12 +87,14 @@ class HospitalManagementSystem:
         
         # Dashboard Buttons
         buttons = [
+            ('Dashboard', self.show_dashboard),
             ('Patients', self.show_patients),
             ('Doctors', self.show_doctors),
             ('Appointments', self.show_appointments),
             ('Prescriptions', self.show_prescriptions),
             ('Medicines', self.show_medicines),
-            ('Bills', self.show_bills)
+            ('Bills', self.show_bills),
+            ('History', self.show_history)
         ]
 
         # Load and display image
@@ -174,36 +117,141 @@ class HospitalManagementSystem:
             btn.pack(pady=12, padx=8)
         
         self.current_manager = None
+
+        # Screens are built once and hidden when another one is shown
+        self.views = ViewCache(self.content_frame, self.build_screen, maxsize=view_cache_size,
+                               on_evict=self.executor.cancel)
+        if warm_screens:
+            self.views.warm(warm_screens, delay_ms=500)
+
+        # F12 opens the live query statistics; HMS_METRICS_FILE also writes them for Prometheus
+        self.debug_panel = None
+        self.root.bind('<F12>', lambda event: self.show_debug_panel())
+        query_metrics.start_exporter()
+
+        # Profiling mode: event-loop lag plus a cProfile dump per screen switch
+        self.profiler = None
+        if profile_dir:
+            self.profiler = UiProfiler(root, self.executor, profile_dir)
+            self.profiler.install()
         
 
 
-    def clear_content(self):
-        if self.current_manager:
-            self.current_manager.destroy()
-    
+    def build_screen(self, screen):
+        manager_class = {'patients': PatientManager, 'doctors': DoctorManager,
+                         'appointments': AppointmentManager, 'prescriptions': PrescriptionManager,
+                         'medicines': MedicineManager, 'bills': BillManager, 'history': HistoryManager,
+                         'dashboard': DashboardManager}[screen]
+        return manager_class(self.content_frame, self.executor)
+
+    def show_screen(self, screen):
+        show = lambda: self.views.show(screen)
+        self.current_manager = self.profiler.switch(screen, show) if self.profiler else show()
+
     def show_patients(self):
-        self.clear_content()
-        self.current_manager = PatientManager(self.content_frame)
+        self.show_screen('patients')
     
     def show_doctors(self):
-        self.clear_content()
-        self.current_manager = DoctorManager(self.content_frame)
+        self.show_screen('doctors')
     
     def show_appointments(self):
-        self.clear_content()
-        self.current_manager = AppointmentManager(self.content_frame)
+        self.show_screen('appointments')
     
     def show_prescriptions(self):
-        self.clear_content()
-        self.current_manager = PrescriptionManager(self.content_frame)
+        self.show_screen('prescriptions')
     
     def show_bills(self):
-        self.clear_content()
-        self.current_manager = BillManager(self.content_frame)
+        self.show_screen('bills')
     
     def show_medicines(self):
-        self.clear_content()
-        self.current_manager = MedicineManager(self.content_frame)
+        self.show_screen('medicines')
+
+    def show_history(self):
+        self.show_screen('history')
+
+    def show_dashboard(self):
+        self.show_screen('dashboard')
+
+    def show_debug_panel(self):
+        if self.debug_panel is not None and self.debug_panel.winfo_exists():
+            self.debug_panel.lift()
+            return
+        self.debug_panel = DebugPanel(self.root, self.db)
+
+
+class DebugPanel(tk.Toplevel):
+    # Live per-query statistics from query_metrics, refreshed every REFRESH_MS
+    REFRESH_MS = 1000
+    COLUMNS = (('name', 'Query', 220), ('calls', 'Calls', 60), ('errors', 'Errors', 60),
+               ('avg_ms', 'Avg ms', 70), ('p95_ms', 'p95 ms', 70), ('max_ms', 'Max ms', 70),
+               ('total_ms', 'Total ms', 80), ('rows', 'Rows', 80), ('bytes', 'KB', 70), ('slow', 'Slow', 50))
+
+    def __init__(self, parent, db):
+        super().__init__(parent)
+        self.db = db
+        self.title("Query Statistics")
+        self.geometry("950x520")
+        self.configure(background='#38475c')
+
+        top = ttk.Frame(self)
+        top.pack(fill=tk.X, padx=10, pady=5)
+        self.summary = ttk.Label(top, text="")
+        self.summary.pack(side=tk.LEFT)
+        ttk.Button(top, text="Export", command=self.export, width=10).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(top, text="Reset", command=self.reset, width=10).pack(side=tk.RIGHT, padx=5)
+        self.threshold_entry = ttk.Entry(top, width=8)
+        self.threshold_entry.insert(0, f"{query_metrics.slow_seconds * 1000:g}")
+        self.threshold_entry.bind('<Return>', lambda event: self.set_threshold())
+        self.threshold_entry.pack(side=tk.RIGHT)
+        ttk.Label(top, text="Slow query ms:").pack(side=tk.RIGHT, padx=5)
+
+        self.tree = ttk.Treeview(self, columns=[column for column, _, _ in self.COLUMNS], show='headings', height=12)
+        for column, heading, width in self.COLUMNS:
+            self.tree.heading(column, text=heading)
+            self.tree.column(column, width=width, anchor=tk.W if column == 'name' else tk.E)
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=10)
+
+        ttk.Label(self, text="Recent slow queries:").pack(anchor=tk.W, padx=10, pady=(5, 0))
+        self.slow_list = tk.Listbox(self, height=7, background='#e9e9e9')
+        self.slow_list.pack(fill=tk.X, padx=10, pady=(0, 10))
+
+        self._pending = None
+        self.refresh()
+
+    def destroy(self):
+        if self._pending is not None:
+            self.after_cancel(self._pending)
+        super().destroy()
+
+    def refresh(self):
+        self.tree.delete(*self.tree.get_children())
+        for stat in query_metrics.snapshot():
+            stat['bytes'] = round(stat['bytes'] / 1024, 1)
+            self.tree.insert('', tk.END, values=[stat[column] for column, _, _ in self.COLUMNS])
+        pool = self.db.pool.stats()
+        self.summary.config(text=f"Connections: {pool['in_use']} in use, {pool['open']}/{pool['size']} open   "
+                                 f"Cache: {self.db.cache.hits} hits, {self.db.cache.misses} misses")
+        self.slow_list.delete(0, tk.END)
+        for at, name, ms, sql, params in reversed(query_metrics.slow_queries):
+            self.slow_list.insert(tk.END, f"{datetime.datetime.fromtimestamp(at):%H:%M:%S}  {ms:8.1f} ms  {name}  "
+                                          f"{' '.join(sql.split())}  {params!r}")
+        self._pending = self.after(self.REFRESH_MS, self.refresh)
+
+    def set_threshold(self):
+        try:
+            query_metrics.set_slow_threshold(float(self.threshold_entry.get()))
+        except ValueError:
+            messagebox.showerror("Error", "Threshold must be a number of milliseconds.", parent=self)
+
+    def reset(self):
+        query_metrics.reset()
+        queries.reset_stats()
+
+    def export(self):
+        path = filedialog.asksaveasfilename(parent=self, defaultextension='.prom', initialfile='hms.prom',
+                                            filetypes=[('Prometheus text', '*.prom'), ('All files', '*.*')])
+        if path:
+            query_metrics.write_prometheus(path)
 
 
 class PlaceholderManager(tk.Frame):
@@ -227,56 +275,16 @@ class PlaceholderManager(tk.Frame):
 
 class PatientManager(tk.Frame):
     
-    def __init__(self, parent):
+    def __init__(self, parent, executor):
         super().__init__(parent)
+        self.executor = executor
         self.db = Database()
+        self.service = PatientService(self.db)
         self.pack(fill=tk.BOTH, expand=True)
         
-        # Configure style for dark theme
-        self.style = ttk.Style()
-        self.style.theme_use('default')
-        
         # General background color
         self.configure(background='#38475c')
         
-        # Configure widget styles
-        self.style.configure('TFrame', background='#38475c')
-        self.style.configure('TLabel', background='#38475c', foreground='white',font=('Times New Roman', 11)),  # Set font family and size)
-        self.style.configure('TButton',
-                            font=('Arial', 10,'bold'),
-                            background='#1976D2', 
-                            foreground='white', 
-                            borderwidth=1,
-                            focuscolor='#2e2e2e')
-        self.style.map('TButton',
-                    background=[('active', '#2a4e64'), ('pressed', '#6a6a6a')],
-                    foreground=[('active', 'white')])
-        
-        # Treeview style
-        self.style.configure('Treeview',
-                            background='#38475c',
-                            foreground='white',
-                            fieldbackground='#38475c',
-                            borderwidth=0)
-        self.style.configure('Treeview.Heading',
-                            font=('Times New Roman', 13),
-                            padding=2,               # Adjust padding (optional)
-                            background='#232c39',
-                            foreground='white',
-                            relief='flat')
-        self.style.map('Treeview',
-                    background=[('selected', '#2d6355')],
-                    foreground=[('selected', 'white')])
-        
-        
-        # Entry and Combobox style
-        self.style.configure('TEntry',
-                            fieldbackground='#e9e9e9',
-                            foreground='black')
-        self.style.configure('TCombobox',
-                            fieldbackground='#e9e9e9',
-                            foreground='black')
-        
         # Main container
         self.main_frame = ttk.Frame(self)
         self.main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -285,12 +293,19 @@ class PatientManager(tk.Frame):
         tree_frame = ttk.Frame(self.main_frame)
         tree_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
+        # Shown while this screen's queries run in the background
+        self.loading = BusyIndicator(tree_frame)
+        self.loading.pack(side=tk.BOTTOM, fill=tk.X)
+
         # Form Frame
         form_frame = ttk.Frame(self.main_frame, width=300)
         form_frame.pack(side=tk.RIGHT, fill=tk.Y, padx=10)
 
         # Treeview
-        self.tree = ttk.Treeview(tree_frame, columns=('ID', 'Name', 'Age', 'Gender', 'Contact'), show='headings')
+        self.tree = VirtualTreeview(tree_frame,
+                                    fetch_page=self.service.page,
+                                    executor=executor, busy=self.loading,
+                                    columns=('ID', 'Name', 'Age', 'Gender', 'Contact'), show='headings')
         self.tree.heading('ID', text='Patient ID')
         self.tree.heading('Name', text='Name')
         self.tree.heading('Age', text='Age')
@@ -302,6 +317,9 @@ class PatientManager(tk.Frame):
         self.tree.column('Age', width=80, anchor=tk.CENTER)
         self.tree.column('Gender', width=100, anchor=tk.CENTER)
         self.tree.column('Contact', width=150, anchor=tk.CENTER)
+        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.attach_scrollbar(scrollbar)
         self.tree.pack(fill=tk.BOTH, expand=True)
 
         # Form Fields
@@ -336,21 +354,20 @@ class PatientManager(tk.Frame):
         # Bind treeview selection
         self.tree.bind('<<TreeviewSelect>>', self.load_selected_patient)
 
+    @timed
     def load_patients(self):
-        # Clear existing data in the Treeview
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-
+        # Only the first page is fetched; the rest loads as the user scrolls
         try:
-            patients = self.db.fetch_patients()
-            for patient in patients:
-                # Convert all values to strings before inserting
-                str_patient = tuple(str(value) for value in patient)
-                self.tree.insert('', tk.END, values=str_patient)
-
+            self.tree.reset()
         except Exception as e:
             messagebox.showerror("Error", f"Error loading patients: {e}")
 
+    @timed
+    def refresh(self):
+        # Shown again from the view cache: patch the rows already loaded
+        self.tree.refresh()
+
+    @timed
     def load_selected_patient(self, event):
         selected = self.tree.focus()
         if selected:
@@ -374,27 +391,12 @@ class PatientManager(tk.Frame):
 
 
     def add_patient(self):
-        try:
-            name = self.name_entry.get()
-            age = int(self.age_entry.get())
-            gender = self.gender_combobox.get()
-            contact = self.contact_entry.get()
-
-            if not all([name, age, gender, contact]):
-                messagebox.showerror("Error", "All fields are required!")
-                return
-
-            self.db.execute_query(
-                "INSERT INTO Patients (Name, Age, Gender, Contact) VALUES (?, ?, ?, ?)",
-                (name, age, gender, contact)
-            )
-            self.load_patients()
-            self.clear_form()
-            messagebox.showinfo("Success", "Patient added successfully!")
-        except ValueError:
-            messagebox.showerror("Error", "Age must be a number!")
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        record = {'Name': self.name_entry.get(), 'Age': self.age_entry.get(),
+                  'Gender': self.gender_combobox.get(), 'Contact': self.contact_entry.get()}
+        # Checked by the service: a bad age or a missing field comes back as the error
+        self.executor.submit(self.service.create, record, owner=self, busy=self.loading,
+                             on_done=lambda row: self.row_saved(row, "Patient added successfully!"),
+                             on_error=lambda e: messagebox.showerror("Error", str(e)))
 
     def update_patient(self):
         selected = self.tree.focus()
@@ -409,26 +411,13 @@ class PatientManager(tk.Frame):
                 return
 
             patient_id = int(values[0])  # Convert to integer IMMEDIATELY
+            record = {'Name': self.name_entry.get(), 'Age': self.age_entry.get(),
+                      'Gender': self.gender_combobox.get(), 'Contact': self.contact_entry.get()}
 
-            name = self.name_entry.get()
-            age = int(self.age_entry.get())
-            gender = self.gender_combobox.get()
-            contact = self.contact_entry.get()
-
-            if not all([name, age, gender, contact]):
-                messagebox.showerror("Error", "All fields are required!")
-                return
-
-            self.db.execute_query(
-                "UPDATE Patients SET Name=?, Age=?, Gender=?, Contact=? WHERE PatientID=?",
-                (name, age, gender, contact, patient_id)
-            )
-            self.load_patients()  # Reload to show updated data
-            messagebox.showinfo("Success", "Patient updated successfully!")
-            self.clear_form()
+            self.executor.submit(self.service.update, patient_id, record, owner=self, busy=self.loading,
+                                 on_done=lambda row: self.row_saved(row, "Patient updated successfully!"),
+                                 on_error=lambda e: messagebox.showerror("Error", str(e)))
 
-        except ValueError as ve:
-            messagebox.showerror("Error", f"Invalid input: {ve}")  # More general message
         except Exception as e:
             messagebox.showerror("Error", str(e))
 
@@ -447,13 +436,23 @@ class PatientManager(tk.Frame):
             patient_id = int(values[0])  # Convert to integer IMMEDIATELY
 
             if messagebox.askyesno("Confirm", "Are you sure you want to delete this patient?"):
-                self.db.execute_query("DELETE FROM Patients WHERE PatientID=?", (patient_id,))
-                self.load_patients()  # Reload to show updated data
-                self.clear_form()
-                messagebox.showinfo("Success", "Patient deleted successfully!")
+                self.executor.submit(self.service.delete, patient_id,
+                                     owner=self, busy=self.loading,
+                                     on_done=lambda _: self.row_deleted(patient_id, "Patient deleted successfully!"),
+                                     on_error=lambda e: messagebox.showerror("Error", str(e)))
         except Exception as e:
             messagebox.showerror("Error", str(e))
 
+    def row_saved(self, row, message):
+        self.tree.upsert_row(row)
+        self.clear_form()
+        messagebox.showinfo("Success", message)
+
+    def row_deleted(self, key, message):
+        self.tree.delete_row(key)
+        self.clear_form()
+        messagebox.showinfo("Success", message)
+
     def clear_form(self):
         self.name_entry.delete(0, tk.END)
         self.age_entry.delete(0, tk.END)
@@ -468,51 +467,16 @@ class PatientManager(tk.Frame):
 #####################
 
 class DoctorManager(tk.Frame):
-    def __init__(self, parent):
+    def __init__(self, parent, executor):
         super().__init__(parent)
+        self.executor = executor
         self.db = Database()  # Initialize your database connection
+        self.service = DoctorService(self.db)
         self.pack(fill=tk.BOTH, expand=True)
 
-        # Configure style for dark theme
-        self.style = ttk.Style()
-        self.style.theme_use('default')
-
         # General background color
         self.configure(background='#38475c')
 
-        # Configure widget styles
-        self.style.configure('TFrame', background='#38475c')
-        self.style.configure('TLabel', background='#38475c', foreground='white', font=('Times New Roman', 11))
-        self.style.configure('TButton',
-                            font=('Arial', 10, 'bold'),
-                            background='#1976D2',
-                            foreground='white',
-                            borderwidth=1,
-                            focuscolor='#2e2e2e')
-        self.style.map('TButton',
-                       background=[('active', '#2a4e64'), ('pressed', '#6a6a6a')],
-                       foreground=[('active', 'white')])
-
-        self.style.configure('Treeview',
-                            background='#38475c',
-                            foreground='white',
-                            fieldbackground='#38475c',
-                            borderwidth=0)
-        self.style.configure('Treeview.Heading',
-                            font=('Times New Roman', 13),
-                            padding=2,
-                            background='#232c39',
-                            foreground='white',
-                            relief='flat')
-        self.style.map('Treeview',
-                       background=[('selected', '#2d6355')],
-                       foreground=[('selected', 'white')])
-
-
-        self.style.configure('TEntry',
-                            fieldbackground='#e9e9e9',
-                            foreground='black')
-
         # Main container
         self.main_frame = ttk.Frame(self)
         self.main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -521,14 +485,20 @@ class DoctorManager(tk.Frame):
         tree_frame = ttk.Frame(self.main_frame)
         tree_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
+        # Shown while this screen's queries run in the background
+        self.loading = BusyIndicator(tree_frame)
+        self.loading.pack(side=tk.BOTTOM, fill=tk.X)
+
         # Form Frame
         form_frame = ttk.Frame(self.main_frame, width=300)
         form_frame.pack(side=tk.RIGHT, fill=tk.Y, padx=10)
 
         # Treeview
-        self.tree = ttk.Treeview(tree_frame,
-                                columns=('ID', 'Name', 'Specialization', 'Contact'),
-                                show='headings')
+        self.tree = VirtualTreeview(tree_frame,
+                                    fetch_page=self.service.page,
+                                    executor=executor, busy=self.loading,
+                                    columns=('ID', 'Name', 'Specialization', 'Contact'),
+                                    show='headings')
         self.tree.heading('ID', text='Doctor ID')
         self.tree.heading('Name', text='Name')
         self.tree.heading('Specialization', text='Specialization')
@@ -537,6 +507,9 @@ class DoctorManager(tk.Frame):
         self.tree.column('Name', width=150, anchor=tk.CENTER)
         self.tree.column('Specialization', width=200, anchor=tk.CENTER)
         self.tree.column('Contact', width=150, anchor=tk.CENTER)
+        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.attach_scrollbar(scrollbar)
         self.tree.pack(fill=tk.BOTH, expand=True)
 
 
@@ -566,15 +539,15 @@ class DoctorManager(tk.Frame):
         self.load_doctors()  # Placeholder
         self.tree.bind('<<TreeviewSelect>>', self.load_selected_doctor) # Placeholder
 
+    @timed
     def load_doctors(self):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        self.tree.reset()
 
-        doctors = self.db.fetch_doctors()
-        for doctor in doctors:
-            str_doctor = tuple(str(value) for value in doctor)  # Convert to strings!
-            self.tree.insert('', tk.END, values=str_doctor)
+    @timed
+    def refresh(self):
+        self.tree.refresh()
 
+    @timed
     def load_selected_doctor(self, event):
         selected = self.tree.focus()
         if selected:
@@ -594,24 +567,11 @@ class DoctorManager(tk.Frame):
                 self.clear_form()
 
     def add_doctor(self):
-        try:
-            name = self.name_entry.get()
-            specialization = self.spec_entry.get()
-            contact = self.contact_entry.get()
-
-            if not all([name, specialization, contact]):
-                messagebox.showerror("Error", "All fields are required!")
-                return
-
-            self.db.execute_query(
-                "INSERT INTO Doctors (Name, Specialization, Contact) VALUES (?, ?, ?)",
-                (name, specialization, contact)
-            )
-            self.load_doctors()
-            self.clear_form()
-            messagebox.showinfo("Success", "Doctor added successfully!")
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        record = {'Name': self.name_entry.get(), 'Specialization': self.spec_entry.get(),
+                  'Contact': self.contact_entry.get()}
+        self.executor.submit(self.service.create, record, owner=self, busy=self.loading,
+                             on_done=lambda row: self.row_saved(row, "Doctor added successfully!"),
+                             on_error=lambda e: messagebox.showerror("Error", str(e)))
 
     def update_doctor(self):
         selected = self.tree.focus()
@@ -626,22 +586,12 @@ class DoctorManager(tk.Frame):
                 return
 
             doctor_id = int(values[0])  # Convert to integer IMMEDIATELY
+            record = {'Name': self.name_entry.get(), 'Specialization': self.spec_entry.get(),
+                      'Contact': self.contact_entry.get()}
 
-            name = self.name_entry.get()
-            specialization = self.spec_entry.get()
-            contact = self.contact_entry.get()
-
-            if not all([name, specialization, contact]):
-                messagebox.showerror("Error", "All fields are required!")
-                return
-
-            self.db.execute_query(
-                "UPDATE Doctors SET Name=?, Specialization=?, Contact=? WHERE DoctorID=?",
-                (name, specialization, contact, doctor_id)
-            )
-            self.load_doctors()  # Reload Treeview
-            messagebox.showinfo("Success", "Doctor updated successfully!")
-            self.clear_form()
+            self.executor.submit(self.service.update, doctor_id, record, owner=self, busy=self.loading,
+                                 on_done=lambda row: self.row_saved(row, "Doctor updated successfully!"),
+                                 on_error=lambda e: messagebox.showerror("Error", str(e)))
 
         except Exception as e:
             messagebox.showerror("Error", str(e))
@@ -661,14 +611,24 @@ class DoctorManager(tk.Frame):
             doctor_id = int(values[0])  # Convert to integer IMMEDIATELY
 
             if messagebox.askyesno("Confirm", "Are you sure you want to delete this doctor?"):
-                self.db.execute_query("DELETE FROM Doctors WHERE DoctorID=?", (doctor_id,))
-                self.load_doctors()  # Reload Treeview
-                self.clear_form()
-                messagebox.showinfo("Success", "Doctor deleted successfully!")
+                self.executor.submit(self.service.delete, doctor_id,
+                                     owner=self, busy=self.loading,
+                                     on_done=lambda _: self.row_deleted(doctor_id, "Doctor deleted successfully!"),
+                                     on_error=lambda e: messagebox.showerror("Error", str(e)))
 
         except Exception as e:
             messagebox.showerror("Error", str(e))
 
+    def row_saved(self, row, message):
+        self.tree.upsert_row(row)
+        self.clear_form()
+        messagebox.showinfo("Success", message)
+
+    def row_deleted(self, key, message):
+        self.tree.delete_row(key)
+        self.clear_form()
+        messagebox.showinfo("Success", message)
+
     def clear_form(self):
         self.name_entry.delete(0, tk.END)
         self.spec_entry.delete(0, tk.END)
@@ -682,49 +642,17 @@ class DoctorManager(tk.Frame):
 # APPOINTMENT MANAGER
 #########################
 
+
 class AppointmentManager(tk.Frame):
-    def __init__(self, parent):
+    def __init__(self, parent, executor):
         super().__init__(parent)
+        self.executor = executor
         self.db = Database()
+        self.service = AppointmentService(self.db)
         self.pack(fill=tk.BOTH, expand=True)
 
-        # Configure style for dark theme
-        self.style = ttk.Style()
-        self.style.theme_use('default')
+        # General background color
         self.configure(background='#38475c')
-        
-        # Widget style configurations
-        self.style.configure('TFrame', background='#38475c')
-        self.style.configure('TLabel', background='#38475c', foreground='white', font=('Times New Roman', 11))
-        self.style.configure('TButton',
-                            font=('Arial', 10, 'bold'),
-                            background='#1976D2',
-                            foreground='white',
-                            borderwidth=1,
-                            focuscolor='#2e2e2e')
-        self.style.map('TButton',
-                       background=[('active', '#2a4e64'), ('pressed', '#6a6a6a')],
-                       foreground=[('active', 'white')])
-        self.style.configure('Treeview',
-                            background='#38475c',
-                            foreground='white',
-                            fieldbackground='#38475c',
-                            borderwidth=0)
-        self.style.configure('Treeview.Heading',
-                            font=('Times New Roman', 13),
-                            padding=2,
-                            background='#232c39',
-                            foreground='white',
-                            relief='flat')
-        self.style.map('Treeview',
-                       background=[('selected', '#2d6355')],
-                       foreground=[('selected', 'white')])
-        self.style.configure('TEntry',
-                            fieldbackground='#e9e9e9',
-                            foreground='black')
-        self.style.configure('TCombobox',
-                            fieldbackground='#e9e9e9',
-                            foreground='black')
 
         # Main container
         self.main_frame = ttk.Frame(self)
@@ -734,34 +662,48 @@ class AppointmentManager(tk.Frame):
         tree_frame = ttk.Frame(self.main_frame)
         tree_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
+        # Shown while this screen's queries run in the background
+        self.loading = BusyIndicator(tree_frame)
+        self.loading.pack(side=tk.BOTTOM, fill=tk.X)
+
         # Form Frame
         form_frame = ttk.Frame(self.main_frame, width=300)
         form_frame.pack(side=tk.RIGHT, fill=tk.Y, padx=10)
 
         # Treeview
-        self.tree = ttk.Treeview(tree_frame, 
-                               columns=('ID', 'Patient', 'Doctor', 'Date', 'Time'), 
+        self.tree = VirtualTreeview(tree_frame,
+                               fetch_page=self.service.page,
+                               executor=executor, busy=self.loading,
+                               format_row=self.format_appointment,
+                               columns=('ID', 'Patient', 'Doctor', 'Date', 'Time', 'Duration', 'Attendance'),
                                show='headings')
         self.tree.heading('ID', text='Appointment ID')
         self.tree.heading('Patient', text='Patient')
         self.tree.heading('Doctor', text='Doctor')
         self.tree.heading('Date', text='Date')
         self.tree.heading('Time', text='Time')
+        self.tree.heading('Duration', text='Minutes')
+        self.tree.heading('Attendance', text='Attendance')
         self.tree.column('ID', width=100, anchor=tk.CENTER)
         self.tree.column('Patient', width=150, anchor=tk.CENTER)
         self.tree.column('Doctor', width=150, anchor=tk.CENTER)
         self.tree.column('Date', width=120, anchor=tk.CENTER)
         self.tree.column('Time', width=100, anchor=tk.CENTER)
+        self.tree.column('Duration', width=70, anchor=tk.CENTER)
+        self.tree.column('Attendance', width=90, anchor=tk.CENTER)
+        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.attach_scrollbar(scrollbar)
         self.tree.pack(fill=tk.BOTH, expand=True)
 
 
         # Form Fields
         ttk.Label(form_frame, text="Patient:", width=12).grid(row=0, column=0, sticky=tk.W, pady=5, padx=5)
-        self.patient_combobox = ttk.Combobox(form_frame, width=21)
+        self.patient_combobox = SearchCombobox(form_frame, search=self.db.search_patients, executor=executor, width=21)
         self.patient_combobox.grid(row=0, column=1, pady=5, padx=5)
 
         ttk.Label(form_frame, text="Doctor:", width=12).grid(row=1, column=0, sticky=tk.W, pady=5, padx=5)
-        self.doctor_combobox = ttk.Combobox(form_frame, width=21)
+        self.doctor_combobox = SearchCombobox(form_frame, search=self.db.search_doctors, executor=executor, width=21)
         self.doctor_combobox.grid(row=1, column=1, pady=5, padx=5)
 
         ttk.Label(form_frame, text="Date:", width=12).grid(row=2, column=0, sticky=tk.W, pady=5, padx=5)
@@ -773,46 +715,106 @@ class AppointmentManager(tk.Frame):
         self.time_entry = ttk.Entry(form_frame, width=23)
         self.time_entry.grid(row=3, column=1, pady=5, padx=5)
 
+        ttk.Label(form_frame, text="Minutes:", width=12).grid(row=4, column=0, sticky=tk.W, pady=5, padx=5)
+        self.duration_combobox = ttk.Combobox(form_frame, values=['15', '30', '45', '60', '90'], width=21)
+        self.duration_combobox.set(str(APPOINTMENT_MINUTES))
+        self.duration_combobox.grid(row=4, column=1, pady=5, padx=5)
+
         # Buttons
         btn_frame = ttk.Frame(form_frame)
-        btn_frame.grid(row=4, column=0, columnspan=2, pady=10)
+        btn_frame.grid(row=5, column=0, columnspan=2, pady=10)
 
         ttk.Button(btn_frame, text="Add", command=self.add_appointment, width=14).grid(row=0, column=0, padx=5, pady=5)
         ttk.Button(btn_frame, text="Update", command=self.update_appointment, width=14).grid(row=0, column=1, padx=5, pady=5)
         ttk.Button(btn_frame, text="Delete", command=self.delete_appointment, width=14).grid(row=1, column=0, padx=5, pady=5)
         ttk.Button(btn_frame, text="Clear", command=self.clear_form, width=14).grid(row=1, column=1, padx=5, pady=5)
+        ttk.Button(btn_frame, text="Attended", command=lambda: self.record_attendance('Attended'), width=14).grid(
+            row=2, column=0, padx=5, pady=5)
+        ttk.Button(btn_frame, text="No-Show", command=lambda: self.record_attendance('NoShow'), width=14).grid(
+            row=2, column=1, padx=5, pady=5)
+
+        # Free slot finder: earliest free slots of the chosen length from the form's date on
+        ttk.Label(form_frame, text="Specialization:", width=12).grid(row=6, column=0, sticky=tk.W, pady=5, padx=5)
+        self.specialization_combobox = ttk.Combobox(form_frame, width=21, state='readonly')
+        self.specialization_combobox.grid(row=6, column=1, pady=5, padx=5)
+        ttk.Button(form_frame, text="Find Free Slots", command=self.find_free_slots, width=30).grid(
+            row=7, column=0, columnspan=2, pady=5)
+        self.slot_list = tk.Listbox(form_frame, height=FREE_SLOT_LIMIT, width=42, background='#e9e9e9',
+                                    exportselection=False)
+        self.slot_list.grid(row=8, column=0, columnspan=2, pady=5, padx=5)
+        self.slot_list.bind('<<ListboxSelect>>', self.use_free_slot)
+        self.free_slots = []
 
         # Load initial data
         self.load_appointments()
         self.load_combobox_data()
         self.tree.bind('<<TreeviewSelect>>', self.load_selected_appointment)
 
+    @timed
     def load_combobox_data(self):
-        # Load patients
-        patients = self.db.fetch_patients()
-        patient_list = [f"{p[0]} - {p[1]}" for p in patients]
-        self.patient_combobox['values'] = patient_list
-
-        # Load doctors
-        doctors = self.db.fetch_doctors()
-        doctor_list = [f"{d[0]} - {d[1]}" for d in doctors]
-        self.doctor_combobox['values'] = doctor_list
+        # Only the first matches are listed; typing narrows them down
+        self.patient_combobox.refresh()
+        self.doctor_combobox.refresh()
+        self.executor.submit(self.db.fetch_specializations, owner=self,
+                             on_done=lambda values: self.specialization_combobox.configure(values=values))
+
+    def find_free_slots(self):
+        specialization = self.specialization_combobox.get()
+        if not specialization:
+            messagebox.showerror("Error", "Please select a specialization!")
+            return
+        duration = self.get_duration()
+        if duration is None:
+            return
+        try:
+            start = self.date_entry.get_date()
+        except ValueError:
+            start = datetime.date.today()
+        end = start + datetime.timedelta(days=FREE_SLOT_DAYS - 1)
+
+        self.executor.submit(self.service.free_slots, specialization, start, end, duration,
+                             owner=self, busy=self.loading,
+                             on_done=self.show_free_slots,
+                             on_error=lambda e: messagebox.showerror("Error", str(e)))
+
+    def show_free_slots(self, slots):
+        self.free_slots = slots
+        self.slot_list.delete(0, tk.END)
+        for date, time, _, doctor in slots:
+            self.slot_list.insert(tk.END, f"{date}  {time}  {doctor}")
+        if not slots:
+            self.slot_list.insert(tk.END, f"No free slots in the next {FREE_SLOT_DAYS} days")
+
+    def use_free_slot(self, event):
+        # Copy the chosen slot into the form; the patient is still picked by hand
+        selection = self.slot_list.curselection()
+        if not selection or selection[0] >= len(self.free_slots):
+            return
+        date, time, _, doctor = self.free_slots[selection[0]]
+        self.doctor_combobox.set(doctor)
+        self.date_entry.set_date(date)
+        self.time_entry.delete(0, tk.END)
+        self.time_entry.insert(0, time)
 
+    @timed
     def load_appointments(self):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        self.tree.reset()
 
-        appointments = self.db.fetch_appointments()
-        for appt in appointments:
-            # Format the time here to HH:MM for display
-            formatted_time = appt[4].strftime("%H:%M") if appt[4] else ""  # Handle potential None values
+    def format_appointment(self, appt):
+        # Format the time here to HH:MM for display
+        formatted_time = appt[4].strftime("%H:%M") if appt[4] else ""  # Handle potential None values
 
-            # Create a new tuple with the formatted time
-            display_appt = (appt[0], appt[1], appt[2], appt[3], formatted_time)
+        # Create a new tuple with the formatted time
+        display_appt = (appt[0], appt[1], appt[2], appt[3], formatted_time, appt[5], appt[6] or '')
 
-            str_appt = tuple(str(value) for value in display_appt)  # Convert to strings!
-            self.tree.insert('', tk.END, values=str_appt)
+        return tuple(str(value) for value in display_appt)  # Convert to strings!
 
+    @timed
+    def refresh(self):
+        self.tree.refresh()
+        self.load_combobox_data()
+
+    @timed
     def load_selected_appointment(self, event):
         selected = self.tree.focus()
         if selected:
@@ -822,39 +824,22 @@ class AppointmentManager(tk.Frame):
                 doctor = values[2] if len(values) > 2 else ""
                 date = values[3] if len(values) > 3 else ""
                 time = values[4] if len(values) > 4 else ""
+                duration = values[5] if len(values) > 5 else str(APPOINTMENT_MINUTES)
 
                 self.patient_combobox.set(patient)
                 self.doctor_combobox.set(doctor)
                 self.date_entry.set_date(date)  # Use set_date for DateEntry
                 self.time_entry.delete(0, tk.END)
                 self.time_entry.insert(0, time)
+                self.duration_combobox.set(duration)
             else:
                 self.clear_form()
 
     def add_appointment(self):
-        try:
-            patient_id = self.patient_combobox.get().split(' - ')[0]
-            doctor_id = self.doctor_combobox.get().split(' - ')[0]
-            date = self.date_entry.get_date()
-            time = self.time_entry.get()
-
-            if not all([patient_id, doctor_id, date, time]):
-                messagebox.showerror("Error", "All fields are required!")
-                return
-
-            if not re.match(r'^\d{2}:\d{2}$', time):
-                messagebox.showerror("Error", "Time must be in HH:MM format!")
-                return
-
-            self.db.execute_query(
-                "INSERT INTO Appointments (PatientID, DoctorID, AppointmentDate, AppointmentTime) VALUES (?, ?, ?, ?)",
-                (patient_id, doctor_id, date, time)
-            )
-            self.load_appointments()  # Reload Treeview
-            self.clear_form()
-            messagebox.showinfo("Success", "Appointment added successfully!")
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        # Rejected with SlotConflict if the doctor is already booked
+        self.executor.submit(self.service.create, self.get_record(), owner=self, busy=self.loading,
+                             on_done=lambda row: self.row_saved(row, "Appointment added successfully!"),
+                             on_error=lambda e: messagebox.showerror("Error", str(e)))
 
     def update_appointment(self):
         selected = self.tree.focus()
@@ -870,31 +855,10 @@ class AppointmentManager(tk.Frame):
 
             appointment_id = int(values[0])
 
-            patient_id = self.patient_combobox.get().split('(')[1].split(')')[0]
-            doctor_id = self.doctor_combobox.get().split('(')[1].split(')')[0]
-            date = self.date_entry.get_date()
-            time = self.time_entry.get()
-
-            if not date:  # Check if date is None
-                messagebox.showerror("Error", "Date is required!")
-                return
-
-            if not time:  # Check if time is empty
-                messagebox.showerror("Error", "Time is required!")
-                return
-
-            if not re.match(r'^\d{2}:\d{2}$', time):
-                messagebox.showerror("Error", "Time must be in HH:MM format!")
-                return
-
-
-            self.db.execute_query(
-                "UPDATE Appointments SET PatientID=?, DoctorID=?, AppointmentDate=?, AppointmentTime=? WHERE AppointmentID=?",
-                (patient_id, doctor_id, date, time + ":00", appointment_id)  # Add seconds for SQL Server
-            )
-            self.load_appointments()
-            self.clear_form()
-            messagebox.showinfo("Success", "Appointment updated successfully!")
+            self.executor.submit(self.service.update, appointment_id, self.get_record(),
+                                 owner=self, busy=self.loading,
+                                 on_done=lambda row: self.row_saved(row, "Appointment updated successfully!"),
+                                 on_error=lambda e: messagebox.showerror("Error", str(e)))
 
         except Exception as e:
             messagebox.showerror("Error", str(e))
@@ -914,19 +878,61 @@ class AppointmentManager(tk.Frame):
             appointment_id = int(values[0])  # Convert to integer IMMEDIATELY
 
             if messagebox.askyesno("Confirm", "Are you sure you want to delete this appointment?"):
-                self.db.execute_query("DELETE FROM Appointments WHERE AppointmentID=?", (appointment_id,))
-                self.load_appointments()  # Reload Treeview
-                self.clear_form()
-                messagebox.showinfo("Success", "Appointment deleted successfully!")
+                self.executor.submit(self.service.delete, appointment_id,
+                                     owner=self, busy=self.loading,
+                                     on_done=lambda _: self.row_deleted(appointment_id, "Appointment deleted successfully!"),
+                                     on_error=lambda e: messagebox.showerror("Error", str(e)))
 
         except Exception as e:
             messagebox.showerror("Error", str(e))
 
+    def record_attendance(self, attendance):
+        selected = self.tree.focus()
+        values = selected and self.tree.item(selected, 'values')
+        if not values:
+            messagebox.showerror("Error", "Please select an appointment!")
+            return
+        self.executor.submit(self.service.record_attendance, int(values[0]), {'Attendance': attendance},
+                             owner=self, busy=self.loading,
+                             on_done=self.tree.upsert_row,
+                             on_error=lambda e: messagebox.showerror("Error", str(e)))
+
+    def row_saved(self, row, message):
+        self.tree.upsert_row(row)
+        self.clear_form()
+        messagebox.showinfo("Success", message)
+
+    def row_deleted(self, key, message):
+        self.tree.delete_row(key)
+        self.clear_form()
+        messagebox.showinfo("Success", message)
+
     def clear_form(self):
         self.patient_combobox.set('')
         self.doctor_combobox.set('')
         self.date_entry.set_date(None)
         self.time_entry.delete(0, tk.END)
+        self.duration_combobox.set(str(APPOINTMENT_MINUTES))
+
+    def get_duration(self):
+        try:
+            duration = int(self.duration_combobox.get())
+            if duration <= 0:
+                raise ValueError
+            return duration
+        except ValueError:
+            messagebox.showerror("Error", "Minutes must be a positive number!")
+            return None
+
+    def get_record(self):
+        # The form as a record for the appointment service, which checks it
+        try:
+            date = self.date_entry.get_date()
+        except ValueError:
+            date = None
+        return {'PatientID': self.patient_combobox.selected_id(), 'DoctorID': self.doctor_combobox.selected_id(),
+                'AppointmentDate': date, 'AppointmentTime': self.time_entry.get(),
+                'DurationMinutes': self.duration_combobox.get()}
 
 
 
@@ -936,48 +942,15 @@ class AppointmentManager(tk.Frame):
 ########################
 
 class PrescriptionManager(tk.Frame):
-    def __init__(self, parent):
+    def __init__(self, parent, executor):
         super().__init__(parent)
+        self.executor = executor
         self.db = Database()
+        self.service = PrescriptionService(self.db)
         self.pack(fill=tk.BOTH, expand=True)
 
-        # Configure style for dark theme
-        self.style = ttk.Style()
-        self.style.theme_use('default')
+        # General background color
         self.configure(background='#38475c')
-        
-        # Widget style configurations
-        self.style.configure('TFrame', background='#38475c')
-        self.style.configure('TLabel', background='#38475c', foreground='white', font=('Times New Roman', 11))
-        self.style.configure('TButton',
-                            font=('Arial', 10, 'bold'),
-                            background='#1976D2',
-                            foreground='white',
-                            borderwidth=1,
-                            focuscolor='#2e2e2e')
-        self.style.map('TButton',
-                       background=[('active', '#2a4e64'), ('pressed', '#6a6a6a')],
-                       foreground=[('active', 'white')])
-        self.style.configure('Treeview',
-                            background='#38475c',
-                            foreground='white',
-                            fieldbackground='#38475c',
-                            borderwidth=0)
-        self.style.configure('Treeview.Heading',
-                            font=('Times New Roman', 13),
-                            padding=2,
-                            background='#232c39',
-                            foreground='white',
-                            relief='flat')
-        self.style.map('Treeview',
-                       background=[('selected', '#2d6355')],
-                       foreground=[('selected', 'white')])
-        self.style.configure('TEntry',
-                            fieldbackground='#e9e9e9',
-                            foreground='black')
-        self.style.configure('TCombobox',
-                            fieldbackground='#e9e9e9',
-                            foreground='black')
 
         # Main container
         self.main_frame = ttk.Frame(self)
@@ -987,33 +960,44 @@ class PrescriptionManager(tk.Frame):
         tree_frame = ttk.Frame(self.main_frame)
         tree_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
+        # Shown while this screen's queries run in the background
+        self.loading = BusyIndicator(tree_frame)
+        self.loading.pack(side=tk.BOTTOM, fill=tk.X)
+
         # Form Frame
         form_frame = ttk.Frame(self.main_frame, width=300)
         form_frame.pack(side=tk.RIGHT, fill=tk.Y, padx=10)
 
         # Treeview
-        self.tree = ttk.Treeview(tree_frame, 
-                               columns=('ID', 'Patient', 'Doctor', 'Diagnosis', 'Medication'), 
+        self.tree = VirtualTreeview(tree_frame,
+                               fetch_page=self.service.page,
+                               executor=executor, busy=self.loading,
+                               columns=('ID', 'Patient', 'Doctor', 'Diagnosis', 'Medication', 'Quantity'),
                                show='headings')
         self.tree.heading('ID', text='Prescription ID')
         self.tree.heading('Patient', text='Patient')
         self.tree.heading('Doctor', text='Doctor')
         self.tree.heading('Diagnosis', text='Diagnosis')
         self.tree.heading('Medication', text='Medication')
+        self.tree.heading('Quantity', text='Qty')
         self.tree.column('ID', width=150, anchor=tk.CENTER)
         self.tree.column('Patient', width=150, anchor=tk.CENTER)
         self.tree.column('Doctor', width=150, anchor=tk.CENTER)
         self.tree.column('Diagnosis', width=175, anchor=tk.CENTER)
         self.tree.column('Medication', width=175, anchor=tk.CENTER)
+        self.tree.column('Quantity', width=60, anchor=tk.CENTER)
+        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.attach_scrollbar(scrollbar)
         self.tree.pack(fill=tk.BOTH, expand=True)
 
         # Form Fields
         ttk.Label(form_frame, text="Patient:", width=12).grid(row=0, column=0, sticky=tk.W, pady=5, padx=5)
-        self.patient_combobox = ttk.Combobox(form_frame, width=21)
+        self.patient_combobox = SearchCombobox(form_frame, search=self.db.search_patients, executor=executor, width=21)
         self.patient_combobox.grid(row=0, column=1, pady=5, padx=5)
 
         ttk.Label(form_frame, text="Doctor:", width=12).grid(row=1, column=0, sticky=tk.W, pady=5, padx=5)
-        self.doctor_combobox = ttk.Combobox(form_frame, width=21)
+        self.doctor_combobox = SearchCombobox(form_frame, search=self.db.search_doctors, executor=executor, width=21)
         self.doctor_combobox.grid(row=1, column=1, pady=5, padx=5)
 
         ttk.Label(form_frame, text="Diagnosis:", width=12).grid(row=2, column=0, sticky=tk.W, pady=5, padx=5)
@@ -1021,41 +1005,82 @@ class PrescriptionManager(tk.Frame):
         self.diagnosis_entry.grid(row=2, column=1, pady=5, padx=5)
 
         ttk.Label(form_frame, text="Medication:", width=12).grid(row=3, column=0, sticky=tk.W, pady=5, padx=5)
-        self.medication_entry = ttk.Entry(form_frame, width=23)
-        self.medication_entry.grid(row=3, column=1, pady=5, padx=5)
+        self.medicine_combobox = SearchCombobox(form_frame, search=self.db.search_medicines, executor=executor, width=21)
+        self.medicine_combobox.grid(row=3, column=1, pady=5, padx=5)
+
+        ttk.Label(form_frame, text="Quantity:", width=12).grid(row=4, column=0, sticky=tk.W, pady=5, padx=5)
+        self.quantity_entry = ttk.Entry(form_frame, width=23)
+        self.quantity_entry.grid(row=4, column=1, pady=5, padx=5)
 
         # Buttons
         btn_frame = ttk.Frame(form_frame)
-        btn_frame.grid(row=4, column=0, columnspan=2, pady=10)
+        btn_frame.grid(row=5, column=0, columnspan=2, pady=10)
 
         ttk.Button(btn_frame, text="Add", command=self.add_prescription, width=14).grid(row=0, column=0, padx=5, pady=5)
         ttk.Button(btn_frame, text="Update", command=self.update_prescription, width=14).grid(row=0, column=1, padx=5, pady=5)
         ttk.Button(btn_frame, text="Delete", command=self.delete_prescription, width=14).grid(row=1, column=0, padx=5, pady=5)
         ttk.Button(btn_frame, text="Clear", command=self.clear_form, width=14).grid(row=1, column=1, padx=5, pady=5)
 
+        # Full-text search over diagnoses and medications: amox, "chest pain", "chest pa"*
+        self.search_text = ''
+        ttk.Label(form_frame, text="Search:", width=12).grid(row=6, column=0, sticky=tk.W, pady=5, padx=5)
+        self.search_entry = ttk.Entry(form_frame, width=23)
+        self.search_entry.grid(row=6, column=1, pady=5, padx=5)
+        self.search_entry.bind('<Return>', lambda event: self.search_prescriptions())
+        search_frame = ttk.Frame(form_frame)
+        search_frame.grid(row=7, column=0, columnspan=2)
+        ttk.Button(search_frame, text="Search", command=self.search_prescriptions, width=14).grid(row=0, column=0, padx=5, pady=5)
+        ttk.Button(search_frame, text="Show All", command=self.show_all, width=14).grid(row=0, column=1, padx=5, pady=5)
+
         # Load initial data
         self.load_prescriptions()
         self.load_combobox_data()
         self.tree.bind('<<TreeviewSelect>>', self.load_selected_prescription)
 
+    @timed
     def load_combobox_data(self):
-        # Load patients
-        patients = self.db.fetch_patients()
-        self.patient_combobox['values'] = [f"{p[1]} ({p[0]})" for p in patients]  # Name (ID) format
-
-        # Load doctors
-        doctors = self.db.fetch_doctors()
-        self.doctor_combobox['values'] = [f"{d[1]} ({d[0]})" for d in doctors]  # Name (ID) format
+        # Only the first matches are listed; typing narrows them down
+        self.patient_combobox.refresh()
+        self.doctor_combobox.refresh()
+        self.medicine_combobox.refresh()
 
+    @timed
     def load_prescriptions(self):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        self.tree.reset()
+
+    @timed
+    def refresh(self):
+        if self.search_text:
+            self.run_search(self.search_text)
+        else:
+            self.tree.refresh()
+        self.load_combobox_data()
 
-        prescriptions = self.db.fetch_prescriptions()
-        for pres in prescriptions:
-            str_pres = tuple(str(value) for value in pres)  # Convert to strings!
-            self.tree.insert('', tk.END, values=str_pres)
+    def search_prescriptions(self):
+        text = self.search_entry.get().strip()
+        if not text:
+            self.show_all()
+            return
+        self.run_search(text)
+
+    @timed
+    def run_search(self, text):
+        self.search_text = text
+        self.executor.submit(self.service.search, text, owner=self, busy=self.loading,
+                             on_done=self.show_matches,
+                             on_error=lambda e: messagebox.showerror("Error", f"Error searching prescriptions: {e}"))
+
+    def show_matches(self, rows):
+        self.tree.show_rows(rows)
+        if not rows:
+            messagebox.showinfo("Info", "No prescriptions match the search.")
+
+    def show_all(self):
+        self.search_text = ''
+        self.search_entry.delete(0, tk.END)
+        self.load_prescriptions()
 
+    @timed
     def load_selected_prescription(self, event):
         selected = self.tree.focus()
         if selected:
@@ -1065,50 +1090,23 @@ class PrescriptionManager(tk.Frame):
                 doctor = values[2] if len(values) > 2 else ""
                 diagnosis = values[3] if len(values) > 3 else ""
                 medication = values[4] if len(values) > 4 else ""
+                quantity = values[5] if len(values) > 5 else ""
 
                 self.patient_combobox.set(patient)
                 self.doctor_combobox.set(doctor)
                 self.diagnosis_entry.delete(0, tk.END)
                 self.diagnosis_entry.insert(0, diagnosis)
-                self.medication_entry.delete(0, tk.END)
-                self.medication_entry.insert(0, medication)
+                self.medicine_combobox.set(medication)
+                self.quantity_entry.delete(0, tk.END)
+                self.quantity_entry.insert(0, quantity)
             else:
                 self.clear_form()
 
     def add_prescription(self):
-        try:
-            patient_str = self.patient_combobox.get()
-            doctor_str = self.doctor_combobox.get()
-
-            if not patient_str or not doctor_str:  # Check if comboboxes are empty
-                messagebox.showerror("Error", "Please select a patient and a doctor.")
-                return
-
-            try:
-                patient_id = int(patient_str.split('(')[1].split(')')[0])
-                doctor_id = int(doctor_str.split('(')[1].split(')')[0])
-            except (IndexError, ValueError):
-                messagebox.showerror("Error", "Invalid patient or doctor selection.")
-                return
-
-
-            diagnosis = self.diagnosis_entry.get()
-            medication = self.medication_entry.get()
-
-            if not all([diagnosis, medication]):  # Check if diagnosis and medication are empty
-                messagebox.showerror("Error", "Diagnosis and Medication fields are required!")
-                return
-
-
-            self.db.execute_query(
-                "INSERT INTO Prescriptions (PatientID, DoctorID, Diagnosis, Medication) VALUES (?, ?, ?, ?)",
-                (patient_id, doctor_id, diagnosis, medication)
-            )
-            self.load_prescriptions()
-            self.clear_form()
-            messagebox.showinfo("Success", "Prescription added successfully!")
-        except Exception as e:
-            messagebox.showerror("Error", f"Error adding prescription: {e}")
+        # Takes the medicine from stock in the same transaction
+        self.executor.submit(self.service.create, self.get_record(), owner=self, busy=self.loading,
+                             on_done=lambda row: self.row_saved(row, "Prescription added successfully!"),
+                             on_error=lambda e: messagebox.showerror("Error", f"Error adding prescription: {e}"))
 
     def update_prescription(self):
         selected = self.tree.focus()
@@ -1124,34 +1122,10 @@ class PrescriptionManager(tk.Frame):
 
             prescription_id = int(values[0])
 
-            patient_str = self.patient_combobox.get()
-            doctor_str = self.doctor_combobox.get()
-
-            if not patient_str or not doctor_str:  # Check if comboboxes are empty
-                messagebox.showerror("Error", "Please select a patient and a doctor.")
-                return
-
-            try:
-                patient_id = int(patient_str.split('(')[1].split(')')[0])
-                doctor_id = int(doctor_str.split('(')[1].split(')')[0])
-            except (IndexError, ValueError):
-                messagebox.showerror("Error", "Invalid patient or doctor selection.")
-                return
-
-            diagnosis = self.diagnosis_entry.get()
-            medication = self.medication_entry.get()
-
-            if not all([diagnosis, medication]):  # Check if diagnosis and medication are empty
-                messagebox.showerror("Error", "Diagnosis and Medication fields are required!")
-                return
-
-            self.db.execute_query(
-                "UPDATE Prescriptions SET PatientID=?, DoctorID=?, Diagnosis=?, Medication=? WHERE PrescriptionID=?",
-                (patient_id, doctor_id, diagnosis, medication, prescription_id)
-            )
-            self.load_prescriptions()
-            self.clear_form()
-            messagebox.showinfo("Success", "Prescription updated successfully!")
+            self.executor.submit(self.service.update, prescription_id, self.get_record(),
+                                 owner=self, busy=self.loading,
+                                 on_done=lambda row: self.row_saved(row, "Prescription updated successfully!"),
+                                 on_error=lambda e: messagebox.showerror("Error", f"Error updating prescription: {e}"))
         except Exception as e:
             messagebox.showerror("Error", f"Error updating prescription: {e}")
 
@@ -1170,19 +1144,36 @@ class PrescriptionManager(tk.Frame):
             prescription_id = int(values[0])  # Convert to integer IMMEDIATELY
 
             if messagebox.askyesno("Confirm", "Are you sure you want to delete this prescription?"):
-                self.db.execute_query("DELETE FROM Prescriptions WHERE PrescriptionID=?", (prescription_id,))
-                self.load_prescriptions()  # Reload Treeview
-                self.clear_form()
-                messagebox.showinfo("Success", "Prescription deleted successfully!")
+                self.executor.submit(self.service.delete, prescription_id,
+                                     owner=self, busy=self.loading,
+                                     on_done=lambda _: self.row_deleted(prescription_id, "Prescription deleted successfully!"),
+                                     on_error=lambda e: messagebox.showerror("Error", str(e)))
 
         except Exception as e:
             messagebox.showerror("Error", str(e))
 
+    def row_saved(self, row, message):
+        self.tree.upsert_row(row)
+        self.clear_form()
+        messagebox.showinfo("Success", message)
+
+    def row_deleted(self, key, message):
+        self.tree.delete_row(key)
+        self.clear_form()
+        messagebox.showinfo("Success", message)
+
     def clear_form(self):
         self.patient_combobox.set('')
         self.doctor_combobox.set('')
         self.diagnosis_entry.delete(0, tk.END)
-        self.medication_entry.delete(0, tk.END)
+        self.medicine_combobox.set('')
+        self.quantity_entry.delete(0, tk.END)
+
+    def get_record(self):
+        # The form as a record for the prescription service, which checks it
+        return {'PatientID': self.patient_combobox.selected_id(), 'DoctorID': self.doctor_combobox.selected_id(),
+                'Diagnosis': self.diagnosis_entry.get(), 'MedicineID': self.medicine_combobox.selected_id(),
+                'Quantity': self.quantity_entry.get()}
 
 
 
@@ -1193,45 +1184,15 @@ class PrescriptionManager(tk.Frame):
 #####################
 
 class MedicineManager(tk.Frame):
-    def __init__(self, parent):
+    def __init__(self, parent, executor):
         super().__init__(parent)
+        self.executor = executor
         self.db = Database()
+        self.service = MedicineService(self.db)
         self.pack(fill=tk.BOTH, expand=True)
 
-        # Configure style for dark theme
-        self.style = ttk.Style()
-        self.style.theme_use('default')
+        # General background color
         self.configure(background='#38475c')
-        
-        # Widget style configurations
-        self.style.configure('TFrame', background='#38475c')
-        self.style.configure('TLabel', background='#38475c', foreground='white', font=('Times New Roman', 11))
-        self.style.configure('TButton',
-                            font=('Arial', 10, 'bold'),
-                            background='#1976D2',
-                            foreground='white',
-                            borderwidth=1,
-                            focuscolor='#2e2e2e')
-        self.style.map('TButton',
-                       background=[('active', '#2a4e64'), ('pressed', '#6a6a6a')],
-                       foreground=[('active', 'white')])
-        self.style.configure('Treeview',
-                            background='#38475c',
-                            foreground='white',
-                            fieldbackground='#38475c',
-                            borderwidth=0)
-        self.style.configure('Treeview.Heading',
-                            font=('Times New Roman', 13),
-                            padding=2,
-                            background='#232c39',
-                            foreground='white',
-                            relief='flat')
-        self.style.map('Treeview',
-                       background=[('selected', '#2d6355')],
-                       foreground=[('selected', 'white')])
-        self.style.configure('TEntry',
-                            fieldbackground='#e9e9e9',
-                            foreground='black')
 
         # Main container
         self.main_frame = ttk.Frame(self)
@@ -1241,13 +1202,19 @@ class MedicineManager(tk.Frame):
         tree_frame = ttk.Frame(self.main_frame)
         tree_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
+        # Shown while this screen's queries run in the background
+        self.loading = BusyIndicator(tree_frame)
+        self.loading.pack(side=tk.BOTTOM, fill=tk.X)
+
         # Form Frame
         form_frame = ttk.Frame(self.main_frame, width=300)
         form_frame.pack(side=tk.RIGHT, fill=tk.Y, padx=10)
 
         # Treeview
-        self.tree = ttk.Treeview(tree_frame, 
-                               columns=('ID', 'Name', 'Quantity', 'Price'), 
+        self.tree = VirtualTreeview(tree_frame,
+                               fetch_page=self.service.page,
+                               executor=executor, busy=self.loading,
+                               columns=('ID', 'Name', 'Quantity', 'Price'),
                                show='headings')
         self.tree.heading('ID', text='Medicine ID')
         self.tree.heading('Name', text='Name')
@@ -1257,6 +1224,9 @@ class MedicineManager(tk.Frame):
         self.tree.column('Name', width=150, anchor=tk.CENTER)
         self.tree.column('Quantity', width=100, anchor=tk.CENTER)
         self.tree.column('Price', width=100, anchor=tk.CENTER)
+        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.attach_scrollbar(scrollbar)
         self.tree.pack(fill=tk.BOTH, expand=True)
 
 
@@ -1282,19 +1252,35 @@ class MedicineManager(tk.Frame):
         ttk.Button(btn_frame, text="Delete", command=self.delete_medicine, width=14).grid(row=1, column=0, padx=5, pady=5)
         ttk.Button(btn_frame, text="Clear", command=self.clear_form, width=14).grid(row=1, column=1, padx=5, pady=5)
 
+        # Medicines at or below their reorder level
+        ttk.Label(form_frame, text="Low stock:", width=12).grid(row=4, column=0, sticky=tk.NW, pady=5, padx=5)
+        self.low_stock_list = tk.Listbox(form_frame, height=8, width=25, background='#e9e9e9', foreground='#b71c1c')
+        self.low_stock_list.grid(row=4, column=1, pady=5, padx=5)
+
         # Load initial data
         self.load_medicines()
+        self.load_low_stock()
         self.tree.bind('<<TreeviewSelect>>', self.load_selected_medicine)
 
+    @timed
     def load_medicines(self):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        self.tree.reset()
+
+    @timed
+    def load_low_stock(self):
+        self.executor.submit(self.service.low_stock, owner=self, on_done=self.show_low_stock)
 
-        medicines = self.db.fetch_medicines()
-        for medicine in medicines:
-            str_medicine = tuple(str(value) for value in medicine)  # Convert to strings!
-            self.tree.insert('', tk.END, values=str_medicine)
+    def show_low_stock(self, low):
+        self.low_stock_list.delete(0, tk.END)
+        for medicine_id, name, quantity, reorder_level in low:
+            self.low_stock_list.insert(tk.END, f"{name} ({medicine_id}): {quantity}")
 
+    @timed
+    def refresh(self):
+        self.tree.refresh()
+        self.load_low_stock()
+
+    @timed
     def load_selected_medicine(self, event):
         selected = self.tree.focus()
         if selected:
@@ -1314,26 +1300,11 @@ class MedicineManager(tk.Frame):
                 self.clear_form()
 
     def add_medicine(self):
-        try:
-            name = self.name_entry.get()
-            quantity = int(self.quantity_entry.get())  # Convert to int!
-            price = float(self.price_entry.get())  # Convert to float!
-
-            if not all([name, quantity >= 0, price >= 0]):
-                messagebox.showerror("Error", "All fields are required with valid values!")
-                return
-
-            self.db.execute_query(
-                "INSERT INTO Medicines (Name, Quantity, Price) VALUES (?, ?, ?)",
-                (name, quantity, price)
-            )
-            self.load_medicines()  # Reload Treeview
-            self.clear_form()
-            messagebox.showinfo("Success", "Medicine added successfully!")
-        except ValueError:
-            messagebox.showerror("Error", "Quantity must be an integer and Price must be a number!")
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        record = {'Name': self.name_entry.get(), 'Quantity': self.quantity_entry.get(),
+                  'Price': self.price_entry.get()}
+        self.executor.submit(self.service.create, record, owner=self, busy=self.loading,
+                             on_done=lambda row: self.row_saved(row, "Medicine added successfully!"),
+                             on_error=lambda e: messagebox.showerror("Error", str(e)))
 
     def update_medicine(self):
         selected = self.tree.focus()
@@ -1348,21 +1319,14 @@ class MedicineManager(tk.Frame):
                 return
 
             medicine_id = int(values[0])  # Convert to integer IMMEDIATELY
+            record = {'Name': self.name_entry.get(), 'Quantity': self.quantity_entry.get(),
+                      'Price': self.price_entry.get()}
 
-            name = self.name_entry.get()
-            quantity = int(self.quantity_entry.get())  # Convert to int!
-            price = float(self.price_entry.get())  # Convert to float!
-
-            self.db.execute_query(
-                "UPDATE Medicines SET Name=?, Quantity=?, Price=? WHERE MedicineID=?",
-                (name, quantity, price, medicine_id)
-            )
-            self.load_medicines()  # Reload Treeview
-            messagebox.showinfo("Success", "Medicine updated successfully!")
-            self.clear_form()
+            # Recorded in the stock ledger as a stock count
+            self.executor.submit(self.service.update, medicine_id, record, owner=self, busy=self.loading,
+                                 on_done=lambda row: self.row_saved(row, "Medicine updated successfully!"),
+                                 on_error=lambda e: messagebox.showerror("Error", str(e)))
 
-        except ValueError:
-            messagebox.showerror("Error", "Quantity must be an integer and Price must be a number!")
         except Exception as e:
             messagebox.showerror("Error", str(e))
 
@@ -1381,14 +1345,26 @@ class MedicineManager(tk.Frame):
             medicine_id = int(values[0])  # Convert to integer IMMEDIATELY
 
             if messagebox.askyesno("Confirm", "Are you sure you want to delete this medicine?"):
-                self.db.execute_query("DELETE FROM Medicines WHERE MedicineID=?", (medicine_id,))
-                self.load_medicines()  # Reload Treeview
-                self.clear_form()
-                messagebox.showinfo("Success", "Medicine deleted successfully!")
+                self.executor.submit(self.service.delete, medicine_id,
+                                     owner=self, busy=self.loading,
+                                     on_done=lambda _: self.row_deleted(medicine_id, "Medicine deleted successfully!"),
+                                     on_error=lambda e: messagebox.showerror("Error", str(e)))
 
         except Exception as e:
             messagebox.showerror("Error", str(e))
 
+    def row_saved(self, row, message):
+        self.tree.upsert_row(row)
+        self.clear_form()
+        self.load_low_stock()
+        messagebox.showinfo("Success", message)
+
+    def row_deleted(self, key, message):
+        self.tree.delete_row(key)
+        self.clear_form()
+        self.load_low_stock()
+        messagebox.showinfo("Success", message)
+
     def clear_form(self):
         self.name_entry.delete(0, tk.END)
         self.quantity_entry.delete(0, tk.END)
@@ -1405,48 +1381,15 @@ class MedicineManager(tk.Frame):
 ########################
 
 class BillManager(tk.Frame):
-    def __init__(self, parent):
+    def __init__(self, parent, executor):
         super().__init__(parent)
+        self.executor = executor
         self.db = Database()
+        self.service = BillService(self.db)
         self.pack(fill=tk.BOTH, expand=True)
 
-        # Configure style for dark theme
-        self.style = ttk.Style()
-        self.style.theme_use('default')
+        # General background color
         self.configure(background='#38475c')
-        
-        # Widget style configurations
-        self.style.configure('TFrame', background='#38475c')
-        self.style.configure('TLabel', background='#38475c', foreground='white', font=('Times New Roman', 11))
-        self.style.configure('TButton',
-                            font=('Arial', 10, 'bold'),
-                            background='#1976D2',
-                            foreground='white',
-                            borderwidth=1,
-                            focuscolor='#2e2e2e')
-        self.style.map('TButton',
-                       background=[('active', '#2a4e64'), ('pressed', '#6a6a6a')],
-                       foreground=[('active', 'white')])
-        self.style.configure('Treeview',
-                            background='#38475c',
-                            foreground='white',
-                            fieldbackground='#38475c',
-                            borderwidth=0)
-        self.style.configure('Treeview.Heading',
-                            font=('Times New Roman', 13),
-                            padding=2,
-                            background='#232c39',
-                            foreground='white',
-                            relief='flat')
-        self.style.map('Treeview',
-                       background=[('selected', '#2d6355')],
-                       foreground=[('selected', 'white')])
-        self.style.configure('TEntry',
-                            fieldbackground='#e9e9e9',
-                            foreground='black')
-        self.style.configure('TCombobox',
-                            fieldbackground='#e9e9e9',
-                            foreground='black')
 
         # Main container
         self.main_frame = ttk.Frame(self)
@@ -1456,13 +1399,19 @@ class BillManager(tk.Frame):
         tree_frame = ttk.Frame(self.main_frame)
         tree_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
+        # Shown while this screen's queries run in the background
+        self.loading = BusyIndicator(tree_frame)
+        self.loading.pack(side=tk.BOTTOM, fill=tk.X)
+
         # Form Frame
         form_frame = ttk.Frame(self.main_frame, width=300)
         form_frame.pack(side=tk.RIGHT, fill=tk.Y, padx=10)
 
         # Treeview
-        self.tree = ttk.Treeview(tree_frame, 
-                               columns=('ID', 'Patient', 'Amount', 'Date', 'Status'), 
+        self.tree = VirtualTreeview(tree_frame,
+                               fetch_page=self.service.page,
+                               executor=executor, busy=self.loading,
+                               columns=('ID', 'Patient', 'Amount', 'Date', 'Status'),
                                show='headings')
         self.tree.heading('ID', text='Bill ID')
         self.tree.heading('Patient', text='Patient')
@@ -1474,11 +1423,14 @@ class BillManager(tk.Frame):
         self.tree.column('Amount', width=100, anchor=tk.CENTER)
         self.tree.column('Date', width=100, anchor=tk.CENTER)
         self.tree.column('Status', width=100, anchor=tk.CENTER)
+        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.attach_scrollbar(scrollbar)
         self.tree.pack(fill=tk.BOTH, expand=True)
 
         # Form Fields
         ttk.Label(form_frame, text="Patient:", width=12).grid(row=0, column=0, sticky=tk.W, pady=5, padx=5)
-        self.patient_combobox = ttk.Combobox(form_frame, width=21)
+        self.patient_combobox = SearchCombobox(form_frame, search=self.db.search_patients, executor=executor, width=21)
         self.patient_combobox.grid(row=0, column=1, pady=5, padx=5)
 
         ttk.Label(form_frame, text="Amount:", width=12).grid(row=1, column=0, sticky=tk.W, pady=5, padx=5)
@@ -1503,26 +1455,28 @@ class BillManager(tk.Frame):
         ttk.Button(btn_frame, text="Update", command=self.update_bill, width=14).grid(row=0, column=1, padx=5, pady=5)
         ttk.Button(btn_frame, text="Delete", command=self.delete_bill, width=14).grid(row=1, column=0, padx=5, pady=5)
         ttk.Button(btn_frame, text="Clear", command=self.clear_form, width=14).grid(row=1, column=1, padx=5, pady=5)
+        ttk.Button(btn_frame, text="Generate", command=self.generate_bill, width=14).grid(row=2, column=0, columnspan=2, padx=5, pady=5)
 
         # Load initial data
         self.load_bills()
         self.load_patient_combobox()
         self.tree.bind('<<TreeviewSelect>>', self.load_selected_bill)
 
+    @timed
     def load_patient_combobox(self):
-        patients = self.db.fetch_patients()
-        self.patient_combobox['values'] = [f"{p[1]} ({p[0]})" for p in patients]  # Name (ID) format
+        self.patient_combobox.refresh()
 
 
+    @timed
     def load_bills(self):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        self.tree.reset()
 
-        bills = self.db.fetch_bills()
-        for bill in bills:
-            str_bill = tuple(str(value) for value in bill)  # Convert to strings!
-            self.tree.insert('', tk.END, values=str_bill)
+    @timed
+    def refresh(self):
+        self.tree.refresh()
+        self.load_patient_combobox()
 
+    @timed
     def load_selected_bill(self, event):
         selected = self.tree.focus()
         if selected:
@@ -1542,44 +1496,31 @@ class BillManager(tk.Frame):
                 self.clear_form()
 
     def add_bill(self):
-        try:
-            patient_str = self.patient_combobox.get()
-            if not patient_str:
-                messagebox.showerror("Error", "Please select a patient.")
-                return
-
-            try:
-                patient_id = int(patient_str.split('(')[1].split(')')[0])
-            except (IndexError, ValueError):
-                messagebox.showerror("Error", "Invalid patient selection.")
-                return
-
-            try:
-                amount = float(self.amount_entry.get())
-                if amount <= 0:
-                    raise ValueError("Amount must be positive.")
-            except ValueError as e:
-                messagebox.showerror("Error", f"Invalid amount: {e}")
-                return
+        self.executor.submit(self.service.create, self.get_record(), owner=self, busy=self.loading,
+                             on_done=lambda row: self.row_saved(row, "Bill added successfully!"),
+                             on_error=lambda e: messagebox.showerror("Error", f"Error adding bill: {e}"))
+
+    def generate_bill(self):
+        # Bill the selected patient's unbilled appointments and prescriptions up to the chosen date
+        patient_id = self.patient_combobox.selected_id()
+        if patient_id is None:
+            messagebox.showerror("Error", "Please select a patient.")
+            return
 
+        try:
             date = self.date_entry.get_date()
-            status = self.status_combobox.get()
-
-            if not all([date, status]):  # Check if date and status are empty
-                messagebox.showerror("Error", "Date and Status fields are required!")
-                return
-
+        except ValueError:
+            messagebox.showerror("Error", "Please enter a valid date.")
+            return
 
-            self.db.execute_query(
-                "INSERT INTO Bills (PatientID, Amount, BillDate, Status) VALUES (?, ?, ?, ?)",
-                (patient_id, amount, date, status)
-            )
-            self.load_bills()
-            self.clear_form()
-            messagebox.showinfo("Success", "Bill added successfully!")
+        def done(row):
+            if row:
+                self.row_saved(row, "Bill generated successfully!")
+            else:
+                messagebox.showinfo("Info", "Nothing to bill for this patient.")
 
-        except Exception as e:
-            messagebox.showerror("Error", f"Error adding bill: {e}")
+        self.executor.submit(self.service.generate, patient_id, date, owner=self, busy=self.loading, on_done=done,
+                             on_error=lambda e: messagebox.showerror("Error", f"Error generating bill: {e}"))
 
     def update_bill(self):
         selected = self.tree.focus()
@@ -1595,39 +1536,9 @@ class BillManager(tk.Frame):
 
             bill_id = int(values[0])
 
-            patient_str = self.patient_combobox.get()
-            if not patient_str:
-                messagebox.showerror("Error", "Please select a patient.")
-                return
-
-            try:
-                patient_id = int(patient_str.split('(')[1].split(')')[0])
-            except (IndexError, ValueError):
-                messagebox.showerror("Error", "Invalid patient selection.")
-                return
-
-            try:
-                amount = float(self.amount_entry.get())
-                if amount <= 0:
-                    raise ValueError("Amount must be positive.")
-            except ValueError as e:
-                messagebox.showerror("Error", f"Invalid amount: {e}")
-                return
-
-            date = self.date_entry.get_date()
-            status = self.status_combobox.get()
-
-            if not all([date, status]):  # Check if date and status are empty
-                messagebox.showerror("Error", "Date and Status fields are required!")
-                return
-
-            self.db.execute_query(
-                "UPDATE Bills SET PatientID=?, Amount=?, BillDate=?, Status=? WHERE BillID=?",
-                (patient_id, amount, date, status, bill_id)
-            )
-            self.load_bills()
-            self.clear_form()
-            messagebox.showinfo("Success", "Bill updated successfully!")
+            self.executor.submit(self.service.update, bill_id, self.get_record(), owner=self, busy=self.loading,
+                                 on_done=lambda row: self.row_saved(row, "Bill updated successfully!"),
+                                 on_error=lambda e: messagebox.showerror("Error", f"Error updating bill: {e}"))
 
         except Exception as e:
             messagebox.showerror("Error", f"Error updating bill: {e}")
@@ -1647,23 +1558,288 @@ class BillManager(tk.Frame):
             bill_id = int(values[0])  # Convert to integer IMMEDIATELY
 
             if messagebox.askyesno("Confirm", "Are you sure you want to delete this bill?"):
-                self.db.execute_query("DELETE FROM Bills WHERE BillID=?", (bill_id,))
-                self.load_bills()  # Reload Treeview
-                self.clear_form()
-                messagebox.showinfo("Success", "Bill deleted successfully!")
+                self.executor.submit(self.service.delete, bill_id,
+                                     owner=self, busy=self.loading,
+                                     on_done=lambda _: self.row_deleted(bill_id, "Bill deleted successfully!"),
+                                     on_error=lambda e: messagebox.showerror("Error", str(e)))
 
         except Exception as e:
             messagebox.showerror("Error", str(e))
 
+    def row_saved(self, row, message):
+        self.tree.upsert_row(row)
+        self.clear_form()
+        messagebox.showinfo("Success", message)
+
+    def row_deleted(self, key, message):
+        self.tree.delete_row(key)
+        self.clear_form()
+        messagebox.showinfo("Success", message)
+
     def clear_form(self):
         self.patient_combobox.set('')
         self.amount_entry.delete(0, tk.END)
         self.date_entry.set_date(None)
         self.status_combobox.set('Pending')
 
+    def get_record(self):
+        # The form as a record for the bill service, which checks it
+        try:
+            date = self.date_entry.get_date()
+        except ValueError:
+            date = None
+        return {'PatientID': self.patient_combobox.selected_id(), 'Amount': self.amount_entry.get(),
+                'BillDate': date, 'Status': self.status_combobox.get()}
+
+
+
+class HistoryManager(tk.Frame):
+    # A patient's appointments, prescriptions and bills in one timeline,
+    # newest first; older pages are fetched as the list is scrolled to the end
+    def __init__(self, parent, executor):
+        super().__init__(parent)
+        self.executor = executor
+        self.db = Database()
+        self.service = PatientService(self.db)
+        self.patient_id = None
+        self.tree_rows = {}         # iid -> history row, for the cursor of the next page
+        self.more = False           # the last page was full, so there may be older events
+        self.fetching = False
+        self.generation = 0         # bumped on every reload; late pages of an older one are dropped
+        self.pack(fill=tk.BOTH, expand=True)
+
+        # General background color
+        self.configure(background='#38475c')
+
+        # Main container
+        self.main_frame = ttk.Frame(self)
+        self.main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        # Treeview Frame
+        tree_frame = ttk.Frame(self.main_frame)
+        tree_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        # Shown while this screen's queries run in the background
+        self.loading = BusyIndicator(tree_frame)
+        self.loading.pack(side=tk.BOTTOM, fill=tk.X)
+
+        # Form Frame
+        form_frame = ttk.Frame(self.main_frame, width=300)
+        form_frame.pack(side=tk.RIGHT, fill=tk.Y, padx=10)
+
+        # Treeview
+        self.tree = ttk.Treeview(tree_frame, columns=('Date', 'Time', 'Type', 'Doctor', 'Details'), show='headings')
+        self.tree.heading('Date', text='Date')
+        self.tree.heading('Time', text='Time')
+        self.tree.heading('Type', text='Type')
+        self.tree.heading('Doctor', text='Doctor')
+        self.tree.heading('Details', text='Details')
+        self.tree.column('Date', width=100, anchor=tk.CENTER)
+        self.tree.column('Time', width=60, anchor=tk.CENTER)
+        self.tree.column('Type', width=100, anchor=tk.CENTER)
+        self.tree.column('Doctor', width=150, anchor=tk.CENTER)
+        self.tree.column('Details', width=300, anchor=tk.W)
+        self.scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.configure(yscrollcommand=self.on_scroll)
+        self.tree.pack(fill=tk.BOTH, expand=True)
+
+        # Form Fields
+        ttk.Label(form_frame, text="Patient:", width=12).grid(row=0, column=0, sticky=tk.W, pady=5, padx=5)
+        self.patient_combobox = SearchCombobox(form_frame, search=self.db.search_patients, executor=executor, width=21)
+        self.patient_combobox.grid(row=0, column=1, pady=5, padx=5)
+        self.patient_combobox.bind('<<ComboboxSelected>>', lambda event: self.show_history())
 
+        ttk.Button(form_frame, text="Show History", command=self.show_history, width=30).grid(
+            row=1, column=0, columnspan=2, pady=10)
 
+        self.summary_label = ttk.Label(form_frame, text="")
+        self.summary_label.grid(row=2, column=0, columnspan=2, sticky=tk.W, pady=5, padx=5)
+
+        # Load initial data
+        self.load_patient_combobox()
+
+    @timed
+    def load_patient_combobox(self):
+        self.patient_combobox.refresh()
+
+    @timed
+    def refresh(self):
+        # Pages come from the history cache unless the patient's records changed
+        self.load_patient_combobox()
+        if self.patient_id is not None:
+            self.load_history(self.patient_id)
+
+    def show_history(self):
+        patient_id = self.patient_combobox.selected_id()
+        if patient_id is None:
+            messagebox.showerror("Error", "Please select a patient.")
+            return
+        self.load_history(patient_id)
+
+    @timed
+    def load_history(self, patient_id):
+        self.patient_id = patient_id
+        self.generation += 1
+        self.tree.delete(*self.tree.get_children())
+        self.tree_rows = {}
+        self.more = False
+        self.fetch_page(None)
+
+    def load_older(self):
+        children = self.tree.get_children()
+        if children and self.more and not self.fetching:
+            self.fetch_page(history_cursor(self.tree_rows[children[-1]]))
+
+    def fetch_page(self, before):
+        generation = self.generation
+        self.fetching = True
+        self.executor.submit(self.service.history, self.patient_id, before, owner=self, busy=self.loading,
+                             on_done=lambda rows: self.page_loaded(generation, rows),
+                             on_error=lambda error: self.page_failed(generation, error))
+
+    def page_loaded(self, generation, rows):
+        if generation != self.generation:
+            return      # reloaded (or another patient chosen) meanwhile
+        self.fetching = False
+        for row in rows:
+            iid = f"{row[1]}-{row[2]}"
+            self.tree_rows[iid] = row
+            time = str(row[3])[:5] if row[3] is not None else ''
+            self.tree.insert('', tk.END, iid=iid, values=(row[0], time, row[1], row[4] or '', describe(row)))
+        self.more = len(rows) >= HISTORY_PAGE
+        shown = len(self.tree_rows)
+        self.summary_label.config(text=f"{shown}{'+' if self.more else ''} events")
+
+    def page_failed(self, generation, error):
+        if generation != self.generation:
+            return      # a page for an earlier load: this one is still fetching
+        self.fetching = False
+        messagebox.showerror("Error", f"Error loading history: {error}")
+
+    def on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        # Scrolled to the end (or everything fits): fetch the next older page
+        if float(last) >= 1.0:
+            self.load_older()
+
+
+
+
+
+class DashboardManager(tk.Frame):
+    # Today's appointments per doctor, pending bills, recent revenue and low
+    # stock. Read from the aggregate tables, so it is refreshed every
+    # DASHBOARD_REFRESH seconds while shown at the cost of a few key lookups.
+    def __init__(self, parent, executor):
+        super().__init__(parent)
+        self.executor = executor
+        self.db = Database()
+        self.service = DashboardService(self.db)
+        self.fetching = False
+        self._pending = None
+        self.pack(fill=tk.BOTH, expand=True)
 
+        # General background color
+        self.configure(background='#38475c')
+
+        # Main container
+        self.main_frame = ttk.Frame(self)
+        self.main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        # Treeview Frame
+        tree_frame = ttk.Frame(self.main_frame)
+        tree_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        # Shown while this screen's queries run in the background
+        self.loading = BusyIndicator(tree_frame)
+        self.loading.pack(side=tk.BOTTOM, fill=tk.X)
+
+        # Form Frame
+        form_frame = ttk.Frame(self.main_frame, width=300)
+        form_frame.pack(side=tk.RIGHT, fill=tk.Y, padx=10)
+
+        # Appointments today, busiest doctor first
+        self.appointments_label = ttk.Label(tree_frame, text="Appointments today")
+        self.appointments_label.pack(anchor=tk.W)
+        self.appointment_tree = ttk.Treeview(tree_frame, columns=('Doctor', 'Appointments'), show='headings', height=8)
+        self.appointment_tree.heading('Doctor', text='Doctor')
+        self.appointment_tree.heading('Appointments', text='Appointments')
+        self.appointment_tree.column('Doctor', width=250, anchor=tk.W)
+        self.appointment_tree.column('Appointments', width=120, anchor=tk.CENTER)
+        self.appointment_tree.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
+
+        # Revenue by day, newest first
+        ttk.Label(tree_frame, text="Revenue by day").pack(anchor=tk.W)
+        self.revenue_tree = ttk.Treeview(tree_frame, columns=('Date', 'Bills', 'Billed', 'Resolved'),
+                                         show='headings', height=8)
+        self.revenue_tree.heading('Date', text='Date')
+        self.revenue_tree.heading('Bills', text='Bills')
+        self.revenue_tree.heading('Billed', text='Billed')
+        self.revenue_tree.heading('Resolved', text='Resolved')
+        self.revenue_tree.column('Date', width=100, anchor=tk.CENTER)
+        self.revenue_tree.column('Bills', width=70, anchor=tk.CENTER)
+        self.revenue_tree.column('Billed', width=120, anchor=tk.E)
+        self.revenue_tree.column('Resolved', width=120, anchor=tk.E)
+        self.revenue_tree.pack(fill=tk.BOTH, expand=True)
+
+        # Form Fields
+        ttk.Label(form_frame, text="Pending bills:", width=14).grid(row=0, column=0, sticky=tk.W, pady=5, padx=5)
+        self.pending_label = ttk.Label(form_frame, text="")
+        self.pending_label.grid(row=0, column=1, sticky=tk.W, pady=5, padx=5)
+
+        ttk.Label(form_frame, text="Low stock:", width=14).grid(row=1, column=0, sticky=tk.NW, pady=5, padx=5)
+        self.low_stock_list = tk.Listbox(form_frame, height=10, width=25, background='#e9e9e9', foreground='#b71c1c')
+        self.low_stock_list.grid(row=1, column=1, pady=5, padx=5)
+
+        ttk.Button(form_frame, text="Refresh", command=self.refresh, width=30).grid(
+            row=2, column=0, columnspan=2, pady=10)
+
+        self.updated_label = ttk.Label(form_frame, text="")
+        self.updated_label.grid(row=3, column=0, columnspan=2, sticky=tk.W, pady=5, padx=5)
+
+        # Load initial data
+        self.refresh()
+        self._pending = self.after(DASHBOARD_REFRESH * 1000, self.poll)
+
+    def destroy(self):
+        if self._pending is not None:
+            self.after_cancel(self._pending)
+        super().destroy()
+
+    def poll(self):
+        # Only the screen on display keeps polling; a cached one is refreshed when shown again
+        if self.winfo_ismapped():
+            self.refresh()
+        self._pending = self.after(DASHBOARD_REFRESH * 1000, self.poll)
+
+    @timed
+    def refresh(self):
+        if self.fetching:
+            return
+        self.fetching = True
+        self.executor.submit(self.service.summary, owner=self, busy=self.loading,
+                             on_done=self.show_summary, on_error=self.summary_failed)
+
+    def show_summary(self, summary):
+        self.fetching = False
+        self.appointments_label.config(text=f"Appointments today ({summary['Date']})")
+        self.appointment_tree.delete(*self.appointment_tree.get_children())
+        for row in summary['AppointmentsToday']:
+            self.appointment_tree.insert('', tk.END, values=(row['Doctor'], row['Appointments']))
+        self.revenue_tree.delete(*self.revenue_tree.get_children())
+        for row in reversed(summary['Revenue']):
+            self.revenue_tree.insert('', tk.END, values=(row['Date'], row['Bills'], row['Billed'], row['Resolved']))
+        pending = summary['Pending']
+        self.pending_label.config(text=f"{pending['Bills']} totalling {pending['Amount']}")
+        self.low_stock_list.delete(0, tk.END)
+        for row in summary['LowStock']:
+            self.low_stock_list.insert(tk.END, f"{row['Name']} ({row['MedicineID']}): {row['Quantity']}")
+        self.updated_label.config(text=f"Updated {datetime.datetime.now():%H:%M:%S}")
+
+    def summary_failed(self, error):
+        self.fetching = False
+        messagebox.showerror("Error", f"Error loading dashboard: {error}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,237 @@
+import argparse
+import cProfile
+import json
+import logging
+import os
+import pstats
+import sys
+import time
+from functools import wraps
+
+
+# Optional profiling mode for the Tk front end. With HMS_PROFILE_DIR set,
+# HospitalManagementSystem measures how late a periodic `after` heartbeat
+# fires (event-loop lag), times each manager's construction and its load_*
+# methods, and writes a cProfile dump per screen switch covering everything
+# the Tk thread did until that screen's queries were displayed. Open the
+# dumps with pstats, snakeviz or flameprof. Unattended run for CI:
+#   xvfb-run python -m ui_profiler --output profiles --rounds 3
+
+PROFILE_DIR = os.environ.get('HMS_PROFILE_DIR')
+HEARTBEAT_MS = 50         # event-loop lag sampling period
+SETTLE_POLL_MS = 20       # how often to check whether a new screen's queries are done
+TOP_FUNCTIONS = 15        # functions listed per switch in the report, by own time
+SCREENS = ('patients', 'doctors', 'appointments', 'prescriptions', 'medicines', 'bills', 'history', 'dashboard')
+
+log = logging.getLogger('hms.ui_profiler')
+
+_active = None            # the installed UiProfiler, if any
+
+
+def timed(method):
+    # Records the duration of a manager method (load_*) in the active profiler;
+    # a plain call when profiling is off
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        profiler = _active
+        if profiler is None:
+            return method(self, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            profiler.record_call(f"{type(self).__name__}.{method.__name__}", time.perf_counter() - started)
+    return wrapper
+
+
+def _percentiles(values):
+    if not values:
+        return {'samples': 0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0}
+    ordered = sorted(values)
+    pick = lambda fraction: ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+    return {'samples': len(ordered), 'p50_ms': round(pick(0.5) * 1000, 2),
+            'p95_ms': round(pick(0.95) * 1000, 2), 'max_ms': round(ordered[-1] * 1000, 2)}
+
+
+##########################
+# EVENT LOOP MONITOR
+##########################
+
+class EventLoopMonitor:
+    # A heartbeat scheduled every `interval_ms`; how late it fires is how long
+    # the event loop was busy with something else (a callback, a redraw, ...)
+
+    def __init__(self, root, interval_ms=HEARTBEAT_MS):
+        self.root = root
+        self.interval = interval_ms / 1000
+        self.lags = []
+        self._expected = None
+        self._after_id = None
+
+    def start(self):
+        self._expected = time.perf_counter() + self.interval
+        self._after_id = self.root.after(int(self.interval * 1000), self._beat)
+
+    def stop(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def mark(self):
+        # Position to pass to stats() for the lag from here on
+        return len(self.lags)
+
+    def stats(self, since=0):
+        return _percentiles(self.lags[since:])
+
+    def _beat(self):
+        now = time.perf_counter()
+        self.lags.append(max(0.0, now - self._expected))
+        self._expected = now + self.interval
+        self._after_id = self.root.after(int(self.interval * 1000), self._beat)
+
+
+##########################
+# UI PROFILER
+##########################
+
+class UiProfiler:
+    def __init__(self, root, executor, output_dir, heartbeat_ms=HEARTBEAT_MS):
+        self.root = root
+        self.executor = executor
+        self.output_dir = output_dir
+        self.monitor = EventLoopMonitor(root, heartbeat_ms)
+        self.switches = []          # one report dict per screen switch
+        self._current = None        # [report, profile, started, manager] until the screen settles
+        self._poll_id = None
+        self._listeners = []
+
+    def install(self):
+        global _active
+        os.makedirs(self.output_dir, exist_ok=True)
+        _active = self
+        self.monitor.start()
+
+    def uninstall(self):
+        global _active
+        self._finish(settled=False)
+        self.monitor.stop()
+        if _active is self:
+            _active = None
+
+    def subscribe(self, listener):
+        # listener(switch report) once a screen has settled (or was left before it did)
+        self._listeners.append(listener)
+
+    def switch(self, screen, build):
+        # Profile building a screen and everything the Tk thread does for it
+        # until its queries are delivered; returns what build() returned
+        self._finish(settled=False)
+        report = {'seq': len(self.switches) + 1, 'screen': screen, 'calls': [], 'lag_from': self.monitor.mark()}
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        self._current = [report, profile, started, None]
+        profile.enable()
+        manager = self._current[3] = build()
+        report['construct_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        self._poll_id = self.root.after(SETTLE_POLL_MS, self._check_settled)
+        return manager
+
+    def record_call(self, name, seconds):
+        if self._current is not None:
+            self._current[0]['calls'].append((name, round(seconds * 1000, 2)))
+
+    def report(self):
+        return {'heartbeat_ms': round(self.monitor.interval * 1000), 'event_loop': self.monitor.stats(),
+                'switches': self.switches}
+
+    def write_report(self, path=None):
+        path = path or os.path.join(self.output_dir, 'report.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2)
+        return path
+
+    def _check_settled(self):
+        self._poll_id = None
+        if self._current is None:
+            return
+        if self.executor.pending(self._current[3]):
+            self._poll_id = self.root.after(SETTLE_POLL_MS, self._check_settled)
+        else:
+            self._finish(settled=True)
+
+    def _finish(self, settled):
+        if self._current is None:
+            return
+        report, profile, started, _ = self._current
+        self._current = None
+        profile.disable()
+        if self._poll_id is not None:
+            self.root.after_cancel(self._poll_id)
+            self._poll_id = None
+        report['settled'] = settled
+        report['settle_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        report['event_loop'] = self.monitor.stats(report.pop('lag_from'))
+        path = os.path.join(self.output_dir, f"{report['seq']:03d}-{report['screen']}.pstats")
+        profile.dump_stats(path)
+        report['profile'] = path
+        report['top'] = self._top_functions(profile)
+        self.switches.append(report)
+        log.info("%s: built in %.1f ms, settled in %.1f ms, event loop p95 lag %.1f ms", report['screen'],
+                 report['construct_ms'], report['settle_ms'], report['event_loop']['p95_ms'])
+        for listener in list(self._listeners):
+            listener(report)
+
+    @staticmethod
+    def _top_functions(profile):
+        stats = pstats.Stats(profile).stats   # (file, line, function) -> (calls, ncalls, own, cumulative, callers)
+        rows = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:TOP_FUNCTIONS]
+        return [{'function': f"{os.path.basename(file)}:{line}({name})", 'calls': ncalls,
+                 'own_ms': round(own * 1000, 2), 'cumulative_ms': round(cumulative * 1000, 2)}
+                for (file, line, name), (_, ncalls, own, cumulative, _) in rows]
+
+
+##########################
+# HEADLESS RUN
+##########################
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Switch through the screens and profile each switch.")
+    parser.add_argument('--output', default=PROFILE_DIR or 'profiles', help="directory for the dumps and report.json")
+    parser.add_argument('--rounds', type=int, default=1, help="times to go through the screens")
+    parser.add_argument('--screens', nargs='+', choices=SCREENS, default=list(SCREENS))
+    parser.add_argument('--idle-ms', type=int, default=200, help="pause between a screen settling and the next switch")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    import tkinter as tk
+    from tkinter import messagebox
+    from tkinter_main import HospitalManagementSystem
+
+    # Nobody is there to close dialogs: log them instead
+    for name in ('showerror', 'showwarning', 'showinfo'):
+        setattr(messagebox, name, lambda title=None, message=None, **options: log.warning("%s: %s", title, message))
+
+    root = tk.Tk()
+    root.geometry("1350x600")
+    app = HospitalManagementSystem(root, profile_dir=args.output)
+    plan = [screen for _ in range(args.rounds) for screen in args.screens]
+
+    def next_screen(report=None):
+        if not plan:
+            path = app.profiler.write_report()
+            app.profiler.uninstall()
+            log.info("Report written to %s", path)
+            root.destroy()
+            return
+        screen = plan.pop(0)
+        root.after(args.idle_ms, getattr(app, f'show_{screen}'))
+
+    app.profiler.subscribe(next_screen)
+    root.after(args.idle_ms, next_screen)
+    root.mainloop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
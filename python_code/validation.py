@@ -0,0 +1,134 @@
+import datetime
+import re
+from decimal import Decimal, InvalidOperation
+
+from scheduling import APPOINTMENT_MINUTES, to_minutes
+
+ATTENDANCE = ('Attended', 'NoShow')
+
+
+# Input rules shared by the screens (through services), the HTTP API and bulk
+# import. Each parser takes one record keyed by schema column names (any case,
+# e.g. {'Name': ..., 'Age': ...}) and returns the INSERT / UPDATE parameters,
+# or raises ValueError with the message the user should see.
+
+def normalize(record):
+    return {str(key).lower(): value for key, value in record.items()}
+
+
+def _required(record, column):
+    value = record.get(column.lower())
+    value = '' if value is None else str(value).strip()
+    if not value:
+        raise ValueError(f"{column} is required")
+    return value
+
+
+def _integer(record, column, message):
+    value = _required(record, column)
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(message)
+
+
+def _amount(record, column, message):
+    value = _required(record, column)
+    try:
+        value = Decimal(value)
+    except InvalidOperation:
+        raise ValueError(message)
+    if not value.is_finite():
+        raise ValueError(message)
+    return value
+
+
+def _date(record, column):
+    value = _required(record, column)
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{column} must be a YYYY-MM-DD date")
+
+
+def parse_patient(record):
+    name = _required(record, 'Name')
+    age = _integer(record, 'Age', "Age must be a number!")
+    if age < 0:
+        raise ValueError("Age must be a number!")
+    return name, age, _required(record, 'Gender'), _required(record, 'Contact')
+
+
+def parse_doctor(record):
+    return _required(record, 'Name'), _required(record, 'Specialization'), _required(record, 'Contact')
+
+
+def parse_medicine(record):
+    name = _required(record, 'Name')
+    quantity = _integer(record, 'Quantity', "Quantity must be an integer and Price must be a number!")
+    price = _amount(record, 'Price', "Quantity must be an integer and Price must be a number!")
+    if quantity < 0 or price < 0:
+        raise ValueError("All fields are required with valid values!")
+    return name, quantity, price
+
+
+def parse_bill(record):
+    patient_id = _integer(record, 'PatientID', "Invalid patient selection.")
+    amount = _amount(record, 'Amount', "Invalid amount")
+    if amount <= 0:
+        raise ValueError("Invalid amount: Amount must be positive.")
+    return patient_id, amount, _date(record, 'BillDate'), _required(record, 'Status')
+
+
+def parse_appointment(record):
+    patient_id = _integer(record, 'PatientID', "Invalid patient selection.")
+    doctor_id = _integer(record, 'DoctorID', "Invalid doctor selection.")
+    date = _date(record, 'AppointmentDate')
+    text = _required(record, 'AppointmentTime')
+    if not re.match(r'^\d{2}:\d{2}$', text):
+        raise ValueError("Time must be in HH:MM format!")
+    try:
+        return patient_id, doctor_id, date, datetime.time.fromisoformat(text)
+    except ValueError:
+        raise ValueError("Time must be in HH:MM format!")
+
+
+def parse_attendance(record):
+    attendance = _required(record, 'Attendance')
+    if attendance not in ATTENDANCE:
+        raise ValueError(f"Attendance must be one of: {', '.join(ATTENDANCE)}")
+    return attendance
+
+
+def parse_duration(record, start=None):
+    # DurationMinutes is optional and defaults to one standard slot. With the
+    # start time, also refuse a slot that ends after midnight (schedules are per day)
+    duration = APPOINTMENT_MINUTES
+    if str(record.get('durationminutes') or '').strip():
+        duration = _integer(record, 'DurationMinutes', "Minutes must be a positive number!")
+    if duration <= 0:
+        raise ValueError("Minutes must be a positive number!")
+    if start is not None and to_minutes(start) + duration > 24 * 60:
+        raise ValueError("An appointment must end by midnight.")
+    return duration
+
+
+def parse_prescription(record):
+    # (patient_id, doctor_id, diagnosis, medicine_id, quantity); Quantity defaults to 1
+    patient_id = _integer(record, 'PatientID', "Invalid patient or doctor selection.")
+    doctor_id = _integer(record, 'DoctorID', "Invalid patient or doctor selection.")
+    diagnosis = _required(record, 'Diagnosis')
+    medicine_id = _integer(record, 'MedicineID', "Please select a medicine from the list.")
+    quantity = 1
+    if str(record.get('quantity') or '').strip():
+        quantity = _integer(record, 'Quantity', "Quantity must be a positive whole number.")
+    if quantity <= 0:
+        raise ValueError("Quantity must be a positive whole number.")
+    return patient_id, doctor_id, diagnosis, medicine_id, quantity
+
+
+def parse_restock(record):
+    quantity = _integer(record, 'Quantity', "Quantity must be a positive whole number.")
+    if quantity <= 0:
+        raise ValueError("Quantity must be a positive whole number.")
+    return quantity, str(record.get('reason') or 'Delivery').strip()[:50]
@@ -0,0 +1,368 @@
+import bisect
+import re
+import tkinter as tk
+from collections import OrderedDict
+from tkinter import ttk
+
+
+##########################
+# VIRTUAL TREEVIEW
+##########################
+
+class VirtualTreeview(ttk.Treeview):
+    # Treeview that only holds a window of rows. Pages are fetched with
+    # fetch_page(after=key) / fetch_page(before=key) as the user scrolls near
+    # either edge, and pages far from the view are dropped again.
+    # Rows use their integer primary key (row[0]) as the item iid.
+
+    def __init__(self, master, fetch_page, format_row=None, page_size=100,
+                 window_pages=5, prefetch=0.2, executor=None, busy=None, **kwargs):
+        super().__init__(master, **kwargs)
+        self.fetch_page = fetch_page
+        self.executor = executor
+        self.busy = busy
+        self.format_row = format_row or (lambda row: tuple(str(value) for value in row))
+        self.page_size = page_size
+        self.window_pages = window_pages
+        self.prefetch = prefetch
+        self.scrollbar = None
+
+        self._first_key = None
+        self._last_key = None
+        self._at_start = True
+        self._at_end = True
+        self._pending = None
+        self.fixed = False      # showing a list from show_rows() instead of pages
+
+        self.configure(yscrollcommand=self._on_scroll)
+
+    def attach_scrollbar(self, scrollbar):
+        self.scrollbar = scrollbar
+        scrollbar.configure(command=self.yview)
+
+    def reset(self):
+        # Drop everything and show the first page; cost is one page whatever the table size
+        self._cancel_pending()
+        self.delete(*self.get_children())
+        self.fixed = False
+        self._first_key = self._last_key = None
+        self._at_start = True
+        self._at_end = False
+        self._load_next()
+
+    def show_rows(self, rows):
+        # Show a fixed list in its own order (e.g. ranked search results)
+        # instead of pages; reset() goes back to paging
+        self._cancel_pending()
+        self.delete(*self.get_children())
+        self.fixed = True
+        self._first_key = self._last_key = None
+        self._at_start = self._at_end = True
+        self._insert_rows(rows, tk.END)
+
+    def _cancel_pending(self):
+        if self.executor is not None:
+            self.executor.cancel(self)
+        if isinstance(self._pending, str):
+            self.after_cancel(self._pending)  # a scroll-triggered load not yet started
+        self._pending = None
+
+    def refresh(self):
+        # Bring the loaded window up to date without rebuilding it: one query
+        # for the key range already shown; changed rows are patched in place,
+        # rows deleted elsewhere are removed, and the scroll position is kept
+        if self.fixed:
+            return      # the owner of a fixed list re-runs its own query
+        if self._first_key is None:
+            self.reset()
+            return
+        self._cancel_pending()
+        limit = len(self.get_children()) + self.page_size
+        after = None if self._at_start else self._first_key - 1
+        if self.executor is None:
+            self._refreshed(self.fetch_page(limit=limit, after=after), limit)
+        else:
+            self._pending = self.executor.submit(self.fetch_page, limit=limit, after=after, owner=self,
+                                                 busy=self.busy, on_done=lambda rows: self._refreshed(rows, limit))
+
+    def _refreshed(self, rows, limit):
+        self._pending = None
+        if len(rows) < limit:
+            upper = None if self._at_end else self._last_key
+        else:
+            # More rows than fit: what lies past the last one fetched is paged in again on scroll
+            upper = min(rows[-1][0], self._last_key)
+            self._at_end = False
+        if upper is not None:
+            rows = [row for row in rows if row[0] <= upper]
+        if not rows:
+            self.reset()
+            return
+        fresh = {str(row[0]) for row in rows}
+        self.delete(*[iid for iid in self.get_children() if iid not in fresh])
+        for index, row in enumerate(rows):
+            iid = str(row[0])
+            values = self.format_row(row)
+            if not self.exists(iid):
+                self.insert('', index, iid=iid, values=values)
+            elif tuple(map(str, self.item(iid, 'values'))) != tuple(map(str, values)):
+                self.item(iid, values=values)
+        self._first_key = rows[0][0]
+        self._last_key = rows[-1][0]
+
+    def upsert_row(self, row):
+        # Patch a single row after a write instead of reloading the table
+        if row is None:
+            return
+        iid = str(row[0])
+        if self.exists(iid):
+            self.item(iid, values=self.format_row(row))
+            return
+        if self.fixed:
+            self.insert('', 0, iid=iid, values=self.format_row(row))
+            return
+        key = row[0]
+        if self._last_key is not None and key > self._last_key and not self._at_end:
+            return  # beyond the loaded window, it will be paged in later
+        if self._first_key is not None and key < self._first_key and not self._at_start:
+            return
+        keys = [int(child) for child in self.get_children()]
+        self.insert('', bisect.bisect(keys, key), iid=iid, values=self.format_row(row))
+        if self._first_key is None or key < self._first_key:
+            self._first_key = key
+        if self._last_key is None or key > self._last_key:
+            self._last_key = key
+
+    def delete_row(self, key):
+        iid = str(key)
+        if self.exists(iid):
+            self.delete(iid)
+
+    def _insert_rows(self, rows, index):
+        for offset, row in enumerate(rows):
+            iid = str(row[0])
+            if self.exists(iid):
+                # Already added by upsert_row while this page was loading
+                self.item(iid, values=self.format_row(row))
+                continue
+            self.insert('', index if index == tk.END else index + offset,
+                        iid=iid, values=self.format_row(row))
+
+    def _on_scroll(self, first, last):
+        if self.scrollbar is not None:
+            self.scrollbar.set(first, last)
+        if self._pending is not None:
+            return
+        if float(last) >= 1 - self.prefetch and not self._at_end:
+            self._pending = self.after_idle(self._load_next)
+        elif float(first) <= self.prefetch and not self._at_start:
+            self._pending = self.after_idle(self._load_previous)
+
+    def _request(self, on_done, **page):
+        # Fetch on the executor's worker threads when there is one
+        if self.executor is None:
+            self._pending = None
+            on_done(self.fetch_page(limit=self.page_size, **page))
+        else:
+            self._pending = self.executor.submit(self.fetch_page, limit=self.page_size, owner=self,
+                                                 busy=self.busy, on_done=on_done, **page)
+
+    def _load_next(self):
+        self._request(self._next_loaded, after=self._last_key)
+
+    def _load_previous(self):
+        self._request(self._previous_loaded, before=self._first_key)
+
+    def _next_loaded(self, rows):
+        self._pending = None
+        if len(rows) < self.page_size:
+            self._at_end = True
+        if not rows:
+            return
+        self._insert_rows(rows, tk.END)
+        self._last_key = rows[-1][0]
+        if self._first_key is None:
+            self._first_key = rows[0][0]
+        self._trim(from_top=True)
+
+    def _previous_loaded(self, rows):
+        self._pending = None
+        if len(rows) < self.page_size:
+            self._at_start = True
+        if not rows:
+            return
+        top = self._top_index()
+        self._insert_rows(rows, 0)
+        self._first_key = rows[0][0]
+        self._trim(from_top=False)
+        self._scroll_to_index(top + len(rows))
+
+    def _trim(self, from_top):
+        children = self.get_children()
+        excess = len(children) - self.window_pages * self.page_size
+        if excess <= 0:
+            return
+        if from_top:
+            top = self._top_index()
+            self.delete(*children[:excess])
+            self._first_key = int(children[excess])
+            self._at_start = False
+            self._scroll_to_index(max(top - excess, 0))
+        else:
+            self.delete(*children[-excess:])
+            self._last_key = int(children[-excess - 1])
+            self._at_end = False
+
+    def _top_index(self):
+        children = self.get_children()
+        return round(float(self.yview()[0]) * len(children)) if children else 0
+
+    def _scroll_to_index(self, index):
+        children = self.get_children()
+        if children:
+            self.yview_moveto(index / len(children))
+
+
+##########################
+# VIEW CACHE
+##########################
+
+VIEW_CACHE_SIZE = 4     # screens kept alive; the least recently shown one past this is destroyed
+
+
+class ViewCache:
+    # Screens built once and hidden with pack_forget when another one is shown.
+    # Showing a cached screen again packs it and calls its refresh(), which
+    # updates what it displays instead of rebuilding widgets and reloading.
+    # build(name) must return a frame in `master` that packed itself.
+
+    def __init__(self, master, build, maxsize=VIEW_CACHE_SIZE, on_evict=None):
+        self.master = master
+        self.build = build
+        self.maxsize = maxsize
+        self.on_evict = on_evict
+        self.current = None
+        self._views = OrderedDict()     # name -> frame, least recently shown first
+
+    def show(self, name):
+        view = self._views.get(name)
+        if view is not None and view is self.current:
+            view.refresh()
+            return view
+        if self.current is not None:
+            self.current.pack_forget()
+        if view is None:
+            view = self._views[name] = self.build(name)
+        else:
+            view.pack(fill=tk.BOTH, expand=True)
+            view.refresh()
+        self._views.move_to_end(name)
+        self.current = view
+        self._evict()
+        return view
+
+    def warm(self, names, delay_ms=0):
+        # Build screens ahead of use, hidden, one per idle slot so the window
+        # stays responsive; their first queries run on the executor meanwhile
+        pending = [name for name in names if name not in self._views][:self.maxsize]
+
+        def build_next():
+            if not pending:
+                return
+            name = pending.pop(0)
+            if name not in self._views and len(self._views) < self.maxsize:
+                view = self._views[name] = self.build(name)
+                view.pack_forget()
+                self._views.move_to_end(name, last=False)   # not shown yet: first to go
+            self._idle(build_next)
+
+        self._idle(build_next, delay_ms)
+
+    def clear(self):
+        for name in list(self._views):
+            self._drop(name)
+        self.current = None
+
+    def __contains__(self, name):
+        return name in self._views
+
+    def _idle(self, callback, delay_ms=0):
+        self.master.after(delay_ms, lambda: self.master.after_idle(callback))
+
+    def _evict(self):
+        while len(self._views) > self.maxsize:
+            name = next(iter(self._views))
+            if self._views[name] is self.current:
+                break
+            self._drop(name)
+
+    def _drop(self, name):
+        view = self._views.pop(name)
+        if self.on_evict is not None:
+            self.on_evict(view)
+        view.destroy()
+
+
+##########################
+# SEARCH COMBOBOX
+##########################
+
+DEBOUNCE_MS = 150
+
+
+class SearchCombobox(ttk.Combobox):
+    # Type-ahead combobox: once typing pauses, search(text) returns the top
+    # matches and only those are put in the dropdown
+    def __init__(self, master, search, executor=None, delay=DEBOUNCE_MS, **kwargs):
+        super().__init__(master, **kwargs)
+        self.search = search
+        self.executor = executor
+        self.delay = delay
+        self._after_id = None
+        self.bind('<KeyRelease>', self._on_key)
+
+    def _on_key(self, event):
+        if event.keysym in ('Up', 'Down', 'Left', 'Right', 'Return', 'Escape', 'Tab'):
+            return
+        if self._after_id is not None:
+            self.after_cancel(self._after_id)
+        self._after_id = self.after(self.delay, self.refresh)
+
+    def refresh(self):
+        self._after_id = None
+        text = self.get()
+        if self.executor is None:
+            self._show(text, self.search(text))
+        else:
+            self.executor.submit(self.search, text, owner=self,
+                                 on_done=lambda matches: self._show(text, matches))
+
+    def _show(self, text, matches):
+        if text == self.get():  # ignore results for text the user has since changed
+            self['values'] = matches
+
+    def selected_id(self):
+        # ID from a "Name (ID)" label, or None
+        match = re.search(r'\((\d+)\)\s*$', self.get())
+        return int(match.group(1)) if match else None
+
+
+##########################
+# BUSY INDICATOR
+##########################
+
+class BusyIndicator(ttk.Label):
+    # Shows "Loading..." while at least one background query is running
+    def __init__(self, master, text="Loading...", **kwargs):
+        super().__init__(master, text="", **kwargs)
+        self.busy_text = text
+        self._count = 0
+
+    def start(self):
+        self._count += 1
+        self.configure(text=self.busy_text)
+
+    def stop(self):
+        self._count = max(self._count - 1, 0)
+        if not self._count:
+            self.configure(text="")
@@ -65,3 +65,9 @@ CREATE TABLE Medicines (
 );
 GO
 
+
+-- Indexes and later schema changes are versioned migrations in
+-- python_code/migrations.py. Apply them with:
+--   python python_code/migrations.py
+-- or print a script to run here with:
+--   python python_code/migrations.py --print